@@ -5,6 +5,8 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import pandas as pd
 
+from utils import format_date
+
 # Check if OpenAI is available
 try:
     from openai import OpenAI
@@ -81,17 +83,12 @@ Always provide accurate, helpful responses focused on pharmaceutical inventory m
             
             # Check if query is about specific drug
             if any(word in query_lower for word in ['drug', 'medicine', 'medication', 'tablet', 'capsule']):
-                inventory_df = self.db.get_inventory()
-                # Simple keyword search in drug names
-                words = query_lower.split()
-                drug_matches = []
-                for _, drug in inventory_df.iterrows():
-                    drug_name_lower = drug['drug_name'].lower()
-                    if any(word in drug_name_lower for word in words):
-                        drug_matches.append(drug.to_dict())
-                
-                if drug_matches:
-                    results['matching_drugs'] = drug_matches[:5]  # Limit to 5 matches
+                # Ranked full-text search on any meaningful word of the question
+                words = [word for word in query_lower.split() if len(word) > 2]
+                drug_matches = self.db.search_inventory(' '.join(words), limit=5, match_any=True)
+
+                if not drug_matches.empty:
+                    results['matching_drugs'] = drug_matches.to_dict('records')
             
             # Check if query is about stock levels
             if any(word in query_lower for word in ['stock', 'level', 'quantity', 'low', 'empty']):
@@ -102,7 +99,7 @@ Always provide accurate, helpful responses focused on pharmaceutical inventory m
             # Check if query is about expiry
             if any(word in query_lower for word in ['expiry', 'expire', 'expiring', 'expired']):
                 expiring_items = self.db.get_expiring_drugs(days_ahead=30)
-                results['expiring_items'] = expiring_items[:10]
+                results['expiring_items'] = expiring_items.head(10).to_dict('records')
             
             # Check if query is about transactions
             if any(word in query_lower for word in ['transaction', 'sale', 'purchase', 'recent']):
@@ -190,11 +187,11 @@ Always provide accurate, helpful responses focused on pharmaceutical inventory m
         ]):
             try:
                 expiring_7 = self.db.get_expiring_drugs(days_ahead=7)
-                if not expiring_7:
+                if expiring_7.empty:
                     return "No items expiring in the next 7 days."
                 lines = ["Items expiring within 7 days:\n"]
-                for item in expiring_7[:10]:
-                    lines.append(f"• {item['drug_name']} (Batch {item['batch_number']}) — Expires: {item['expiry_date']}")
+                for item in expiring_7.head(10).to_dict('records'):
+                    lines.append(f"• {item['drug_name']} (Batch {item['batch_number']}) — Expires: {format_date(item['expiry_date'])}")
                 return "\n".join(lines)
             except Exception:
                 return "I couldn't fetch 7‑day expiry data right now."
@@ -310,7 +307,7 @@ Always provide accurate, helpful responses focused on pharmaceutical inventory m
                 items = data_context['expiring_items']
                 response = f"I found {len(items)} items expiring soon:\n\n"
                 for item in items[:5]:
-                    response += f"• {item['drug_name']} (Batch: {item['batch_number']}) - Expires: {item['expiry_date']}\n"
+                    response += f"• {item['drug_name']} (Batch: {item['batch_number']}) - Expires: {format_date(item['expiry_date'])}\n"
                 return response
             else:
                 return "No items are expiring in the next 30 days."
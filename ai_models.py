@@ -218,8 +218,8 @@ class SmartReordering:
     
     def get_reorder_suggestions(self, db):
         """Get intelligent reorder suggestions"""
-        # Get data for analysis
-        data = db.get_reorder_suggestions_data()
+        # Only items past their reorder point that are not snoozed or dismissed
+        data = db.get_reorder_suggestions_data(skip_suppressed=True, safety_factor=self.safety_factor)
         suggestions = []
         
         for _, row in data.iterrows():
@@ -277,6 +277,7 @@ class SmartReordering:
                 'days_until_stockout': int(days_until_stockout) if days_until_stockout != float('inf') else 999,
                 'avg_daily_usage': avg_daily_usage,
                 'supplier': item['supplier_name'],
+                'supplier_id': None if pd.isna(item['supplier_id']) else int(item['supplier_id']),
                 'lead_time': lead_time,
                 'estimated_cost': suggested_quantity * unit_price
             }
@@ -0,0 +1,259 @@
+import json
+import threading
+from datetime import date, datetime, timedelta
+
+from database import DatabaseManager
+from utils import day_number, format_currency
+
+# Alert categories in display order; earlier ones win ties within a priority
+ALERT_CATEGORIES = ("stock", "expiry", "financial", "consumption", "reorder")
+PRIORITY_LEVELS = {"high": 3, "medium": 2, "low": 1}
+
+EXPIRY_WINDOW_DAYS = 90
+HIGH_VALUE_WINDOW_DAYS = 60
+HIGH_VALUE_MIN = 1000.0
+
+# Settings rows holding the engine's position in the change feeds
+_STATE_KEYS = ("alert_engine_seq", "alert_engine_consumption_id", "alert_engine_day")
+
+
+class AlertEngine:
+    """Materialize the dashboard alerts into the alerts table.
+
+    Each rule (low stock, expiry, high value at risk, consumption anomaly,
+    reorder) raises at most one alert per inventory row, keyed
+    '<category>:<inventory id>' and upserted, so re-evaluating never
+    duplicates an alert and one whose condition no longer holds is resolved
+    (is_active = 0). refresh() only re-evaluates the inventory rows touched
+    since its last run: those named in the change_log feed plus those with
+    new consumption records. Once a day, or when the feed was pruned past
+    the engine's position, everything is evaluated instead so the day-based
+    rules (days to expiry, 30-day consumption windows) move on. The position
+    is kept in settings, so any process can continue where another stopped.
+    Staleness is judged on that position rather than data_version, so the
+    engine's own writes, and the commit of the writer batch it runs in, do
+    not make it look stale again.
+    """
+
+    def __init__(self, db: DatabaseManager):
+        self.db = db
+        self.stats = {'runs': 0, 'full_runs': 0, 'evaluated': 0, 'upserted': 0, 'resolved': 0}
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def needs_refresh(self):
+        """False when no feed row or consumption record was added since the last refresh today"""
+        with self.db.connection() as conn:
+            return self._checked != _position(conn)
+
+    def refresh(self, full=False):
+        """Bring the alerts table up to date; returns the number of alert rows changed"""
+        if not full and not self.needs_refresh():
+            return 0
+        with self._lock:
+            with self.db.connection() as conn:
+                if not conn.in_transaction:
+                    conn.execute("BEGIN IMMEDIATE")
+                position = _position(conn)
+                changed = self._refresh(conn, full, position)
+            # Read inside the refresh's transaction, so it is exactly what was
+            # evaluated even when a surrounding writer batch commits later
+            self._checked = position
+        return changed
+
+    def _refresh(self, conn, full, position):
+        head_seq, head_consumption, today = position
+        state = dict(conn.execute(
+            f"SELECT setting_key, setting_value FROM settings WHERE setting_key IN ({', '.join('?' * len(_STATE_KEYS))})",
+            _STATE_KEYS,
+        ).fetchall())
+        seq = int(state.get("alert_engine_seq") or 0)
+        consumption_id = int(state.get("alert_engine_consumption_id") or 0)
+
+        oldest_seq = conn.execute("SELECT MIN(seq) FROM change_log").fetchone()[0]
+        pruned = head_seq > seq and (oldest_seq is None or oldest_seq > seq + 1)
+        full = full or pruned or state.get("alert_engine_day") != str(today)
+
+        # Scope ids are passed as a JSON array rather than kept in a temp
+        # table: temp writes count as changes and would bump data_version
+        scope = None
+        if not full:
+            drug_ids = [row[0] for row in conn.execute('''
+                SELECT CASE table_name WHEN 'inventory' THEN row_id
+                                       ELSE json_extract(data, '$.drug_id') END AS drug_id
+                FROM change_log
+                WHERE seq > ? AND table_name IN ('inventory', 'transactions')
+                UNION
+                SELECT drug_id FROM consumption_patterns WHERE id > ?
+            ''', (seq, consumption_id)) if row[0] is not None]
+            scope = json.dumps(drug_ids) if drug_ids else None
+
+        changed = 0
+        if full or scope is not None:
+            changed = self._apply(conn, self._evaluate(conn, today, scope), scope)
+            self.stats['runs'] += 1
+            self.stats['full_runs'] += int(full)
+
+        new_state = {
+            "alert_engine_seq": str(max(head_seq, seq)),
+            "alert_engine_consumption_id": str(head_consumption),
+            "alert_engine_day": str(today),
+        }
+        if new_state != {key: state.get(key) for key in _STATE_KEYS}:
+            now = datetime.now()
+            conn.executemany('''
+                INSERT OR REPLACE INTO settings (setting_key, setting_value, updated_at)
+                VALUES (?, ?, ?)
+            ''', [(key, value, now) for key, value in new_state.items()])
+        return changed
+
+    def _evaluate(self, conn, today, scope):
+        """Current alerts for the inventory rows in the JSON id array scope (all when None)"""
+        params = () if scope is None else (scope,)
+        scope = "" if scope is None else " AND i.id IN (SELECT value FROM json_each(?))"
+        alerts = []
+
+        rows = conn.execute(f'''
+            SELECT i.id, i.drug_name, i.current_stock, i.minimum_stock
+            FROM inventory i
+            WHERE i.current_stock <= i.minimum_stock{scope}
+        ''', params).fetchall()
+        for drug_id, drug_name, current_stock, minimum_stock in rows:
+            out_of_stock = current_stock == 0
+            alerts.append(_alert(
+                "stock", drug_id,
+                'critical' if out_of_stock else 'warning',
+                'high' if out_of_stock else 'medium',
+                f"Low stock alert: {drug_name} has only {current_stock} units remaining (minimum: {minimum_stock})",
+                current_stock / minimum_stock if minimum_stock else 0,
+            ))
+
+        rows = conn.execute(f'''
+            SELECT i.id, i.drug_name, i.batch_number,
+                   MAX(i.expiry_day - ?, 0) as days_until_expiry,
+                   i.current_stock * i.unit_price as value_at_risk
+            FROM inventory i
+            WHERE i.expiry_day <= ?{scope}
+        ''', (today, today + EXPIRY_WINDOW_DAYS) + params).fetchall()
+        for drug_id, drug_name, batch_number, days_until_expiry, value_at_risk in rows:
+            if days_until_expiry <= 7:
+                severity, priority = 'critical', 'high'
+            elif days_until_expiry <= 30:
+                severity, priority = 'warning', 'medium'
+            else:
+                severity, priority = 'info', 'low'
+            alerts.append(_alert(
+                "expiry", drug_id, severity, priority,
+                f"Expiry alert: {drug_name} (Batch: {batch_number}) expires in {days_until_expiry} days",
+                days_until_expiry,
+            ))
+            if days_until_expiry <= HIGH_VALUE_WINDOW_DAYS and (value_at_risk or 0) >= HIGH_VALUE_MIN:
+                alerts.append(_alert(
+                    "financial", drug_id, 'warning', 'medium',
+                    f"High value at risk: {drug_name} worth {format_currency(value_at_risk)} expiring soon",
+                    -value_at_risk,
+                ))
+
+        # Last 30 days against the 30 before, as daily averages per entry
+        date_today = date(1970, 1, 1) + timedelta(days=today)
+        recent_start = (date_today - timedelta(days=30)).isoformat()
+        window_start = (date_today - timedelta(days=60)).isoformat()
+        rows = conn.execute(f'''
+            SELECT i.id, i.drug_name, i.current_stock, i.minimum_stock,
+                   SUM(CASE WHEN dc.date >= ? THEN dc.quantity ELSE 0 END) * 1.0 / SUM(dc.entries) as recent_avg,
+                   SUM(CASE WHEN dc.date <= ? THEN dc.quantity ELSE 0 END) * 1.0 / SUM(dc.entries) as previous_avg,
+                   SUM(CASE WHEN dc.date >= ? THEN dc.quantity ELSE 0 END) * 1.0
+                       / NULLIF(SUM(CASE WHEN dc.date >= ? THEN dc.entries ELSE 0 END), 0) as avg_daily_consumption
+            FROM daily_consumption dc
+            JOIN inventory i ON i.id = dc.drug_id
+            WHERE dc.date >= ?{scope}
+            GROUP BY i.id
+        ''', (recent_start, recent_start, recent_start, recent_start, window_start) + params).fetchall()
+        for drug_id, drug_name, current_stock, minimum_stock, recent_avg, previous_avg, avg_daily in rows:
+            if recent_avg and previous_avg:
+                change_ratio = recent_avg / previous_avg
+                # Significant changes only (>50% increase or decrease)
+                if change_ratio > 1.5:
+                    description = f'increased by {((change_ratio - 1) * 100):.1f}%'
+                elif change_ratio < 0.5:
+                    description = f'decreased by {((1 - change_ratio) * 100):.1f}%'
+                else:
+                    description = None
+                if description:
+                    alerts.append(_alert(
+                        "consumption", drug_id, 'info', 'low',
+                        f"Consumption anomaly detected: {drug_name} usage {description}",
+                        -abs(change_ratio - 1),
+                    ))
+
+            if avg_daily and avg_daily > 0 and current_stock <= minimum_stock * 1.5:
+                # Order enough for 30 days plus safety stock
+                suggested_quantity = max(int(avg_daily * 30 + minimum_stock - current_stock), minimum_stock)
+                alerts.append(_alert(
+                    "reorder", drug_id, 'info',
+                    'high' if current_stock <= minimum_stock else 'medium',
+                    f"Reorder suggestion: {drug_name} - suggested quantity: {suggested_quantity}",
+                    current_stock / minimum_stock if minimum_stock else 0,
+                ))
+
+        self.stats['evaluated'] += len(alerts)
+        return alerts
+
+    def _apply(self, conn, alerts, scope):
+        """Upsert the evaluated alerts and resolve the in-scope ones that no longer hold"""
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        before = conn.total_changes
+        conn.executemany('''
+            INSERT INTO alerts (dedup_key, alert_type, severity, priority, rank, urgency,
+                                message, drug_id, is_active, acknowledged, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, 0, ?, ?)
+            ON CONFLICT (dedup_key) WHERE dedup_key IS NOT NULL DO UPDATE SET
+                severity = excluded.severity,
+                priority = excluded.priority,
+                rank = excluded.rank,
+                urgency = excluded.urgency,
+                message = excluded.message,
+                drug_id = excluded.drug_id,
+                -- A resolved alert that fires again starts over as a new one
+                acknowledged = CASE WHEN alerts.is_active THEN alerts.acknowledged ELSE 0 END,
+                created_at = CASE WHEN alerts.is_active THEN alerts.created_at ELSE excluded.created_at END,
+                is_active = 1,
+                resolved_at = NULL,
+                updated_at = excluded.updated_at
+            WHERE NOT alerts.is_active
+               OR alerts.message IS NOT excluded.message
+               OR alerts.severity IS NOT excluded.severity
+               OR alerts.rank IS NOT excluded.rank
+               OR alerts.urgency IS NOT excluded.urgency
+        ''', [alert + (now, now) for alert in alerts])
+        upserted = conn.total_changes - before
+
+        query = '''
+            UPDATE alerts SET is_active = 0, resolved_at = ?, updated_at = ?
+            WHERE is_active = 1 AND dedup_key IS NOT NULL
+              AND dedup_key NOT IN (SELECT value FROM json_each(?))
+        '''
+        params = (now, now, json.dumps([alert[0] for alert in alerts]))
+        if scope is not None:
+            query += " AND drug_id IN (SELECT value FROM json_each(?))"
+            params += (scope,)
+        resolved = conn.execute(query, params).rowcount
+
+        self.stats['upserted'] += upserted
+        self.stats['resolved'] += resolved
+        return upserted + resolved
+
+
+def _position(conn):
+    """(change_log head seq, newest consumption record id, day number) as seen by conn"""
+    head_seq = conn.execute(
+        "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'change_log'"
+    ).fetchone()[0]
+    head_consumption = conn.execute("SELECT COALESCE(MAX(id), 0) FROM consumption_patterns").fetchone()[0]
+    return (head_seq, head_consumption, day_number())
+
+
+def _alert(category, drug_id, severity, priority, message, urgency):
+    """Row values for one alert, ranked by priority then category order"""
+    rank = PRIORITY_LEVELS[priority] * 10 + len(ALERT_CATEGORIES) - ALERT_CATEGORIES.index(category)
+    return (f"{category}:{drug_id}", category, severity, priority, rank, urgency, message, drug_id)
@@ -7,6 +7,10 @@ from datetime import datetime, timedelta
 import sqlite3
 import numpy as np
 from database import DatabaseManager
+from async_database import AsyncDatabaseManager
+from write_queue import WriteQueue
+from alert_engine import AlertEngine
+from query_profiler import QueryProfiler
 from ai_models import AIForecasting, SmartReordering, ExpiryPredictor
 from drug_interactions import DrugInteractionChecker
 from utils import format_currency, format_dual_currency, calculate_days_until_expiry, generate_alerts
@@ -22,6 +26,12 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Date-only columns come back as datetime64; show them without a midnight time
+DATE_COLUMNS = {
+    column: st.column_config.DateColumn(column, format="YYYY-MM-DD")
+    for column in ("expiry_date", "order_date", "expected_delivery", "actual_delivery", "date")
+}
+
 # Initialize session state variables
 if 'dark_mode' not in st.session_state:
     st.session_state.dark_mode = False
@@ -500,7 +510,34 @@ st.markdown("""
 # Initialize database and AI models
 @st.cache_resource
 def init_database():
-    return DatabaseManager()
+    db = DatabaseManager()
+    # Sample consumption for smart reordering, seeded once per process
+    try:
+        db.add_sample_data()
+    except Exception:
+        pass
+    return db
+
+@st.cache_resource
+def init_async_database():
+    return AsyncDatabaseManager(init_database())
+
+@st.cache_resource
+def init_write_queue():
+    # One writer thread shared by every session, so writes never contend for the lock
+    return WriteQueue(init_database())
+
+@st.cache_resource
+def init_alert_engine():
+    return AlertEngine(init_database())
+
+@st.cache_resource
+def init_query_profiler():
+    # Off unless PHARMA_DB_PROFILE=1; can also be toggled under Settings > Performance
+    profiler = QueryProfiler()
+    if os.environ.get("PHARMA_DB_PROFILE") == "1":
+        profiler.install(init_database())
+    return profiler
 
 @st.cache_resource
 def init_ai_models():
@@ -567,12 +604,10 @@ st.sidebar.markdown("""
 
 # Initialize components
 db = init_database()
-# Add sample data for smart reordering to work properly
-try:
-    if hasattr(db, 'add_sample_data') and callable(getattr(db, 'add_sample_data')):
-        db.add_sample_data()
-except Exception:
-    pass
+async_db = init_async_database()
+writer = init_write_queue()
+alert_engine = init_alert_engine()
+profiler = init_query_profiler()
 forecasting, reordering, expiry_predictor, interaction_checker = init_ai_models()
 
 page = st.sidebar.selectbox(
@@ -597,10 +632,14 @@ def dashboard_page():
     # Key metrics with enhanced styling
     col1, col2, col3, col4 = st.columns(4)
     
-    total_items = db.get_total_inventory_count()
-    low_stock_items = db.get_low_stock_count()
-    expiring_soon = db.get_expiring_soon_count()
-    total_value = db.get_total_inventory_value()
+    # Re-evaluate alert rules for whatever changed, on the writer thread
+    if alert_engine.needs_refresh():
+        writer.call(alert_engine.refresh)
+    snapshot = db.get_dashboard_snapshot()
+    total_items = snapshot['total_items']
+    low_stock_items = snapshot['low_stock_items']
+    expiring_soon = snapshot['expiring_soon']
+    total_value = snapshot['total_value']
     
     with col1:
         st.markdown(f"""
@@ -671,7 +710,7 @@ def dashboard_page():
     with col1:
         st.markdown('<div class="chart-container">', unsafe_allow_html=True)
         st.subheader("📈 Inventory by Category")
-        category_data = db.get_inventory_by_category()
+        category_data = snapshot['category_distribution']
         if not category_data.empty:
             fig = px.pie(category_data, values='quantity', names='category', 
                         title="Inventory Distribution", 
@@ -683,7 +722,7 @@ def dashboard_page():
     with col2:
         st.markdown('<div class="chart-container">', unsafe_allow_html=True)
         st.subheader("📉 Stock Levels")
-        stock_data = db.get_stock_levels()
+        stock_data = snapshot['stock_levels']
         if not stock_data.empty:
             fig = px.bar(stock_data, x='drug_name', y='current_stock', 
                         title="Current Stock Levels", color='current_stock',
@@ -742,8 +781,36 @@ def inventory_management_page():
         with col3:
             search_term = st.text_input("Search Drug Name")
         
-        # Get filtered inventory
-        inventory_data = db.get_filtered_inventory(category_filter, stock_filter, search_term)
+        # Page through the filtered inventory with (drug_name, id) cursors;
+        # only the cursors of visited pages are kept in the session
+        page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1)
+        filter_key = (category_filter, stock_filter, search_term, page_size)
+        if st.session_state.get('inventory_filter_key') != filter_key:
+            st.session_state.inventory_filter_key = filter_key
+            st.session_state.inventory_cursors = [None]
+        cursors = st.session_state.inventory_cursors
+        
+        inventory_data, next_cursor = db.get_inventory_page(
+            category_filter, stock_filter, search_term,
+            page_size=page_size, after=cursors[-1]
+        )
+        total, exact = db.count_inventory(category_filter, stock_filter, search_term)
+        
+        page_number = len(cursors)
+        first_row = (page_number - 1) * page_size + 1
+        total_label = f"{total:,}" if exact else f"{total:,}+"
+        nav_prev, nav_info, nav_next = st.columns([1, 3, 1])
+        with nav_prev:
+            if st.button("⬅️ Previous", disabled=page_number == 1, key="inventory_prev"):
+                cursors.pop()
+                st.rerun()
+        with nav_info:
+            if not inventory_data.empty:
+                st.caption(f"Page {page_number} · rows {first_row:,}–{first_row + len(inventory_data) - 1:,} of {total_label}")
+        with nav_next:
+            if st.button("Next ➡️", disabled=next_cursor is None, key="inventory_next"):
+                cursors.append(next_cursor)
+                st.rerun()
         
         if not inventory_data.empty:
             # Add color coding for stock levels
@@ -756,12 +823,12 @@ def inventory_management_page():
                     return 'background-color: #d4edda'  # Green for good stock
             
             styled_df = inventory_data.style.applymap(color_stock_level, subset=['current_stock'])
-            st.dataframe(styled_df, width='stretch')
+            st.dataframe(styled_df, width='stretch', column_config=DATE_COLUMNS)
             
-            # Export functionality
+            # Export functionality (full exports are under Settings > Data Management)
             csv = inventory_data.to_csv(index=False)
             st.download_button(
-                label="📥 Export to CSV",
+                label="📥 Export Page to CSV",
                 data=csv,
                 file_name=f"inventory_{datetime.now().strftime('%Y%m%d')}.csv",
                 mime="text/csv"
@@ -785,9 +852,14 @@ def inventory_management_page():
                             df = None
 
                         if df is not None:
-                            success = db.import_data(df, "Inventory Items")
-                            if success:
-                                st.success("Data imported successfully!")
+                            report = writer.bulk_import_inventory(df).result()
+                            imported = report['inserted'] + report['updated']
+                            if imported:
+                                st.success(f"Imported {imported} items ({report['inserted']} new, {report['updated']} updated).")
+                            if report['errors']:
+                                st.warning(f"{len(report['errors'])} rows were rejected:")
+                                st.dataframe(pd.DataFrame(report['errors']), width='stretch')
+                            elif imported:
                                 st.rerun()
                             else:
                                 st.error("Failed to import data. Please check the format.")
@@ -823,11 +895,11 @@ def inventory_management_page():
             
             if submitted:
                 if drug_name and batch_number:
-                    success = db.add_inventory_item(
+                    success = writer.add_inventory_item(
                         drug_name, category, manufacturer, batch_number,
                         current_stock, minimum_stock, unit_price, expiry_date,
                         supplier_name, description
-                    )
+                    ).result()
                     if success:
                         st.success("Item added successfully!")
                         st.rerun()
@@ -860,19 +932,48 @@ def inventory_management_page():
                         reason = st.text_input("Reason/Notes")
                     
                     if st.button("Update Stock"):
-                        if transaction_type == "Add Stock":
-                            new_stock = current_item['current_stock'] + quantity
-                        else:
-                            new_stock = max(0, current_item['current_stock'] - quantity)
+                        delta = quantity if transaction_type == "Add Stock" else -quantity
                         
-                        success = db.update_stock_level(item_id, new_stock, transaction_type, quantity, reason)
-                        if success:
-                            st.success(f"Stock updated successfully! New stock level: {new_stock}")
+                        result = writer.apply_stock_movements([{
+                            'item_id': item_id,
+                            'quantity': delta,
+                            'transaction_type': transaction_type,
+                            'reason': reason
+                        }]).result()[0]
+                        if result['success']:
+                            st.success(f"Stock updated successfully! New stock level: {result['new_stock']}")
                             st.rerun()
                         else:
-                            st.error("Failed to update stock.")
+                            st.error(f"Failed to update stock: {result['error']}")
         else:
             st.info("No items available for update.")
+        
+        # Dispense by drug across batches, earliest expiry first
+        st.markdown("---")
+        st.subheader("Dispense by Drug (FEFO)")
+        drugs = db.get_all_drugs()
+        if drugs:
+            col1, col2 = st.columns(2)
+            with col1:
+                dispense_drug = st.selectbox("Drug", drugs, key="fefo_drug")
+                dispense_quantity = st.number_input("Quantity to Dispense", min_value=1, value=1, key="fefo_quantity")
+            with col2:
+                dispense_department = st.text_input("Department", key="fefo_department")
+                dispense_reason = st.text_input("Reason/Notes", key="fefo_reason")
+            
+            batches = db.get_drug_batches(dispense_drug)
+            if not batches.empty:
+                st.dataframe(batches, width='stretch', column_config=DATE_COLUMNS)
+            
+            if st.button("Dispense"):
+                outcome = writer.dispense_fefo(dispense_drug, dispense_quantity,
+                                               department=dispense_department or None,
+                                               reason=dispense_reason or None).result()
+                if outcome['success']:
+                    picked = ", ".join(f"{a['quantity']} from {a['batch_number']}" for a in outcome['allocations'])
+                    st.success(f"Dispensed {dispense_quantity}: {picked}")
+                else:
+                    st.error(f"Failed to dispense: {outcome['error']}")
 
 def ai_forecasting_page():
     st.markdown("""
@@ -1044,7 +1145,7 @@ def smart_reordering_page():
                 col1, col2, col3 = st.columns(3)
                 with col1:
                     if st.button(f"✅ Approve Order", key=f"approve_{suggestion['id']}"):
-                        success = db.create_purchase_order(suggestion)
+                        success = writer.create_purchase_order(suggestion).result()
                         if success:
                             st.success("Purchase order created!")
                         else:
@@ -1052,12 +1153,12 @@ def smart_reordering_page():
                 
                 with col2:
                     if st.button(f"⏰ Snooze (1 day)", key=f"snooze_{suggestion['id']}"):
-                        db.snooze_reorder_suggestion(suggestion['id'], 1)
+                        writer.snooze_reorder_suggestion(suggestion['id'], 1).result()
                         st.info("Suggestion snoozed for 1 day.")
                 
                 with col3:
                     if st.button(f"❌ Dismiss", key=f"dismiss_{suggestion['id']}"):
-                        db.dismiss_reorder_suggestion(suggestion['id'])
+                        writer.dismiss_reorder_suggestion(suggestion['id']).result()
                         st.info("Suggestion dismissed.")
     else:
         st.success("No reorder recommendations at this time!")
@@ -1105,7 +1206,7 @@ def smart_reordering_page():
                 'manual': True
             }
             
-            success = db.create_purchase_order(order_data)
+            success = writer.create_purchase_order(order_data).result()
             if success:
                 st.success("Manual purchase order created successfully!")
             else:
@@ -1136,21 +1237,28 @@ def expiry_management_page():
             
             expiring_items['urgency'] = expiring_items['days_until_expiry'].apply(get_urgency_color)
             
-            st.dataframe(expiring_items, width='stretch')
+            st.dataframe(expiring_items, width='stretch', column_config=DATE_COLUMNS)
             
             # Bulk actions
             st.subheader("Bulk Actions")
             selected_items = st.multiselect(
-                "Select items for bulk action:",
-                options=expiring_items['drug_name'].tolist()
+                "Select batches for bulk action:",
+                options=expiring_items.index.tolist(),
+                format_func=lambda i: f"{expiring_items.at[i, 'drug_name']} (Batch {expiring_items.at[i, 'batch_number']})"
             )
             
             if selected_items:
                 action = st.selectbox("Action", ["Mark as Used", "Return to Supplier", "Dispose"])
                 
                 if st.button(f"Apply {action}"):
-                    for item in selected_items:
-                        db.apply_expiry_action(item, action)
+                    # Queued together so they commit as one batch
+                    pending = [
+                        writer.apply_expiry_action(expiring_items.at[i, 'drug_name'], action,
+                                                   expiring_items.at[i, 'batch_number'])
+                        for i in selected_items
+                    ]
+                    for future in pending:
+                        future.result()
                     st.success(f"{action} applied to selected items!")
                     st.rerun()
         else:
@@ -1385,9 +1493,9 @@ def drug_interactions_page():
                 
                 if st.form_submit_button("Add Interaction"):
                     if drug1 != drug2:
-                        success = db.add_drug_interaction(
+                        success = writer.add_drug_interaction(
                             drug1, drug2, severity, description, clinical_effect, management
-                        )
+                        ).result()
                         if success:
                             st.success("Interaction added successfully!")
                             st.rerun()
@@ -1413,7 +1521,18 @@ def analytics_page():
         with col2:
             end_date = st.date_input("End Date", datetime.now(), key="consumption_end")
         
-        consumption_data = db.get_consumption_analytics(start_date, end_date)
+        # Load every independent query on this page concurrently
+        page_data = async_db.load({
+            'consumption': ('get_consumption_analytics', start_date, end_date),
+            'daily_trends': ('get_daily_consumption_trends', start_date, end_date),
+            'departments': ('get_department_consumption', start_date, end_date),
+            'financial': ('get_financial_overview',),
+            'cost': ('get_cost_analysis',),
+            'cost_trends': ('get_cost_trends',),
+            'suppliers': ('get_supplier_metrics',),
+        })
+        
+        consumption_data = page_data['consumption']
         
         if not consumption_data.empty:
             # Top consumed drugs
@@ -1424,20 +1543,20 @@ def analytics_page():
             st.plotly_chart(fig1, width='stretch')
             
             # Consumption by category
-            category_consumption = consumption_data.groupby('category')['total_consumed'].sum().reset_index()
+            category_consumption = consumption_data.groupby('category', observed=True)['total_consumed'].sum().reset_index()
             fig2 = px.pie(category_consumption, values='total_consumed', names='category',
                          title="Consumption by Drug Category")
             st.plotly_chart(fig2, width='stretch')
             
             # Daily consumption trends
-            daily_trends = db.get_daily_consumption_trends(start_date, end_date)
+            daily_trends = page_data['daily_trends']
             if not daily_trends.empty:
                 fig3 = px.line(daily_trends, x='date', y='daily_consumption',
                               title="Daily Consumption Trends")
                 st.plotly_chart(fig3, width='stretch')
             
             # Department-wise consumption (if department data available)
-            dept_consumption = db.get_department_consumption(start_date, end_date)
+            dept_consumption = page_data['departments']
             if not dept_consumption.empty:
                 fig4 = px.treemap(dept_consumption, path=['department'], values='consumption',
                                  title="Consumption by Department")
@@ -1449,7 +1568,7 @@ def analytics_page():
         st.subheader("💰 Financial Reports")
         
         # Financial overview
-        financial_data = db.get_financial_overview()
+        financial_data = page_data['financial']
         
         col1, col2, col3, col4 = st.columns(4)
         with col1:
@@ -1462,7 +1581,7 @@ def analytics_page():
             st.metric("ROI", f"{financial_data['roi']:.1%}")
         
         # Cost analysis
-        cost_data = db.get_cost_analysis()
+        cost_data = page_data['cost']
         if not cost_data.empty:
             # Cost by category
             fig1 = px.bar(cost_data, x='category', y='total_cost',
@@ -1471,7 +1590,7 @@ def analytics_page():
             st.plotly_chart(fig1, width='stretch')
             
             # Cost trends
-            cost_trends = db.get_cost_trends()
+            cost_trends = page_data['cost_trends']
             if not cost_trends.empty:
                 fig2 = px.line(cost_trends, x='month', y='monthly_cost',
                               title="Monthly Cost Trends")
@@ -1499,7 +1618,7 @@ def analytics_page():
     with tab3:
         st.subheader("🏪 Supplier Performance Analysis")
         
-        supplier_metrics = db.get_supplier_metrics()
+        supplier_metrics = page_data['suppliers']
         
         if not supplier_metrics.empty:
             # Supplier scorecard
@@ -1582,7 +1701,7 @@ def analytics_page():
 def settings_page():
     st.title("⚙️ Settings & Configuration")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["General Settings", "Alert Configuration", "Data Management", "AI Model Settings"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["General Settings", "Alert Configuration", "Data Management", "AI Model Settings", "Performance"])
     
     with tab1:
         st.subheader("General Settings")
@@ -1613,7 +1732,7 @@ def settings_page():
                     'date_format': date_format,
                     'timezone': timezone
                 }
-                db.update_settings(settings)
+                writer.update_settings(settings).result()
                 st.success("Settings saved successfully!")
     
     with tab2:
@@ -1645,7 +1764,7 @@ def settings_page():
                     'sms_alerts': sms_alerts,
                     'dashboard_alerts': dashboard_alerts
                 }
-                db.update_alert_settings(alert_settings)
+                writer.update_alert_settings(alert_settings).result()
                 st.success("Alert settings saved successfully!")
     
     with tab3:
@@ -1655,53 +1774,85 @@ def settings_page():
         
         with col1:
             st.write("**Export Data**")
-            export_format = st.selectbox("Export Format", ["CSV", "Excel", "JSON"])
+            export_format = st.selectbox("Export Format", ["CSV", "Excel", "JSON Lines"])
             export_data_type = st.selectbox("Data Type", ["All Data", "Inventory Only", "Transactions Only", "Reports Only"])
             
             if st.button("Export Data"):
-                if export_data_type == "All Data":
-                    data = db.export_all_data()
-                elif export_data_type == "Inventory Only":
-                    data = db.export_inventory_data()
-                elif export_data_type == "Transactions Only":
-                    data = db.export_transaction_data()
-                else:
-                    data = db.export_report_data()
+                file_format, mime = {
+                    "CSV": ("csv", "text/csv"),
+                    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+                    "JSON Lines": ("jsonl", "application/x-ndjson")
+                }[export_format]
                 
-                if export_format == "CSV":
-                    st.download_button(
-                        label="📥 Download CSV",
-                        data=data.to_csv(index=False),
-                        file_name=f"pharma_data_{datetime.now().strftime('%Y%m%d')}.csv",
-                        mime="text/csv"
-                    )
-                elif export_format == "JSON":
-                    st.download_button(
-                        label="📥 Download JSON",
-                        data=data.to_json(orient='records'),
-                        file_name=f"pharma_data_{datetime.now().strftime('%Y%m%d')}.json",
-                        mime="application/json"
-                    )
+                progress_bar = st.progress(0.0, text="Exporting...")
+                
+                def update_progress(rows_written, total_rows):
+                    fraction = rows_written / total_rows if total_rows else 1.0
+                    progress_bar.progress(min(fraction, 1.0), text=f"Exported {rows_written:,} of {total_rows:,} rows")
+                
+                try:
+                    export = db.stream_export(export_data_type, file_format, progress=update_progress)
+                    progress_bar.progress(1.0, text=f"Exported {export['rows']:,} rows")
+                    with open(export['path'], "rb") as export_file:
+                        st.download_button(
+                            label=f"📥 Download {export_format}",
+                            data=export_file,
+                            file_name=f"pharma_data_{datetime.now().strftime('%Y%m%d')}.{file_format}",
+                            mime=mime
+                        )
+                    os.remove(export['path'])
+                except Exception as e:
+                    st.error(f"Export failed: {str(e)}")
         
         with col2:
             # Import functionality moved to Inventory Management → View Inventory
-            pass
+            st.write("**Columnar Snapshot (Parquet)**")
+            parquet_dir = st.text_input("Snapshot Directory", "exports/parquet")
+            if st.button("📦 Export Parquet Snapshot"):
+                try:
+                    with st.spinner("Writing Parquet snapshot..."):
+                        summary = db.export_parquet(parquet_dir)
+                    st.success(f"Parquet snapshot written to {parquet_dir}")
+                    st.dataframe(pd.DataFrame(summary).T, width='stretch')
+                except Exception as e:
+                    st.error(f"Parquet export failed: {str(e)}")
+            
+            if st.button("📥 Import Parquet Snapshot"):
+                try:
+                    with st.spinner("Loading Parquet snapshot..."):
+                        imported = writer.import_parquet(parquet_dir).result()
+                    st.success(f"Imported {sum(imported.values()):,} rows from {parquet_dir}")
+                except Exception as e:
+                    st.error(f"Parquet import failed: {str(e)}")
         
         # Database maintenance (stacked vertically for cleaner look)
         st.write("**Database Maintenance**")
-        if st.button("🧹 Clean Old Data"):
-            cleaned_records = db.clean_old_data()
-            st.success(f"Cleaned {cleaned_records} old records!")
+        if st.button("🧹 Archive Old Data"):
+            with st.spinner("Archiving records older than 2 years..."):
+                cleaned_records = writer.call_exclusive(db.clean_old_data)
+            st.success(f"Archived {cleaned_records} old records to yearly archive databases!")
         
         st.markdown("")
         if st.button("📊 Optimize Database"):
-            db.optimize_database()
+            writer.call_exclusive(db.optimize_database)
             st.success("Database optimized!")
-        
+
         st.markdown("")
+        if st.button("🔁 Rebuild Consumption Rollup"):
+            rollup_rows = writer.rebuild_consumption_rollup().result()
+            st.success(f"Consumption rollup rebuilt ({rollup_rows} daily rows)!")
+
+        st.markdown("")
+        backup_compression = st.selectbox("Backup Compression", ["None", "gzip", "zstd"])
         if st.button("💾 Backup Database"):
-            backup_file = db.backup_database()
-            st.success(f"Database backed up to: {backup_file}")
+            try:
+                with st.spinner("Backing up database..."):
+                    backup_file = db.backup_database(
+                        compression=None if backup_compression == "None" else backup_compression
+                    )
+                st.success(f"Database backed up and verified: {backup_file}")
+            except Exception as e:
+                st.error(f"Backup failed: {str(e)}")
     
     with tab4:
         st.subheader("AI Model Settings")
@@ -1727,7 +1878,7 @@ def settings_page():
                     'lead_time_variance': lead_time_variance,
                     'anomaly_sensitivity': anomaly_sensitivity
                 }
-                db.update_ai_settings(ai_settings)
+                writer.update_ai_settings(ai_settings).result()
                 st.success("AI settings saved successfully!")
         
         # Model performance monitoring
@@ -1749,6 +1900,52 @@ def settings_page():
                     st.warning(f"⚠️ {model['model_name']} accuracy is below threshold. Consider retraining.")
                 else:
                     st.success(f"✅ {model['model_name']} is performing well.")
+    
+    with tab5:
+        st.subheader("Database Performance")
+        st.caption("Per-method timings, row counts and query plans. Profiling adds some overhead, so leave it off when not investigating.")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            profiling_on = st.toggle("Enable query profiling", value=profiler.installed)
+            if profiling_on and not profiler.installed:
+                profiler.install(db)
+            elif not profiling_on and profiler.installed:
+                profiler.uninstall()
+        with col2:
+            profiler.threshold_ms = st.number_input(
+                "Capture query plans for calls slower than (ms)",
+                min_value=1, value=int(profiler.threshold_ms), step=10
+            )
+        
+        method_stats = profiler.method_stats()
+        if method_stats.empty:
+            st.info("No calls recorded yet. Enable profiling and use the app for a while.")
+        else:
+            if st.button("🗑️ Reset Stats"):
+                profiler.reset()
+                st.rerun()
+            
+            st.write("**Methods by total time**")
+            st.dataframe(method_stats, width='stretch')
+            
+            chatty = method_stats[method_stats['queries_per_call'] > 10]
+            for _, row in chatty.iterrows():
+                st.warning(f"⚠️ {row['method']} runs {row['queries_per_call']:.0f} queries per call - possible N+1 pattern.")
+            
+            slow_plans = profiler.slow_query_plans()
+            st.write(f"**Slow queries (>{profiler.threshold_ms:.0f} ms)**")
+            if slow_plans.empty:
+                st.success("No calls over the threshold.")
+            else:
+                scans = int(slow_plans['full_scan'].sum())
+                if scans:
+                    st.warning(f"⚠️ {scans} slow queries do a full table scan.")
+                for _, row in slow_plans.head(25).iterrows():
+                    label = f"{'🔴 ' if row['full_scan'] else ''}{row['method']} · {row['duration_ms']} ms · {row['at']}"
+                    with st.expander(label):
+                        st.code(row['sql'], language='sql')
+                        st.code(row['plan'], language='text')
 
 # Main app logic
 if page == "Dashboard":
@@ -1756,7 +1953,7 @@ if page == "Dashboard":
 elif page == "Inventory Management":
     inventory_management_page()
 elif page == "Receipt Scanner":
-    render_receipt_scanner_page(db)
+    render_receipt_scanner_page(db, writer)
 elif page == "AI Assistant":
     render_ai_chatbot_page(db)
 elif page == "AI Forecasting":
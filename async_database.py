@@ -0,0 +1,67 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, Tuple
+
+from database import DatabaseManager
+
+
+class AsyncDatabaseManager:
+    """Run DatabaseManager read queries concurrently on a bounded thread pool.
+
+    Each worker thread keeps its own pooled read connection for its whole
+    life, so a page can fire its independent queries at once and wait for
+    the slowest one instead of the sum of all of them. Any DatabaseManager
+    method is available as a coroutine, e.g. ``await adb.get_cost_trends()``.
+    """
+
+    def __init__(self, db: DatabaseManager, max_workers: int = 4):
+        self.db = db
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="pharma-db-read",
+            initializer=self._warm_connection
+        )
+
+    def _warm_connection(self):
+        """Open the worker's connection up front (runs once per worker thread)"""
+        self.db.pool.acquire()
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+
+        return call
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking callable on the read pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def gather(self, calls: Dict[str, Tuple]) -> Dict[str, Any]:
+        """Run several queries concurrently.
+
+        ``calls`` maps a result key to ``(method_name, *args)``; the result
+        dict has the same keys. The first failing query raises.
+        """
+        keys = list(calls)
+        results = await asyncio.gather(*(
+            self.run(getattr(self.db, calls[key][0]), *calls[key][1:]) for key in keys
+        ))
+        return dict(zip(keys, results))
+
+    def load(self, calls: Dict[str, Tuple]) -> Dict[str, Any]:
+        """Blocking variant of gather() for synchronous callers such as Streamlit pages"""
+        futures = {
+            key: self._executor.submit(getattr(self.db, call[0]), *call[1:])
+            for key, call in calls.items()
+        }
+        return {key: future.result() for key, future in futures.items()}
+
+    def shutdown(self):
+        """Stop the worker threads"""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the read paths behind the Streamlit pages.
+
+Builds (or reuses) synthetic databases at several catalog sizes with
+data_generator.py, times each page query, appends the results to a JSON
+history file and compares them with a stored baseline. Exits non-zero
+when a query got slower than the baseline allows, so it can gate a deploy.
+
+    python benchmark.py                      # 1k/10k/100k SKUs, compare with baseline
+    python benchmark.py --sizes 1000 --save-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import time
+from datetime import date, datetime, timedelta
+
+from alert_engine import AlertEngine
+from data_generator import generate_dataset
+from database import DatabaseManager
+from utils import generate_alerts
+
+BENCHMARK_DIR = "benchmarks"
+DATA_DIR = os.path.join(BENCHMARK_DIR, "data")
+HISTORY_FILE = os.path.join(BENCHMARK_DIR, "history.json")
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, "baseline.json")
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+def _cold_dashboard(db, ctx):
+    # Invalidate the cached snapshot so the queries actually run
+    db.pool.bump_data_version()
+    return db.get_dashboard_snapshot()
+
+
+# name -> callable(db, ctx); ctx holds a sample drug and the analytics date range
+CASES = {
+    "dashboard_kpis": _cold_dashboard,
+    "dashboard_kpis_cached": lambda db, ctx: db.get_dashboard_snapshot(),
+    "filtered_inventory": lambda db, ctx: db.get_filtered_inventory("All", "All", ""),
+    "filtered_inventory_low_stock": lambda db, ctx: db.get_filtered_inventory("All", "Low Stock", ""),
+    "filtered_inventory_search": lambda db, ctx: db.get_filtered_inventory("All", "All", ctx["search"]),
+    "inventory_page": lambda db, ctx: db.get_inventory_page(page_size=50),
+    "historical_consumption": lambda db, ctx: db.get_historical_consumption(ctx["drug_name"]),
+    "reorder_suggestions_data": lambda db, ctx: db.get_reorder_suggestions_data(),
+    "reorder_actionable_data": lambda db, ctx: db.get_reorder_suggestions_data(skip_suppressed=True, safety_factor=1.5),
+    "expiring_items": lambda db, ctx: db.get_expiring_items(),
+    "generate_alerts": lambda db, ctx: generate_alerts(db),
+    "alert_refresh_full": lambda db, ctx: ctx["alerts"].refresh(full=True),
+    "consumption_analytics": lambda db, ctx: db.get_consumption_analytics(ctx["start"], ctx["end"]),
+    "daily_consumption_trends": lambda db, ctx: db.get_daily_consumption_trends(ctx["start"], ctx["end"]),
+    "department_consumption": lambda db, ctx: db.get_department_consumption(ctx["start"], ctx["end"]),
+    "financial_overview": lambda db, ctx: db.get_financial_overview(),
+    "cost_analysis": lambda db, ctx: db.get_cost_analysis(),
+    "cost_trends": lambda db, ctx: db.get_cost_trends(),
+    "supplier_metrics": lambda db, ctx: db.get_supplier_metrics(),
+    "wastage_analysis": lambda db, ctx: db.get_wastage_analysis(ctx["start"], ctx["end"]),
+}
+
+
+def dataset_path(skus, seed, years):
+    return os.path.join(DATA_DIR, f"bench_{skus}_y{years:g}_s{seed}.db")
+
+
+def dataset_meta_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def prepare_dataset(skus, seed, years, rebuild=False):
+    """Generate the benchmark database for a size unless a cached copy exists.
+
+    Returns (path, today), today being the day the data was generated up to.
+    It is stored beside the database so a cache reused weeks later is still
+    queried over the windows it has data for.
+    """
+    path = dataset_path(skus, seed, years)
+    meta_path = dataset_meta_path(path)
+    if rebuild or not os.path.exists(path) or not os.path.exists(meta_path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        print(f"Generating {skus:,} SKU dataset...")
+        today = date.today()
+        generate_dataset(path, skus=skus, years=years, seed=seed, overwrite=True, today=today,
+                         progress=lambda message: print(f"  {message}"))
+        _save_json(meta_path, {"skus": skus, "seed": seed, "years": years, "today": today.isoformat()})
+    return path, date.fromisoformat(_load_json(meta_path, {})["today"])
+
+
+def _context(db, today):
+    """Arguments for the parameterised cases: the busiest drug, the 90 days up to the dataset's today and an alert engine"""
+    with db.connection() as conn:
+        row = conn.execute('''
+            SELECT i.drug_name
+            FROM daily_consumption dc
+            JOIN inventory i ON i.id = dc.drug_id
+            GROUP BY dc.drug_id
+            ORDER BY SUM(dc.quantity) DESC
+            LIMIT 1
+        ''').fetchone()
+    drug_name = row[0] if row else "Paracetamol 500mg"
+    end = today
+    # Materialize the alerts generate_alerts reads
+    alerts = AlertEngine(db)
+    alerts.refresh()
+    return {
+        "alerts": alerts,
+        "drug_name": drug_name,
+        "search": drug_name.split()[0][:5],
+        "start": end - timedelta(days=90),
+        "end": end,
+    }
+
+
+def time_case(func, db, ctx, repeat, warmup=1):
+    """Run a case warmup + repeat times and summarise the timed runs in ms"""
+    for _ in range(warmup):
+        func(db, ctx)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(db, ctx)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "min_ms": round(samples[0], 3),
+        "max_ms": round(samples[-1], 3),
+        "runs": repeat,
+    }
+
+
+def run_size(path, today, cases, repeat):
+    db = DatabaseManager(path, demo_data=False)
+    try:
+        ctx = _context(db, today)
+        results = {}
+        for name in cases:
+            try:
+                results[name] = time_case(CASES[name], db, ctx, repeat)
+            except Exception as e:
+                results[name] = {"error": str(e)}
+            stats = results[name]
+            shown = f"{stats['median_ms']:>10.2f} ms" if "median_ms" in stats else f"  ERROR {stats['error']}"
+            print(f"  {name:<30}{shown}")
+        return results
+    finally:
+        db.close()
+
+
+def find_regressions(results, baseline, tolerance, min_delta_ms):
+    """Cases whose median is over the baseline by more than tolerance and min_delta_ms"""
+    regressions = []
+    for size, cases in results.items():
+        for name, stats in cases.items():
+            base = baseline.get(size, {}).get(name)
+            if not base or "median_ms" not in base or "median_ms" not in stats:
+                continue
+            delta = stats["median_ms"] - base["median_ms"]
+            if delta > min_delta_ms and stats["median_ms"] > base["median_ms"] * (1 + tolerance):
+                regressions.append({
+                    "size": size,
+                    "case": name,
+                    "baseline_ms": base["median_ms"],
+                    "median_ms": stats["median_ms"],
+                    "change": round(stats["median_ms"] / base["median_ms"] - 1, 3),
+                })
+    return regressions
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the page read queries")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="catalog sizes (SKUs)")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), help="only run these cases")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--years", type=float, default=2, help="years of generated history")
+    parser.add_argument("--seed", type=int, default=42, help="dataset seed")
+    parser.add_argument("--rebuild", action="store_true", help="regenerate cached datasets")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown over the baseline median (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                        help="ignore slowdowns smaller than this many ms")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--no-history", action="store_true", help="do not append to the history file")
+    args = parser.parse_args()
+
+    cases = args.cases or list(CASES)
+    results = {}
+    dataset_days = {}
+    for skus in args.sizes:
+        path, today = prepare_dataset(skus, args.seed, args.years, args.rebuild)
+        print(f"\n{skus:,} SKUs ({path}, generated up to {today})")
+        results[str(skus)] = run_size(path, today, cases, args.repeat)
+        dataset_days[str(skus)] = today.isoformat()
+
+    run = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "seed": args.seed,
+        "years": args.years,
+        "dataset_today": dataset_days,
+        "results": results,
+    }
+
+    baseline = _load_json(BASELINE_FILE, {}).get("results", {})
+    regressions = find_regressions(results, baseline, args.tolerance, args.min_delta_ms)
+    run["regressions"] = regressions
+
+    if not args.no_history:
+        history = _load_json(HISTORY_FILE, [])
+        history.append(run)
+        _save_json(HISTORY_FILE, history)
+    if args.save_baseline:
+        _save_json(BASELINE_FILE, run)
+        print(f"\nBaseline saved to {BASELINE_FILE}")
+
+    if not baseline:
+        if not args.save_baseline:
+            print("\nNo baseline to compare against; run with --save-baseline to create one.")
+    elif regressions:
+        print(f"\n{len(regressions)} regression(s) against the baseline:")
+        for r in regressions:
+            print(f"  {r['size']:>7} SKUs  {r['case']:<30}{r['baseline_ms']:>9.2f} -> {r['median_ms']:.2f} ms"
+                  f" (+{r['change']:.0%})")
+        raise SystemExit(1)
+    else:
+        print("\nNo regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
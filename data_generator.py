@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Synthetic dataset generator for load and performance testing.
+
+Builds a realistic, reproducible pharmacy database at any scale: a catalog
+of SKUs spread over suppliers, years of daily consumption across
+departments, purchase orders with their receipts, and disposals. All data
+is drawn with a seeded NumPy generator and bulk loaded with executemany,
+so the same arguments always produce the same database.
+
+    python data_generator.py --db bench.db --skus 50000 --years 5 --overwrite
+"""
+
+import argparse
+import os
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from database import DatabaseManager
+
+# Generic drug names with their therapeutic category
+GENERICS = [
+    ("Paracetamol", "Analgesics"), ("Ibuprofen", "Analgesics"), ("Diclofenac", "Analgesics"),
+    ("Aspirin", "Cardiovascular"), ("Tramadol", "Analgesics"), ("Morphine", "Analgesics"),
+    ("Amoxicillin", "Antibiotics"), ("Azithromycin", "Antibiotics"), ("Ciprofloxacin", "Antibiotics"),
+    ("Ceftriaxone", "Antibiotics"), ("Doxycycline", "Antibiotics"), ("Metronidazole", "Antibiotics"),
+    ("Clarithromycin", "Antibiotics"), ("Cefuroxime", "Antibiotics"), ("Vancomycin", "Antibiotics"),
+    ("Gentamicin", "Antibiotics"), ("Metformin", "Diabetes"), ("Glimepiride", "Diabetes"),
+    ("Insulin Glargine", "Diabetes"), ("Insulin Rapid", "Diabetes"), ("Sitagliptin", "Diabetes"),
+    ("Atorvastatin", "Cardiovascular"), ("Rosuvastatin", "Cardiovascular"), ("Amlodipine", "Cardiovascular"),
+    ("Losartan", "Cardiovascular"), ("Telmisartan", "Cardiovascular"), ("Metoprolol", "Cardiovascular"),
+    ("Bisoprolol", "Cardiovascular"), ("Clopidogrel", "Cardiovascular"), ("Warfarin", "Cardiovascular"),
+    ("Enoxaparin", "Cardiovascular"), ("Furosemide", "Cardiovascular"), ("Spironolactone", "Cardiovascular"),
+    ("Digoxin", "Cardiovascular"), ("Salbutamol", "Respiratory"), ("Budesonide", "Respiratory"),
+    ("Montelukast", "Respiratory"), ("Ipratropium", "Respiratory"), ("Prednisolone", "Steroids"),
+    ("Dexamethasone", "Steroids"), ("Hydrocortisone", "Steroids"), ("Omeprazole", "Gastrointestinal"),
+    ("Pantoprazole", "Gastrointestinal"), ("Ranitidine", "Gastrointestinal"), ("Ondansetron", "Gastrointestinal"),
+    ("Domperidone", "Gastrointestinal"), ("Loperamide", "Gastrointestinal"), ("Lactulose", "Gastrointestinal"),
+    ("Cetirizine", "Respiratory"), ("Loratadine", "Respiratory"), ("Levothyroxine", "Endocrine"),
+    ("Sertraline", "Psychiatry"), ("Fluoxetine", "Psychiatry"), ("Amitriptyline", "Psychiatry"),
+    ("Diazepam", "Psychiatry"), ("Lorazepam", "Psychiatry"), ("Haloperidol", "Psychiatry"),
+    ("Levetiracetam", "Neurology"), ("Phenytoin", "Neurology"), ("Gabapentin", "Neurology"),
+    ("Pregabalin", "Neurology"), ("Folic Acid", "Vitamins"), ("Ferrous Sulfate", "Vitamins"),
+    ("Vitamin D3", "Vitamins"), ("Calcium Carbonate", "Vitamins"), ("Potassium Chloride", "Electrolytes"),
+    ("Sodium Chloride", "Electrolytes"), ("Dextrose", "Electrolytes"), ("Heparin", "Cardiovascular"),
+    ("Adrenaline", "Emergency"), ("Atropine", "Emergency"), ("Lidocaine", "Emergency"),
+]
+
+STRENGTHS = ["5mg", "10mg", "20mg", "50mg", "100mg", "250mg", "500mg", "1g"]
+FORMS = ["Tablet", "Capsule", "Syrup", "Injection", "Inhaler", "Suspension"]
+
+MANUFACTURERS = [
+    "Cipla", "Sun Pharma", "Dr. Reddy's", "Lupin", "Zydus", "Glenmark", "Pfizer",
+    "GSK", "Novartis", "Sanofi", "Abbott", "Mankind", "Torrent", "Alkem", "Intas",
+]
+
+SUPPLIER_PREFIXES = ["Medi", "Pharma", "Health", "Care", "Cure", "Life", "Vita", "Prime"]
+SUPPLIER_SUFFIXES = ["Supply Co", "Distributors", "Corp", "Logistics", "Wholesale", "Traders"]
+
+# Department name and share of consumption
+DEPARTMENTS = {
+    "General Ward": 0.35,
+    "Outpatient": 0.25,
+    "Emergency": 0.15,
+    "ICU": 0.10,
+    "Pediatrics": 0.08,
+    "Surgery": 0.07,
+}
+
+# Relative activity by weekday (Monday first)
+WEEKDAY_FACTORS = np.array([1.1, 1.05, 1.0, 1.0, 1.05, 0.8, 0.6])
+
+PO_STATUSES = np.array(["delivered", "pending", "approved", "cancelled"])
+
+
+def _insert(conn, table, columns, rows, chunk_size):
+    """executemany a DataFrame into table, converting one chunk at a time"""
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows.iloc[start:start + chunk_size]
+        conn.executemany(sql, zip(*(chunk[column].tolist() for column in columns)))
+    return len(rows)
+
+
+@contextmanager
+def _bulk_load(conn, table):
+    """Drop a table's triggers and secondary indexes for a bulk insert, then recreate them.
+
+    Rebuilding an index once is much cheaper than updating it per row, and
+    derived tables (e.g. the consumption rollup) must be rebuilt afterwards.
+    """
+    saved = conn.execute(
+        "SELECT type, name, sql FROM sqlite_master "
+        "WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,)
+    ).fetchall()
+    for kind, name, _ in saved:
+        conn.execute(f"DROP {kind.upper()} {name}")
+    yield
+    for _, _, sql in saved:
+        conn.execute(sql)
+
+
+def _day_weights(days):
+    """Daily activity weights: weekday pattern plus a winter bump"""
+    weekday = WEEKDAY_FACTORS[[d.weekday() for d in days]]
+    months = np.array([d.month for d in days])
+    season = np.where(np.isin(months, [11, 12, 1, 2]), 1.2, 1.0)
+    weights = weekday * season
+    return weights / weights.sum()
+
+
+def _timestamps(rng, day_values):
+    """Random times of day on the given dates, in SQLite CURRENT_TIMESTAMP format"""
+    seconds = rng.integers(7 * 3600, 21 * 3600, size=len(day_values))
+    stamps = pd.DatetimeIndex(pd.to_datetime(day_values)) + pd.to_timedelta(seconds, unit="s")
+    return stamps.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def generate_suppliers(rng, count):
+    names = [f"{SUPPLIER_PREFIXES[i % len(SUPPLIER_PREFIXES)]}"
+             f"{SUPPLIER_SUFFIXES[(i // len(SUPPLIER_PREFIXES)) % len(SUPPLIER_SUFFIXES)]}"
+             for i in range(count)]
+    names = [f"{name} {i + 1:03d}" for i, name in enumerate(names)]
+    return pd.DataFrame({
+        "name": names,
+        "contact_person": [f"Contact {i + 1}" for i in range(count)],
+        "phone": [f"+91-98{i:08d}" for i in range(count)],
+        "email": [f"orders{i + 1}@supplier.example" for i in range(count)],
+        "address": [f"{i + 1} Industrial Area" for i in range(count)],
+        "lead_time_days": rng.integers(2, 15, size=count),
+        "reliability_score": rng.uniform(3.0, 5.0, size=count).round(1),
+        "cost_rating": rng.uniform(3.0, 5.0, size=count).round(1),
+        "quality_score": rng.uniform(3.0, 5.0, size=count).round(1),
+    })
+
+
+def generate_inventory(rng, skus, supplier_names, today):
+    """Catalog of SKUs; also returns each SKU's mean daily usage"""
+    name_idx = rng.integers(0, len(GENERICS), size=skus)
+    strength_idx = rng.integers(0, len(STRENGTHS), size=skus)
+    form_idx = rng.integers(0, len(FORMS), size=skus)
+    generics = np.array([name for name, _ in GENERICS])[name_idx]
+    categories = np.array([category for _, category in GENERICS])[name_idx]
+    drug_names = pd.Series(generics) + " " + np.array(STRENGTHS)[strength_idx] + " " + np.array(FORMS)[form_idx]
+
+    # A few fast movers and a long tail of slow ones
+    daily_usage = rng.lognormal(mean=0.5, sigma=1.2, size=skus)
+    lead_days = rng.integers(3, 15, size=skus)
+    minimum_stock = np.maximum(5, np.ceil(daily_usage * lead_days)).astype(int)
+    # Most items are stocked for weeks; some are running low or out
+    cover_days = rng.choice([0, 3, 10, 30, 60, 120], size=skus, p=[0.03, 0.07, 0.15, 0.35, 0.25, 0.15])
+    current_stock = np.round(daily_usage * cover_days * rng.uniform(0.7, 1.3, size=skus)).astype(int)
+    expiry = pd.Timestamp(today) + pd.to_timedelta(rng.integers(-60, 900, size=skus), unit="D")
+
+    inventory = pd.DataFrame({
+        "drug_name": drug_names,
+        "category": categories,
+        "manufacturer": np.array(MANUFACTURERS)[rng.integers(0, len(MANUFACTURERS), size=skus)],
+        "batch_number": [f"GEN{i:08d}" for i in range(skus)],
+        "current_stock": current_stock,
+        "minimum_stock": minimum_stock,
+        "unit_price": np.round(rng.lognormal(mean=4.0, sigma=1.1, size=skus), 2),
+        "expiry_date": expiry.strftime("%Y-%m-%d"),
+        "supplier_name": np.array(supplier_names)[rng.integers(0, len(supplier_names), size=skus)],
+        "description": generics + " (" + np.array(FORMS)[form_idx] + ")",
+        "created_at": f"{today.isoformat()} 00:00:00",
+        "updated_at": f"{today.isoformat()} 00:00:00",
+    })
+    return inventory, daily_usage
+
+
+def generate_consumption(rng, drug_ids, daily_usage, days, daily_lines):
+    """Dispensing lines per drug, day and department, popular drugs more often"""
+    popularity = daily_usage / daily_usage.sum()
+    day_weights = _day_weights(days)
+    count = rng.poisson(daily_lines * len(days))
+    dept_names = np.array(list(DEPARTMENTS))
+    dept_share = np.array(list(DEPARTMENTS.values()))
+
+    sku = rng.choice(len(drug_ids), size=count, p=popularity)
+    day = rng.choice(len(days), size=count, p=day_weights)
+    dept = rng.choice(len(dept_names), size=count, p=dept_share / dept_share.sum())
+    quantity = rng.poisson(np.maximum(daily_usage[sku], 1.0)) + 1
+
+    lines = pd.DataFrame({"sku": sku, "day": day, "dept": dept, "quantity_consumed": quantity})
+    # One record per drug, day and department, like the app's daily entries
+    lines = lines.groupby(["sku", "day", "dept"], as_index=False)["quantity_consumed"].sum()
+    lines = lines.sort_values(["day", "sku"])
+    return pd.DataFrame({
+        "drug_id": drug_ids[lines["sku"].to_numpy()],
+        "date": np.array([d.isoformat() for d in days])[lines["day"].to_numpy()],
+        "quantity_consumed": lines["quantity_consumed"].to_numpy(),
+        "department": dept_names[lines["dept"].to_numpy()],
+    })
+
+
+def generate_purchase_orders(rng, drug_ids, unit_prices, daily_usage, supplier_ids,
+                             supplier_lead, days, orders_per_day, today):
+    """Purchase orders plus the 'Purchase' transactions for delivered ones"""
+    popularity = daily_usage / daily_usage.sum()
+    count = rng.poisson(orders_per_day * len(days))
+    sku = rng.choice(len(drug_ids), size=count, p=popularity)
+    supplier = rng.integers(0, len(supplier_ids), size=count)
+    order_day = np.sort(rng.choice(len(days), size=count, p=_day_weights(days)))
+    order_dates = pd.to_datetime([days[i] for i in order_day])
+
+    quantity = np.maximum(10, np.round(daily_usage[sku] * rng.uniform(14, 45, size=count))).astype(int)
+    unit_price = np.round(unit_prices[sku] * rng.uniform(0.9, 1.1, size=count), 2)
+    lead = supplier_lead[supplier]
+    expected = order_dates + pd.to_timedelta(lead, unit="D")
+    actual = expected + pd.to_timedelta(rng.integers(-2, 6, size=count), unit="D")
+
+    # Orders still in flight are not delivered yet
+    in_flight = expected >= pd.Timestamp(today)
+    status = np.where(
+        in_flight,
+        PO_STATUSES[rng.integers(1, 3, size=count)],
+        PO_STATUSES[rng.choice([0, 3], size=count, p=[0.97, 0.03])],
+    )
+    delivered = status == "delivered"
+
+    orders = pd.DataFrame({
+        "order_number": [f"PO-GEN-{i + 1:08d}" for i in range(count)],
+        "supplier_id": supplier_ids[supplier],
+        "drug_id": drug_ids[sku],
+        "quantity": quantity,
+        "unit_price": unit_price,
+        "total_amount": np.round(quantity * unit_price, 2),
+        "status": status,
+        "order_date": order_dates.strftime("%Y-%m-%d"),
+        "expected_delivery": expected.strftime("%Y-%m-%d"),
+        "actual_delivery": np.where(delivered, actual.strftime("%Y-%m-%d"), None),
+        "created_at": _timestamps(rng, order_dates),
+    })
+
+    receipts = orders[delivered]
+    purchases = pd.DataFrame({
+        "drug_id": receipts["drug_id"].to_numpy(),
+        "transaction_type": "Purchase",
+        "quantity": receipts["quantity"].to_numpy(),
+        "unit_price": receipts["unit_price"].to_numpy(),
+        "total_amount": receipts["total_amount"].to_numpy(),
+        "reference_number": receipts["order_number"].to_numpy(),
+        "notes": "Goods received",
+        "department": "Pharmacy",
+        "user_id": "generator",
+        "created_at": _timestamps(rng, pd.to_datetime(receipts["actual_delivery"])),
+    })
+    return orders, purchases
+
+
+def generate_disposals(rng, drug_ids, unit_prices, days, disposals_per_day):
+    """Expired and damaged stock written off"""
+    count = rng.poisson(disposals_per_day * len(days))
+    sku = rng.integers(0, len(drug_ids), size=count)
+    expired = rng.random(count) < 0.7
+    quantity = rng.integers(1, 60, size=count)
+    day_values = pd.to_datetime([days[i] for i in np.sort(rng.integers(0, len(days), size=count))])
+    dept_names = np.array(list(DEPARTMENTS))
+    return pd.DataFrame({
+        "drug_id": drug_ids[sku],
+        "transaction_type": np.where(expired, "Expired", "Dispose"),
+        "quantity": quantity,
+        "unit_price": unit_prices[sku],
+        "total_amount": np.round(quantity * unit_prices[sku], 2),
+        "reference_number": None,
+        "notes": np.where(expired, "Expired stock", "Damaged packaging"),
+        "department": dept_names[rng.integers(0, len(dept_names), size=count)],
+        "user_id": "generator",
+        "created_at": _timestamps(rng, day_values),
+    })
+
+
+def generate_dataset(db_path, skus=50000, years=5, suppliers=50, daily_lines=None,
+                     orders_per_day=None, disposals_per_day=None, seed=42,
+                     overwrite=False, chunk_size=10000, today=None, progress=print):
+    """Build a synthetic database at db_path and return row counts per table.
+
+    daily_lines, orders_per_day and disposals_per_day default to values
+    proportional to the catalog size. today pins the calendar so the same
+    seed gives byte-identical data on any day.
+    """
+    if os.path.exists(db_path):
+        if not overwrite:
+            raise FileExistsError(f"{db_path} exists; pass overwrite=True to replace it")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    rng = np.random.default_rng(seed)
+    today = today or date.today()
+    days = [today - timedelta(days=n) for n in range(int(years * 365), 0, -1)]
+    daily_lines = daily_lines or max(50, skus // 25)
+    orders_per_day = orders_per_day or max(5, skus // 250)
+    disposals_per_day = disposals_per_day or max(1, skus // 2500)
+    counts = {}
+    say = progress or (lambda message: None)
+
+    db = DatabaseManager(db_path, demo_data=False)
+    try:
+        started = time.perf_counter()
+        with db.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+
+            supplier_df = generate_suppliers(rng, suppliers)
+            counts["suppliers"] = _insert(conn, "suppliers", list(supplier_df.columns), supplier_df, chunk_size)
+            supplier_rows = conn.execute(
+                "SELECT id, lead_time_days FROM suppliers WHERE name IN (%s) ORDER BY id"
+                % ",".join("?" * len(supplier_df)), list(supplier_df["name"])
+            ).fetchall()
+            supplier_ids = np.array([row[0] for row in supplier_rows])
+            supplier_lead = np.array([row[1] for row in supplier_rows])
+
+            inventory_df, daily_usage = generate_inventory(rng, skus, list(supplier_df["name"]), today)
+            counts["inventory"] = _insert(conn, "inventory", list(inventory_df.columns), inventory_df, chunk_size)
+            first_id = conn.execute(
+                "SELECT id FROM inventory WHERE batch_number = ?", (inventory_df["batch_number"].iloc[0],)
+            ).fetchone()[0]
+            drug_ids = np.arange(first_id, first_id + skus)
+            unit_prices = inventory_df["unit_price"].to_numpy()
+            say(f"inventory: {skus:,} SKUs from {suppliers} suppliers")
+
+            consumption = generate_consumption(rng, drug_ids, daily_usage, days, daily_lines)
+            with _bulk_load(conn, "consumption_patterns"):
+                counts["consumption_patterns"] = _insert(
+                    conn, "consumption_patterns", list(consumption.columns), consumption, chunk_size
+                )
+            say(f"consumption_patterns: {counts['consumption_patterns']:,} rows over {len(days):,} days")
+
+            orders, purchases = generate_purchase_orders(
+                rng, drug_ids, unit_prices, daily_usage, supplier_ids, supplier_lead,
+                days, orders_per_day, today
+            )
+            counts["purchase_orders"] = _insert(conn, "purchase_orders", list(orders.columns), orders, chunk_size)
+            disposals = generate_disposals(rng, drug_ids, unit_prices, days, disposals_per_day)
+            transactions = pd.concat([purchases, disposals]).sort_values("created_at", kind="stable")
+            with _bulk_load(conn, "transactions"):
+                counts["transactions"] = _insert(
+                    conn, "transactions", list(transactions.columns), transactions, chunk_size
+                )
+            say(f"purchase_orders: {counts['purchase_orders']:,}, transactions: {counts['transactions']:,}")
+
+        # The rollup triggers were off during the load
+        db.rebuild_consumption_rollup()
+        with db.connection() as conn:
+            conn.execute("ANALYZE")
+        say(f"done in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic pharmacy database for benchmarking")
+    parser.add_argument("--db", default="synthetic_inventory.db", help="output database path")
+    parser.add_argument("--skus", type=int, default=50000, help="number of inventory SKUs")
+    parser.add_argument("--years", type=float, default=5, help="years of history to generate")
+    parser.add_argument("--suppliers", type=int, default=50, help="number of suppliers")
+    parser.add_argument("--daily-lines", type=int, help="consumption lines per day (default: skus / 25)")
+    parser.add_argument("--orders-per-day", type=int, help="purchase orders per day (default: skus / 250)")
+    parser.add_argument("--disposals-per-day", type=int, help="disposals per day (default: skus / 2500)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument("--today", type=date.fromisoformat, help="pin the end date (YYYY-MM-DD)")
+    parser.add_argument("--overwrite", action="store_true", help="replace the database if it exists")
+    args = parser.parse_args()
+
+    counts = generate_dataset(
+        args.db, skus=args.skus, years=args.years, suppliers=args.suppliers,
+        daily_lines=args.daily_lines, orders_per_day=args.orders_per_day,
+        disposals_per_day=args.disposals_per_day, seed=args.seed,
+        overwrite=args.overwrite, today=args.today,
+    )
+    for table, rows in counts.items():
+        print(f"{table:>22}: {rows:,}")
+
+
+if __name__ == "__main__":
+    main()
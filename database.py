@@ -1,321 +1,1417 @@
+import importlib.util
 import sqlite3
+import threading
+from contextlib import contextmanager
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import os
+import re
 import json
+from utils import BATCH_NUMBER_PATTERN, day_number
+
+class ConnectionPool:
+    """Thread-aware pool of warm SQLite connections.
+
+    Every thread is bound to one connection for as long as it is alive, so
+    pragmas and schema parsing are paid once per connection instead of once
+    per query. Streamlit starts a new script thread on every rerun, so
+    connections left behind by finished threads are recycled for new ones.
+    """
+
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000",
+        "PRAGMA cache_size=-65536",      # 64 MB page cache
+        "PRAGMA mmap_size=268435456",    # 256 MB memory-mapped I/O
+        "PRAGMA temp_store=MEMORY",
+    )
+
+    def __init__(self, db_path, max_idle=8):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._bound = {}
+        self._idle = []
+        self._local = threading.local()
+        self.data_version = 0
+        self.trace_callback = None
+        # Connection used only to read PRAGMA data_version
+        self._watch = None
+
+    def open(self):
+        """Open a new connection with the pool pragmas applied"""
+        conn = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        if self.trace_callback is not None:
+            conn.set_trace_callback(self.trace_callback)
+        return conn
+
+    def set_trace_callback(self, callback):
+        """Install (or with None, remove) an SQL trace callback on every pooled connection"""
+        with self._lock:
+            self.trace_callback = callback
+            conns = list(self._bound.values()) + self._idle
+        for conn in conns:
+            conn.set_trace_callback(callback)
+
+    def acquire(self):
+        """Get the connection bound to the calling thread"""
+        thread = threading.current_thread()
+        with self._lock:
+            conn = self._bound.get(thread)
+            if conn is not None:
+                return conn
+            self._reclaim_dead_threads()
+            conn = self._idle.pop() if self._idle else None
+
+        if conn is None:
+            conn = self.open()
+
+        with self._lock:
+            self._bound[thread] = conn
+        return conn
+
+    def _reclaim_dead_threads(self):
+        """Move connections of finished threads back to the idle list (lock held)"""
+        for thread in [t for t in self._bound if not t.is_alive()]:
+            conn = self._bound.pop(thread)
+            if conn.in_transaction:
+                conn.rollback()
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+            else:
+                conn.close()
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding the thread's connection.
+
+        The outermost block commits on success and rolls back on error, so
+        nested helpers can share one transaction. A nested block entered
+        inside an open transaction runs under a savepoint, so its error only
+        undoes its own writes. Blocks that changed rows bump data_version so
+        cached read models know to refresh.
+        """
+        conn = self.acquire()
+        depth = getattr(self._local, 'depth', 0)
+        changes = conn.total_changes
+        savepoint = f"nested_{depth}" if depth > 0 and conn.in_transaction else None
+        if savepoint:
+            conn.execute(f"SAVEPOINT {savepoint}")
+        self._local.depth = depth + 1
+        try:
+            yield conn
+            if savepoint:
+                conn.execute(f"RELEASE {savepoint}")
+            elif depth == 0 and conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if savepoint and conn.in_transaction:
+                conn.execute(f"ROLLBACK TO {savepoint}")
+                conn.execute(f"RELEASE {savepoint}")
+            elif depth == 0 and conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._local.depth = depth
+            if depth == 0 and conn.total_changes != changes:
+                self.bump_data_version()
+    
+    def bump_data_version(self):
+        """Mark cached read models as stale"""
+        with self._lock:
+            self.data_version += 1
+
+    def version_key(self):
+        """(in-process counter, PRAGMA data_version) identifying the database contents.
+
+        The pragma is read on a connection that never writes, so it moves
+        whenever any other connection commits, including ones in other
+        processes such as data_generator or a second app worker.
+        """
+        with self._lock:
+            if self._watch is None:
+                self._watch = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+            return (self.data_version, self._watch.execute("PRAGMA data_version").fetchone()[0])
+
+    def close_all(self):
+        """Close every pooled connection"""
+        with self._lock:
+            conns = list(self._bound.values()) + self._idle
+            if self._watch is not None:
+                conns.append(self._watch)
+                self._watch = None
+            self._bound.clear()
+            self._idle = []
+        for conn in conns:
+            conn.close()
+
+def _rebuild_consumption_rollup(conn):
+    """Recompute daily_consumption from consumption_patterns"""
+    conn.execute("DELETE FROM daily_consumption")
+    conn.execute('''
+        INSERT INTO daily_consumption (drug_id, date, department, quantity, entries)
+        SELECT COALESCE(drug_id, 0), date, COALESCE(department, ''),
+               SUM(COALESCE(quantity_consumed, 0)), COUNT(*)
+        FROM consumption_patterns
+        GROUP BY COALESCE(drug_id, 0), date, COALESCE(department, '')
+    ''')
+
+# Columns indexed for inventory search, with their bm25 weights
+INVENTORY_SEARCH_COLUMNS = [
+    ("drug_name", 10.0),
+    ("manufacturer", 3.0),
+    ("category", 2.0),
+    ("description", 1.0),
+]
+
+def _create_inventory_search(conn):
+    """Create the inventory_fts index and its sync triggers.
+
+    Skipped when SQLite was built without FTS5; search then falls back to LIKE.
+    """
+    columns = ", ".join(name for name, _ in INVENTORY_SEARCH_COLUMNS)
+    new_values = ", ".join(f"NEW.{name}" for name, _ in INVENTORY_SEARCH_COLUMNS)
+    old_values = ", ".join(f"OLD.{name}" for name, _ in INVENTORY_SEARCH_COLUMNS)
+    weights = ", ".join(str(weight) for _, weight in INVENTORY_SEARCH_COLUMNS)
+    try:
+        conn.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS inventory_fts USING fts5(
+                {columns},
+                content='inventory', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        if "fts5" in str(e):
+            return
+        raise
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_fts_insert
+        AFTER INSERT ON inventory
+        BEGIN
+            INSERT INTO inventory_fts (rowid, {columns}) VALUES (NEW.id, {new_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_fts_delete
+        AFTER DELETE ON inventory
+        BEGIN
+            INSERT INTO inventory_fts (inventory_fts, rowid, {columns})
+            VALUES ('delete', OLD.id, {old_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_fts_update
+        AFTER UPDATE OF {columns} ON inventory
+        BEGIN
+            INSERT INTO inventory_fts (inventory_fts, rowid, {columns})
+            VALUES ('delete', OLD.id, {old_values});
+            INSERT INTO inventory_fts (rowid, {columns}) VALUES (NEW.id, {new_values});
+        END
+    ''')
+    # Persist the column weights so "ORDER BY rank" uses them
+    conn.execute(f"INSERT INTO inventory_fts (inventory_fts, rank) VALUES ('rank', 'bm25({weights})')")
+    conn.execute("INSERT INTO inventory_fts (inventory_fts) VALUES ('rebuild')")
+
+def _fts_query(term, match_any=False):
+    """Turn free text into an FTS5 prefix query, or None if it has no words.
+
+    Every word is quoted (so operators and punctuation in user input are
+    inert) and prefix-matched; words are ANDed unless match_any is set.
+    """
+    words = re.findall(r"\w+", term or "")
+    if not words:
+        return None
+    joiner = " OR " if match_any else " "
+    return joiner.join(f'"{word}"*' for word in words)
+
+def _take_stock_snapshot(conn):
+    """Record every drug's stock and value plus the ledger position they include"""
+    ledger_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM stock_ledger").fetchone()[0]
+    total_stock, total_value = conn.execute(
+        "SELECT COALESCE(SUM(current_stock), 0), COALESCE(SUM(current_stock * COALESCE(unit_price, 0)), 0) "
+        "FROM inventory WHERE drug_master_id IS NOT NULL"
+    ).fetchone()
+    cursor = conn.execute(
+        "INSERT INTO stock_snapshot_runs (ledger_id, total_stock, total_value) VALUES (?, ?, ?)",
+        (ledger_id, total_stock, total_value)
+    )
+    run_id = cursor.lastrowid
+    # Drugs without a row were out of stock at this run
+    conn.execute('''
+        INSERT INTO stock_snapshots (run_id, drug_id, stock, value)
+        SELECT ?, drug_master_id, SUM(current_stock), SUM(current_stock * COALESCE(unit_price, 0))
+        FROM inventory
+        WHERE drug_master_id IS NOT NULL
+        GROUP BY drug_master_id
+        HAVING SUM(current_stock) != 0
+    ''', (run_id,))
+    return run_id
+
+# Tables whose row changes are published in change_log
+CHANGE_FEED_TABLES = ("inventory", "transactions", "purchase_orders", "suppliers")
+
+def _create_change_triggers(conn, table):
+    """(Re)create the triggers that log a table's row changes to change_log.
+    
+    Each entry carries the full row as JSON (the old row for deletes).
+    The column list is read from the live schema, so migrations that add
+    columns to a feed table should call this again.
+    """
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+    new_row = ", ".join(f"'{column}', NEW.{column}" for column in columns)
+    old_row = ", ".join(f"'{column}', OLD.{column}" for column in columns)
+    changed = " OR ".join(f"NEW.{column} IS NOT OLD.{column}" for column in columns)
+    for operation in ("insert", "update", "delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_changes_{operation}")
+    conn.execute(f'''
+        CREATE TRIGGER trg_{table}_changes_insert
+        AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO change_log (table_name, row_id, operation, data)
+            VALUES ('{table}', NEW.id, 'insert', json_object({new_row}));
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER trg_{table}_changes_update
+        AFTER UPDATE ON {table}
+        WHEN {changed}
+        BEGIN
+            INSERT INTO change_log (table_name, row_id, operation, data)
+            VALUES ('{table}', NEW.id, 'update', json_object({new_row}));
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER trg_{table}_changes_delete
+        AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO change_log (table_name, row_id, operation, data)
+            VALUES ('{table}', OLD.id, 'delete', json_object({old_row}));
+        END
+    ''')
+
+def _create_change_feed(conn):
+    for table in CHANGE_FEED_TABLES:
+        _create_change_triggers(conn, table)
+
+# Integer day numbers (days since 1970-01-01, see utils.day_number) kept
+# beside date columns as indexed virtual generated columns, so date range
+# filters become integer index range scans.
+# table -> (day column, source column, indexes as (name, columns))
+DAY_COLUMNS = {
+    "inventory": ("expiry_day", "expiry_date", [
+        ("idx_inventory_expiry_day", "expiry_day"),
+    ]),
+    "transactions": ("created_day", "created_at", [
+        ("idx_transactions_created_day", "created_day"),
+        ("idx_transactions_type_day", "transaction_type, created_day"),
+    ]),
+    "consumption_patterns": ("day", "date", [
+        ("idx_consumption_day", "day"),
+    ]),
+}
+
+def _add_day_columns(conn, schema="main"):
+    """Add the DAY_COLUMNS and their indexes to the tables present in schema"""
+    for table, (day_column, source_column, indexes) in DAY_COLUMNS.items():
+        if not conn.execute(
+            f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone():
+            continue
+        columns = {row[1] for row in conn.execute(f"PRAGMA {schema}.table_xinfo({table})")}
+        if day_column not in columns:
+            conn.execute(f'''
+                ALTER TABLE {schema}.{table} ADD COLUMN {day_column} INTEGER
+                GENERATED ALWAYS AS (CAST(julianday(date({source_column})) - 2440587.5 AS INTEGER)) VIRTUAL
+            ''')
+        for name, index_columns in indexes:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {schema}.{name} ON {table} ({index_columns})")
+
+def _begin_immediate(conn):
+    """Take the write lock up front, unless the caller's transaction already holds it"""
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+def _ledger_timestamp(ts):
+    """Normalise a datetime/date/string to the TIMESTAMP text format used by created_at.
+    
+    A plain date means the end of that day.
+    """
+    if isinstance(ts, datetime):
+        return ts.strftime('%Y-%m-%d %H:%M:%S')
+    if hasattr(ts, 'isoformat'):
+        return f"{ts.isoformat()} 23:59:59"
+    return str(ts)
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Each entry is (version, description, steps); a step is either an SQL string
+# or a callable taking the connection. Append new entries, never edit shipped ones.
+MIGRATIONS = [
+    (1, "Hot-path secondary indexes", [
+        # Forecasting, reorder and anomaly queries filter by drug then date range
+        "CREATE INDEX IF NOT EXISTS idx_consumption_drug_date ON consumption_patterns (drug_id, date, quantity_consumed)",
+        "CREATE INDEX IF NOT EXISTS idx_consumption_date ON consumption_patterns (date)",
+        # Wastage, cost trends and recent-transaction listings
+        "CREATE INDEX IF NOT EXISTS idx_transactions_drug_created ON transactions (drug_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_type_created ON transactions (transaction_type, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_created ON transactions (created_at)",
+        # Lookups by name, expiry windows and supplier joins
+        "CREATE INDEX IF NOT EXISTS idx_inventory_drug_name ON inventory (drug_name)",
+        "CREATE INDEX IF NOT EXISTS idx_inventory_expiry ON inventory (expiry_date)",
+        "CREATE INDEX IF NOT EXISTS idx_inventory_supplier ON inventory (supplier_name)",
+        "CREATE INDEX IF NOT EXISTS idx_inventory_category ON inventory (category)",
+        "CREATE INDEX IF NOT EXISTS idx_purchase_orders_supplier ON purchase_orders (supplier_id)",
+        "ANALYZE",
+    ]),
+    (2, "Daily consumption rollup", [
+        # One row per drug, day and department; NULL drug/department are
+        # stored as 0/'' so they can be part of the primary key
+        '''
+        CREATE TABLE IF NOT EXISTS daily_consumption (
+            drug_id INTEGER NOT NULL,
+            date DATE NOT NULL,
+            department TEXT NOT NULL DEFAULT '',
+            quantity INTEGER NOT NULL DEFAULT 0,
+            entries INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (drug_id, date, department)
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_daily_consumption_date ON daily_consumption (date, department)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_consumption_rollup_insert
+        AFTER INSERT ON consumption_patterns
+        BEGIN
+            INSERT INTO daily_consumption (drug_id, date, department, quantity, entries)
+            VALUES (COALESCE(NEW.drug_id, 0), NEW.date, COALESCE(NEW.department, ''),
+                    COALESCE(NEW.quantity_consumed, 0), 1)
+            ON CONFLICT (drug_id, date, department) DO UPDATE SET
+                quantity = quantity + excluded.quantity,
+                entries = entries + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_consumption_rollup_delete
+        AFTER DELETE ON consumption_patterns
+        BEGIN
+            UPDATE daily_consumption
+            SET quantity = quantity - COALESCE(OLD.quantity_consumed, 0),
+                entries = entries - 1
+            WHERE drug_id = COALESCE(OLD.drug_id, 0) AND date = OLD.date
+                AND department = COALESCE(OLD.department, '');
+            DELETE FROM daily_consumption
+            WHERE drug_id = COALESCE(OLD.drug_id, 0) AND date = OLD.date
+                AND department = COALESCE(OLD.department, '') AND entries <= 0;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_consumption_rollup_update
+        AFTER UPDATE OF drug_id, date, quantity_consumed, department ON consumption_patterns
+        BEGIN
+            UPDATE daily_consumption
+            SET quantity = quantity - COALESCE(OLD.quantity_consumed, 0),
+                entries = entries - 1
+            WHERE drug_id = COALESCE(OLD.drug_id, 0) AND date = OLD.date
+                AND department = COALESCE(OLD.department, '');
+            DELETE FROM daily_consumption
+            WHERE drug_id = COALESCE(OLD.drug_id, 0) AND date = OLD.date
+                AND department = COALESCE(OLD.department, '') AND entries <= 0;
+            INSERT INTO daily_consumption (drug_id, date, department, quantity, entries)
+            VALUES (COALESCE(NEW.drug_id, 0), NEW.date, COALESCE(NEW.department, ''),
+                    COALESCE(NEW.quantity_consumed, 0), 1)
+            ON CONFLICT (drug_id, date, department) DO UPDATE SET
+                quantity = quantity + excluded.quantity,
+                entries = entries + 1;
+        END
+        ''',
+        _rebuild_consumption_rollup,
+    ]),
+    (3, "Stock level index for the dashboard top 10", [
+        "CREATE INDEX IF NOT EXISTS idx_inventory_current_stock ON inventory (current_stock)",
+    ]),
+    (4, "Full-text inventory search", [
+        _create_inventory_search,
+    ]),
+    (5, "Inventory supplier foreign key", [
+        "ALTER TABLE inventory ADD COLUMN supplier_id INTEGER REFERENCES suppliers (id)",
+        "UPDATE inventory SET supplier_id = (SELECT id FROM suppliers WHERE name = inventory.supplier_name)",
+        "CREATE INDEX IF NOT EXISTS idx_inventory_supplier_id ON inventory (supplier_id)",
+        # supplier_name stays as the display/import field; these keep the id in step with it
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_supplier_id_insert
+        AFTER INSERT ON inventory
+        WHEN NEW.supplier_id IS NULL AND NEW.supplier_name IS NOT NULL
+        BEGIN
+            UPDATE inventory SET supplier_id = (SELECT id FROM suppliers WHERE name = NEW.supplier_name)
+            WHERE id = NEW.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_supplier_id_update
+        AFTER UPDATE OF supplier_name ON inventory
+        WHEN NEW.supplier_name IS NOT OLD.supplier_name
+        BEGIN
+            UPDATE inventory SET supplier_id = (SELECT id FROM suppliers WHERE name = NEW.supplier_name)
+            WHERE id = NEW.id;
+        END
+        ''',
+        # Items whose supplier is registered after them pick up the id, and
+        # renaming a supplier renames it on its items
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_suppliers_link_inventory
+        AFTER INSERT ON suppliers
+        BEGIN
+            UPDATE inventory SET supplier_id = NEW.id
+            WHERE supplier_name = NEW.name AND supplier_id IS NULL;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_suppliers_rename_inventory
+        AFTER UPDATE OF name ON suppliers
+        BEGIN
+            UPDATE inventory SET supplier_name = NEW.name WHERE supplier_id = NEW.id;
+        END
+        ''',
+    ]),
+    (6, "Drug master and stock batches", [
+        # One row per drug; inventory rows are its batches
+        '''
+        CREATE TABLE IF NOT EXISTS drugs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            drug_name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+            category TEXT,
+            manufacturer TEXT,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        "ALTER TABLE inventory ADD COLUMN drug_master_id INTEGER REFERENCES drugs (id)",
+        '''
+        INSERT OR IGNORE INTO drugs (drug_name, category, manufacturer, description)
+        SELECT drug_name, category, manufacturer, description FROM inventory ORDER BY id
+        ''',
+        "UPDATE inventory SET drug_master_id = (SELECT id FROM drugs WHERE drug_name = inventory.drug_name)",
+        # FEFO walks a drug's batches by expiry; current_stock makes per-drug totals index-only
+        "CREATE INDEX IF NOT EXISTS idx_inventory_drug_master_expiry ON inventory (drug_master_id, expiry_date, current_stock)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_drug_master_insert
+        AFTER INSERT ON inventory
+        BEGIN
+            INSERT OR IGNORE INTO drugs (drug_name, category, manufacturer, description)
+            VALUES (NEW.drug_name, NEW.category, NEW.manufacturer, NEW.description);
+            UPDATE inventory SET drug_master_id = (SELECT id FROM drugs WHERE drug_name = NEW.drug_name)
+            WHERE id = NEW.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_drug_master_update
+        AFTER UPDATE OF drug_name ON inventory
+        WHEN NEW.drug_name IS NOT OLD.drug_name
+        BEGIN
+            INSERT OR IGNORE INTO drugs (drug_name, category, manufacturer, description)
+            VALUES (NEW.drug_name, NEW.category, NEW.manufacturer, NEW.description);
+            UPDATE inventory SET drug_master_id = (SELECT id FROM drugs WHERE drug_name = NEW.drug_name)
+            WHERE id = NEW.id;
+        END
+        ''',
+        # Batch-level view of inventory. Note stock_batches.drug_id is the
+        # drug master id, while transactions/consumption drug_id is the batch id.
+        '''
+        CREATE VIEW IF NOT EXISTS stock_batches AS
+        SELECT id, drug_master_id AS drug_id, batch_number, expiry_date,
+               current_stock AS quantity, unit_price, supplier_id, created_at
+        FROM inventory
+        ''',
+    ]),
+    (7, "Append-only stock ledger and snapshots", [
+        # One row per change to a batch's stock or price, written by the
+        # inventory triggers below so every code path is captured.
+        # drug_id is the drug master id; balance is the batch's stock after.
+        '''
+        CREATE TABLE IF NOT EXISTS stock_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id INTEGER NOT NULL,
+            drug_id INTEGER NOT NULL,
+            delta INTEGER NOT NULL,
+            value_delta REAL NOT NULL DEFAULT 0,
+            balance INTEGER NOT NULL,
+            kind TEXT NOT NULL DEFAULT 'movement',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_stock_ledger_drug ON stock_ledger (drug_id, id, created_at, delta, value_delta)",
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_stock_ledger_no_update
+        BEFORE UPDATE ON stock_ledger
+        BEGIN
+            SELECT RAISE(ABORT, 'stock_ledger is append-only');
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_stock_ledger_no_delete
+        BEFORE DELETE ON stock_ledger
+        BEGIN
+            SELECT RAISE(ABORT, 'stock_ledger is append-only');
+        END
+        ''',
+        # A batch only counts towards a drug once drug_master_id is set, so
+        # inserts are logged here or by the update trigger when the drug
+        # master trigger fills the id in, whichever runs second
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_ledger_insert
+        AFTER INSERT ON inventory
+        WHEN NEW.drug_master_id IS NOT NULL AND NEW.current_stock != 0
+        BEGIN
+            INSERT INTO stock_ledger (item_id, drug_id, delta, value_delta, balance)
+            VALUES (NEW.id, NEW.drug_master_id, NEW.current_stock,
+                    NEW.current_stock * COALESCE(NEW.unit_price, 0), NEW.current_stock);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_ledger_update
+        AFTER UPDATE OF current_stock, unit_price, drug_master_id ON inventory
+        WHEN NEW.current_stock IS NOT OLD.current_stock
+            OR NEW.unit_price IS NOT OLD.unit_price
+            OR NEW.drug_master_id IS NOT OLD.drug_master_id
+        BEGIN
+            INSERT INTO stock_ledger (item_id, drug_id, delta, value_delta, balance)
+            SELECT NEW.id, NEW.drug_master_id, NEW.current_stock - OLD.current_stock,
+                   NEW.current_stock * COALESCE(NEW.unit_price, 0) - OLD.current_stock * COALESCE(OLD.unit_price, 0),
+                   NEW.current_stock
+            WHERE NEW.drug_master_id IS OLD.drug_master_id AND NEW.drug_master_id IS NOT NULL;
+            -- Batch moved to another drug: out of the old one, into the new one
+            INSERT INTO stock_ledger (item_id, drug_id, delta, value_delta, balance)
+            SELECT NEW.id, OLD.drug_master_id, -OLD.current_stock,
+                   -OLD.current_stock * COALESCE(OLD.unit_price, 0), 0
+            WHERE NEW.drug_master_id IS NOT OLD.drug_master_id AND OLD.drug_master_id IS NOT NULL;
+            INSERT INTO stock_ledger (item_id, drug_id, delta, value_delta, balance)
+            SELECT NEW.id, NEW.drug_master_id, NEW.current_stock,
+                   NEW.current_stock * COALESCE(NEW.unit_price, 0), NEW.current_stock
+            WHERE NEW.drug_master_id IS NOT OLD.drug_master_id AND NEW.drug_master_id IS NOT NULL;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_ledger_delete
+        AFTER DELETE ON inventory
+        WHEN OLD.drug_master_id IS NOT NULL AND OLD.current_stock != 0
+        BEGIN
+            INSERT INTO stock_ledger (item_id, drug_id, delta, value_delta, balance)
+            VALUES (OLD.id, OLD.drug_master_id, -OLD.current_stock,
+                    -OLD.current_stock * COALESCE(OLD.unit_price, 0), 0);
+        END
+        ''',
+        # Stock on hand when the ledger starts; earlier history is unknown
+        '''
+        INSERT INTO stock_ledger (item_id, drug_id, delta, value_delta, balance, kind)
+        SELECT id, drug_master_id, current_stock, current_stock * COALESCE(unit_price, 0),
+               current_stock, 'opening'
+        FROM inventory
+        WHERE drug_master_id IS NOT NULL AND current_stock != 0
+        ORDER BY id
+        ''',
+        # Each run snapshots all drugs at one ledger position
+        '''
+        CREATE TABLE IF NOT EXISTS stock_snapshot_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            taken_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            ledger_id INTEGER NOT NULL,
+            total_stock INTEGER NOT NULL DEFAULT 0,
+            total_value REAL NOT NULL DEFAULT 0
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_stock_snapshot_runs_taken ON stock_snapshot_runs (taken_at)",
+        '''
+        CREATE TABLE IF NOT EXISTS stock_snapshots (
+            run_id INTEGER NOT NULL,
+            drug_id INTEGER NOT NULL,
+            stock INTEGER NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (drug_id, run_id)
+        ) WITHOUT ROWID
+        ''',
+        _take_stock_snapshot,
+    ]),
+    (8, "Change data capture log", [
+        # seq only grows and SQLite has a single writer, so rows become
+        # visible to readers in seq order and a consumer's last seq is a
+        # safe resume point
+        '''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            operation TEXT NOT NULL,
+            data TEXT,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        _create_change_feed,
+    ]),
+    (9, "Indexed day numbers for date range filters", [
+        _add_day_columns,
+        # Superseded by the day-number indexes
+        "DROP INDEX IF EXISTS idx_inventory_expiry",
+        "DROP INDEX IF EXISTS idx_transactions_type_created",
+        "DROP INDEX IF EXISTS idx_consumption_date",
+    ]),
+    (10, "Materialized alerts", [
+        # Rows written by alert_engine.AlertEngine carry a dedup_key such as
+        # 'stock:42'; rows without one (reorder snooze/dismiss) are left alone
+        "ALTER TABLE alerts ADD COLUMN dedup_key TEXT",
+        "ALTER TABLE alerts ADD COLUMN priority TEXT",
+        "ALTER TABLE alerts ADD COLUMN rank INTEGER",
+        "ALTER TABLE alerts ADD COLUMN urgency REAL",
+        "ALTER TABLE alerts ADD COLUMN updated_at TIMESTAMP",
+        "ALTER TABLE alerts ADD COLUMN resolved_at TIMESTAMP",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_dedup ON alerts (dedup_key) WHERE dedup_key IS NOT NULL",
+        # The dashboard reads the top active alerts straight off this index
+        '''
+        CREATE INDEX IF NOT EXISTS idx_alerts_active ON alerts (rank DESC, urgency, id)
+        WHERE is_active = 1 AND dedup_key IS NOT NULL
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_alerts_active_drug ON alerts (drug_id)
+        WHERE is_active = 1 AND dedup_key IS NOT NULL
+        ''',
+    ]),
+    (11, "Reorder suggestion suppressions", [
+        # One row per snoozed or dismissed drug, checked by the reorder query
+        '''
+        CREATE TABLE IF NOT EXISTS reorder_suppressions (
+            drug_id INTEGER PRIMARY KEY,
+            reason TEXT NOT NULL,
+            suppressed_until TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (drug_id) REFERENCES inventory (id)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_reorder_suppressions_until ON reorder_suppressions (suppressed_until)",
+        # A dismissal (no suppressed_until) lasts until the item is restocked
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_inventory_restock_clears_dismissal
+        AFTER UPDATE OF current_stock ON inventory
+        WHEN NEW.current_stock > OLD.current_stock
+        BEGIN
+            DELETE FROM reorder_suppressions WHERE drug_id = NEW.id AND suppressed_until IS NULL;
+        END
+        ''',
+        # Carry over the snooze/dismiss rows written to alerts so far; snooze
+        # messages read "Snoozed for N days"
+        '''
+        INSERT OR REPLACE INTO reorder_suppressions (drug_id, reason, suppressed_until, created_at)
+        SELECT drug_id,
+               CASE alert_type WHEN 'reorder_snooze' THEN 'snooze' ELSE 'dismiss' END,
+               CASE alert_type WHEN 'reorder_snooze'
+                   THEN datetime(created_at, 'localtime', '+' || CAST(substr(message, 13) AS INTEGER) || ' days')
+               END,
+               created_at
+        FROM alerts
+        WHERE alert_type IN ('reorder_snooze', 'reorder_dismissed') AND drug_id IS NOT NULL
+        ORDER BY id
+        ''',
+        "DELETE FROM alerts WHERE alert_type IN ('reorder_snooze', 'reorder_dismissed')",
+    ]),
+    (12, "Expiry day number on stock batches", [
+        # FEFO and expiry actions filter batches on the indexed day number
+        "DROP VIEW IF EXISTS stock_batches",
+        '''
+        CREATE VIEW stock_batches AS
+        SELECT id, drug_master_id AS drug_id, batch_number, expiry_date, expiry_day,
+               current_stock AS quantity, unit_price, supplier_id, created_at
+        FROM inventory
+        ''',
+    ]),
+]
+
+# Queries behind the Settings page exports, keyed by the "Data Type" option
+EXPORT_QUERIES = {
+    "All Data": '''
+        SELECT i.*, s.name as supplier_name
+        FROM inventory i
+        LEFT JOIN suppliers s ON s.id = i.supplier_id
+    ''',
+    "Inventory Only": "SELECT * FROM inventory",
+    "Transactions Only": '''
+        SELECT t.*, i.drug_name
+        FROM transactions t
+        JOIN inventory i ON t.drug_id = i.id
+    ''',
+    "Reports Only": "SELECT * FROM consumption_patterns",
+}
+
+# Columns shown in the Inventory Management listings
+INVENTORY_LIST_COLUMNS = '''
+    SELECT i.id, i.drug_name, i.category, i.manufacturer, i.batch_number,
+           i.current_stock, i.minimum_stock, i.unit_price, i.expiry_date, i.supplier_name
+'''
+
+# Column types applied by _read_frame, per source table. "category" keeps
+# low-cardinality text as integer codes plus one copy of each value;
+# "datetime" parses SQLite date/timestamp text into datetime64 once, at load.
+TABLE_DTYPES = {
+    "inventory": {
+        "category": "category", "manufacturer": "category", "supplier_name": "category",
+        "expiry_date": "datetime", "created_at": "datetime", "updated_at": "datetime",
+    },
+    "transactions": {
+        "transaction_type": "category", "department": "category", "user_id": "category",
+        "created_at": "datetime",
+    },
+    "consumption_patterns": {"department": "category", "date": "datetime", "created_at": "datetime"},
+    "daily_consumption": {"department": "category", "date": "datetime"},
+    "purchase_orders": {
+        "status": "category", "order_date": "datetime", "expected_delivery": "datetime",
+        "actual_delivery": "datetime", "created_at": "datetime",
+    },
+    "drug_interactions": {"severity": "category"},
+    "stock_ledger": {"kind": "category", "created_at": "datetime"},
+}
+
+# Rows converted at a time by _read_frame for potentially large reads, so
+# only one chunk of raw text values is in memory at once
+READ_CHUNK_ROWS = 50000
+
+def _apply_dtypes(df, types):
+    for column, kind in types.items():
+        if column not in df.columns:
+            continue
+        if kind == "category":
+            df[column] = df[column].astype("category")
+        elif kind == "datetime":
+            df[column] = pd.to_datetime(df[column], format="ISO8601", errors="coerce")
+    return df
+
+def _read_frame(conn, query, params=(), tables=(), dtypes=None, chunked=False):
+    """pd.read_sql_query with the TABLE_DTYPES of the source tables applied.
+    
+    dtypes adds or overrides types for computed/aliased columns. With
+    chunked, rows are read and converted READ_CHUNK_ROWS at a time.
+    """
+    types = {}
+    for table in tables:
+        types.update(TABLE_DTYPES.get(table, {}))
+    types.update(dtypes or {})
+    if not chunked:
+        return _apply_dtypes(pd.read_sql_query(query, conn, params=params), types)
+    
+    chunks = [
+        _apply_dtypes(chunk, types)
+        for chunk in pd.read_sql_query(query, conn, params=params, chunksize=READ_CHUNK_ROWS)
+    ]
+    if len(chunks) == 1:
+        return chunks[0]
+    # Chunks only know the categories they saw; align them so concat keeps the dtype
+    for column in chunks[0].columns:
+        if isinstance(chunks[0][column].dtype, pd.CategoricalDtype):
+            categories = chunks[0][column].cat.categories
+            for chunk in chunks[1:]:
+                categories = categories.union(chunk[column].cat.categories)
+            for chunk in chunks:
+                chunk[column] = chunk[column].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+# Day-number column (see DAY_COLUMNS) each table is partitioned by month on
+# in Parquet snapshots; rows without a parseable date go to month=unknown
+PARQUET_PARTITION_COLUMNS = {
+    "transactions": "created_day",
+    "consumption_patterns": "day",
+}
+
+# Inventory columns accepted from uploaded files
+INVENTORY_IMPORT_COLUMNS = [
+    "drug_name", "category", "manufacturer", "batch_number", "current_stock",
+    "minimum_stock", "unit_price", "expiry_date", "supplier_name", "description",
+]
+
+def _is_parquet_export(path):
+    """Whether path looks like a table directory written by export_parquet"""
+    if not os.path.isdir(path) or os.path.islink(path):
+        return False
+    for entry in os.scandir(path):
+        if entry.is_file() and entry.name.endswith(".parquet"):
+            continue
+        if entry.is_dir(follow_symlinks=False) and entry.name.startswith("month="):
+            if all(f.is_file() and f.name.endswith(".parquet") for f in os.scandir(entry.path)):
+                continue
+        return False
+    return True
 
 class DatabaseManager:
-    def __init__(self, db_path="pharma_inventory.db"):
+    def __init__(self, db_path="pharma_inventory.db", demo_data=True):
         self.db_path = db_path
+        self.demo_data = demo_data
+        self.pool = ConnectionPool(db_path)
+        self.archive_dir = os.path.dirname(os.path.abspath(db_path))
+        self._snapshot_lock = threading.Lock()
+        self._dashboard_snapshot = None
         self.init_database()
+        self.search_enabled = self._table_exists("inventory_fts")
     
     def get_connection(self):
-        """Get database connection with row factory for easier data access"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Get a dedicated database connection (caller must close it)"""
+        return self.pool.open()
+    
+    def connection(self):
+        """Borrow the pooled connection for the current thread"""
+        return self.pool.connection()
+    
+    def close(self):
+        """Close all pooled connections"""
+        self.pool.close_all()
+    
+    def _archive_path(self, year):
+        """Path of the archive database holding rows from `year`"""
+        return os.path.join(self.archive_dir, f"archive_{year}.db")
+    
+    @contextmanager
+    def _archive_sources(self, conn, start_date, end_date):
+        """Attach the archive databases overlapping a date range (plus any legacy archive_unknown.db).
+        
+        Yields the schema names to read from, always starting with 'main';
+        archives are detached again on exit.
+        """
+        schemas = ["main"]
+        years = list(range(int(str(start_date)[:4]), int(str(end_date)[:4]) + 1))
+        # Older versions filed rows whose year they could not read here
+        years.append("unknown")
+        try:
+            for year in years:
+                path = self._archive_path(year)
+                if os.path.exists(path):
+                    conn.execute(f"ATTACH DATABASE ? AS archive_{year}", (path,))
+                    schemas.append(f"archive_{year}")
+            yield schemas
+        finally:
+            for schema in schemas[1:]:
+                conn.execute(f"DETACH DATABASE {schema}")
+    
+    @staticmethod
+    def _union_source(table, columns, schemas):
+        """FROM-clause source for `table` across the hot database and attached archives"""
+        if len(schemas) == 1:
+            return table
+        selects = " UNION ALL ".join(f"SELECT {columns} FROM {schema}.{table}" for schema in schemas)
+        return f"({selects})"
+    
+    @property
+    def data_version(self):
+        """Changes whenever a write commits, from this process or another one"""
+        return self.pool.version_key()
     
     def init_database(self):
         """Initialize database with all required tables"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Inventory table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS inventory (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                drug_name TEXT NOT NULL,
-                category TEXT NOT NULL,
-                manufacturer TEXT,
-                batch_number TEXT UNIQUE NOT NULL,
-                current_stock INTEGER DEFAULT 0,
-                minimum_stock INTEGER DEFAULT 10,
-                unit_price REAL DEFAULT 0.0,
-                expiry_date DATE,
-                supplier_name TEXT,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Inventory table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS inventory (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    drug_name TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    manufacturer TEXT,
+                    batch_number TEXT UNIQUE NOT NULL,
+                    current_stock INTEGER DEFAULT 0,
+                    minimum_stock INTEGER DEFAULT 10,
+                    unit_price REAL DEFAULT 0.0,
+                    expiry_date DATE,
+                    supplier_name TEXT,
+                    description TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Transactions table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS transactions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    drug_id INTEGER,
+                    transaction_type TEXT NOT NULL,
+                    quantity INTEGER NOT NULL,
+                    unit_price REAL,
+                    total_amount REAL,
+                    reference_number TEXT,
+                    notes TEXT,
+                    department TEXT,
+                    user_id TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (drug_id) REFERENCES inventory (id)
+                )
+            ''')
+            
+            # Suppliers table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS suppliers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT UNIQUE NOT NULL,
+                    contact_person TEXT,
+                    phone TEXT,
+                    email TEXT,
+                    address TEXT,
+                    lead_time_days INTEGER DEFAULT 7,
+                    reliability_score REAL DEFAULT 5.0,
+                    cost_rating REAL DEFAULT 5.0,
+                    quality_score REAL DEFAULT 5.0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Purchase orders table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS purchase_orders (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    order_number TEXT UNIQUE NOT NULL,
+                    supplier_id INTEGER,
+                    drug_id INTEGER,
+                    quantity INTEGER NOT NULL,
+                    unit_price REAL,
+                    total_amount REAL,
+                    status TEXT DEFAULT 'pending',
+                    order_date DATE DEFAULT CURRENT_DATE,
+                    expected_delivery DATE,
+                    actual_delivery DATE,
+                    notes TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (supplier_id) REFERENCES suppliers (id),
+                    FOREIGN KEY (drug_id) REFERENCES inventory (id)
+                )
+            ''')
+            
+            # Drug interactions table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS drug_interactions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    drug1 TEXT NOT NULL,
+                    drug2 TEXT NOT NULL,
+                    severity TEXT NOT NULL,
+                    description TEXT,
+                    clinical_effect TEXT,
+                    management TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Settings table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS settings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    setting_key TEXT UNIQUE NOT NULL,
+                    setting_value TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Consumption patterns table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS consumption_patterns (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    drug_id INTEGER,
+                    date DATE NOT NULL,
+                    quantity_consumed INTEGER DEFAULT 0,
+                    department TEXT,
+                    notes TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (drug_id) REFERENCES inventory (id)
+                )
+            ''')
+            
+            # Alerts table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS alerts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    alert_type TEXT NOT NULL,
+                    severity TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    drug_id INTEGER,
+                    is_active BOOLEAN DEFAULT 1,
+                    acknowledged BOOLEAN DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (drug_id) REFERENCES inventory (id)
+                )
+            ''')
         
-        # Transactions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                drug_id INTEGER,
-                transaction_type TEXT NOT NULL,
-                quantity INTEGER NOT NULL,
-                unit_price REAL,
-                total_amount REAL,
-                reference_number TEXT,
-                notes TEXT,
-                department TEXT,
-                user_id TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (drug_id) REFERENCES inventory (id)
-            )
-        ''')
+        self.run_migrations()
+        self.upgrade_archives()
         
-        # Suppliers table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS suppliers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                contact_person TEXT,
-                phone TEXT,
-                email TEXT,
-                address TEXT,
-                lead_time_days INTEGER DEFAULT 7,
-                reliability_score REAL DEFAULT 5.0,
-                cost_rating REAL DEFAULT 5.0,
-                quality_score REAL DEFAULT 5.0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        # Insert default data if tables are empty
+        if self.demo_data:
+            self.insert_default_data()
         
-        # Purchase orders table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS purchase_orders (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                order_number TEXT UNIQUE NOT NULL,
-                supplier_id INTEGER,
-                drug_id INTEGER,
-                quantity INTEGER NOT NULL,
-                unit_price REAL,
-                total_amount REAL,
-                status TEXT DEFAULT 'pending',
-                order_date DATE DEFAULT CURRENT_DATE,
-                expected_delivery DATE,
-                actual_delivery DATE,
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (supplier_id) REFERENCES suppliers (id),
-                FOREIGN KEY (drug_id) REFERENCES inventory (id)
-            )
-        ''')
+        self.ensure_stock_snapshot()
+    
+    def _table_exists(self, name):
+        """Check whether a table (or virtual table) exists in the main schema"""
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+            ).fetchone()
+            return row is not None
+    
+    def get_schema_version(self):
+        """Get the schema version recorded in PRAGMA user_version"""
+        with self.connection() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+    
+    def run_migrations(self):
+        """Upgrade the database in place to the latest schema version"""
+        with self.connection() as conn:
+            for version, description, steps in MIGRATIONS:
+                if version <= conn.execute("PRAGMA user_version").fetchone()[0]:
+                    continue
+                
+                # Take the write lock first, then re-check so concurrent
+                # processes starting up never apply the same migration twice
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if version > conn.execute("PRAGMA user_version").fetchone()[0]:
+                        for step in steps:
+                            if callable(step):
+                                step(conn)
+                            else:
+                                conn.execute(step)
+                        conn.execute(f"PRAGMA user_version = {int(version)}")
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+    
+    def upgrade_archives(self):
+        """Bring archive databases written by older versions up to the current archive schema.
         
-        # Drug interactions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS drug_interactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                drug1 TEXT NOT NULL,
-                drug2 TEXT NOT NULL,
-                severity TEXT NOT NULL,
-                description TEXT,
-                clinical_effect TEXT,
-                management TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        Done once at startup so the read paths that attach archives never write to them.
+        """
+        import glob
         
-        # Settings table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS settings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                setting_key TEXT UNIQUE NOT NULL,
-                setting_value TEXT,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        for path in sorted(glob.glob(os.path.join(self.archive_dir, "archive_*.db"))):
+            with self.connection() as conn:
+                conn.execute("ATTACH DATABASE ? AS archive", (path,))
+                try:
+                    _begin_immediate(conn)
+                    self._ensure_archive_schema(conn)
+                    conn.commit()
+                finally:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    conn.execute("DETACH DATABASE archive")
+    
+    def take_stock_snapshot(self):
+        """Snapshot every drug's stock so stock_as_of() only replays a short ledger tail"""
+        with self.connection() as conn:
+            _begin_immediate(conn)
+            return _take_stock_snapshot(conn)
+    
+    def ensure_stock_snapshot(self, max_age_hours=24):
+        """Take a snapshot if the latest one is older than max_age_hours"""
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT MAX(taken_at) > DATETIME('now', ?) FROM stock_snapshot_runs",
+                (f"-{int(max_age_hours)} hours",)
+            ).fetchone()
+        if not row[0]:
+            self.take_stock_snapshot()
+    
+    def _stock_at(self, conn, ts, drug_id=None):
+        """(stock, value, ledger_id) as of ts: the latest snapshot at or before ts plus the ledger after it"""
+        run = conn.execute('''
+            SELECT id, ledger_id, total_stock, total_value FROM stock_snapshot_runs
+            WHERE taken_at <= ? ORDER BY taken_at DESC, id DESC LIMIT 1
+        ''', (ts,)).fetchone()
+        run_id, ledger_id, stock, value = run if run else (None, 0, 0, 0.0)
         
-        # Consumption patterns table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS consumption_patterns (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                drug_id INTEGER,
-                date DATE NOT NULL,
-                quantity_consumed INTEGER DEFAULT 0,
-                department TEXT,
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (drug_id) REFERENCES inventory (id)
-            )
-        ''')
+        if drug_id is None:
+            tail = conn.execute('''
+                SELECT COALESCE(SUM(delta), 0), COALESCE(SUM(value_delta), 0)
+                FROM stock_ledger WHERE id > ? AND created_at <= ?
+            ''', (ledger_id, ts)).fetchone()
+        else:
+            snapshot = conn.execute(
+                "SELECT stock, value FROM stock_snapshots WHERE drug_id = ? AND run_id = ?",
+                (drug_id, run_id)
+            ).fetchone()
+            stock, value = snapshot if snapshot else (0, 0.0)
+            tail = conn.execute('''
+                SELECT COALESCE(SUM(delta), 0), COALESCE(SUM(value_delta), 0)
+                FROM stock_ledger WHERE drug_id = ? AND id > ? AND created_at <= ?
+            ''', (drug_id, ledger_id, ts)).fetchone()
+        return stock + tail[0], value + tail[1], ledger_id
+    
+    def stock_as_of(self, drug_id, ts):
+        """Stock of a drug (master id) at ts, a datetime or 'YYYY-MM-DD HH:MM:SS' UTC string"""
+        with self.connection() as conn:
+            return self._stock_at(conn, _ledger_timestamp(ts), drug_id)[0]
+    
+    def get_stock_history(self, start_date, end_date, drug_id=None):
+        """End-of-day stock and stock value for each day in the range.
         
-        # Alerts table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS alerts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                alert_type TEXT NOT NULL,
-                severity TEXT NOT NULL,
-                message TEXT NOT NULL,
-                drug_id INTEGER,
-                is_active BOOLEAN DEFAULT 1,
-                acknowledged BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (drug_id) REFERENCES inventory (id)
-            )
-        ''')
+        Covers one drug (master id) or, with drug_id=None, all drugs. Days
+        before the ledger started are left out, since their stock is unknown.
+        """
+        with self.connection() as conn:
+            first = conn.execute("SELECT DATE(created_at) FROM stock_ledger ORDER BY id LIMIT 1").fetchone()
+            if first is None:
+                return pd.DataFrame(columns=['date', 'stock', 'value'])
+            start = max(pd.Timestamp(start_date).normalize(), pd.Timestamp(first[0]))
+            end = pd.Timestamp(end_date).normalize()
+            if start > end:
+                return pd.DataFrame(columns=['date', 'stock', 'value'])
+            
+            opening_ts = (start - timedelta(seconds=1)).strftime('%Y-%m-%d %H:%M:%S')
+            stock, value, ledger_id = self._stock_at(conn, opening_ts, drug_id)
+            query = '''
+                SELECT DATE(created_at) as date, SUM(delta) as delta, SUM(value_delta) as value_delta
+                FROM stock_ledger
+                WHERE id > ? AND created_at > ? AND created_at <= ?
+            '''
+            params = [ledger_id, opening_ts, end.strftime('%Y-%m-%d 23:59:59')]
+            if drug_id is not None:
+                query += " AND drug_id = ?"
+                params.append(drug_id)
+            query += " GROUP BY DATE(created_at)"
+            deltas = _read_frame(conn, query, params, dtypes={'date': 'datetime'})
         
-        conn.commit()
-        conn.close()
+        days = pd.date_range(start, end, freq='D')
+        daily = deltas.set_index('date').reindex(days, fill_value=0)
+        history = pd.DataFrame({
+            'date': days,
+            'stock': stock + daily['delta'].cumsum().to_numpy(),
+            'value': value + daily['value_delta'].cumsum().to_numpy(),
+        })
+        return history
+    
+    def get_average_inventory(self, start_date, end_date, drug_id=None):
+        """Average end-of-day stock and value over the part of the range the ledger covers.
         
-        # Insert default data if tables are empty
-        self.insert_default_data()
+        Read-only: snapshots are kept fresh by the write path (see WriteQueue).
+        """
+        history = self.get_stock_history(start_date, end_date, drug_id)
+        if history.empty:
+            return {'avg_stock': 0.0, 'avg_value': 0.0, 'days': 0, 'start': None, 'end': None}
+        return {
+            'avg_stock': float(history['stock'].mean()),
+            'avg_value': float(history['value'].mean()),
+            'days': len(history),
+            'start': history['date'].iloc[0].date(),
+            'end': history['date'].iloc[-1].date(),
+        }
+    
+    def rebuild_consumption_rollup(self):
+        """Rebuild the daily consumption rollup, e.g. after a bulk backfill"""
+        with self.connection() as conn:
+            _begin_immediate(conn)
+            _rebuild_consumption_rollup(conn)
+            return conn.execute("SELECT COUNT(*) FROM daily_consumption").fetchone()[0]
     
     def insert_default_data(self):
         """Insert sample data for demonstration"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Check if we already have data
-        cursor.execute("SELECT COUNT(*) FROM inventory")
-        count = cursor.fetchone()[0]
-        
-        if count == 0:
-            # Insert sample suppliers
-            suppliers = [
-                ("PharmaCorp Inc", "John Smith", "+1-555-0101", "john@pharmacorp.com", "123 Pharma St", 5, 4.5, 4.0, 4.8),
-                ("MediSupply Co", "Sarah Johnson", "+1-555-0102", "sarah@medisupply.com", "456 Medical Ave", 7, 4.2, 3.8, 4.5),
-                ("HealthDist Ltd", "Mike Chen", "+1-555-0103", "mike@healthdist.com", "789 Health Blvd", 3, 4.8, 4.5, 4.9)
-            ]
-            
-            cursor.executemany('''
-                INSERT INTO suppliers (name, contact_person, phone, email, address, lead_time_days, reliability_score, cost_rating, quality_score)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', suppliers)
-            
-            # Insert sample inventory
-            inventory_items = [
-                ("Paracetamol 500mg", "Analgesics", "PharmaCorp", "PCM001", 250, 50, 20.75, "2025-06-15", "PharmaCorp Inc", "Pain relief medication"),
-                ("Amoxicillin 250mg", "Antibiotics", "MediSupply", "AMX001", 180, 30, 124.50, "2025-04-20", "MediSupply Co", "Antibiotic for bacterial infections"),
-                ("Metformin 500mg", "Diabetes", "HealthDist", "MET001", 320, 40, 62.25, "2025-12-10", "HealthDist Ltd", "Type 2 diabetes medication"),
-                ("Aspirin 75mg", "Cardiovascular", "PharmaCorp", "ASP001", 150, 25, 24.90, "2025-08-25", "PharmaCorp Inc", "Low-dose aspirin for heart health"),
-                ("Salbutamol Inhaler", "Respiratory", "MediSupply", "SAL001", 45, 15, 1037.50, "2025-03-30", "MediSupply Co", "Asthma relief inhaler"),
-                ("Insulin Rapid", "Diabetes", "HealthDist", "INS001", 25, 10, 3735.00, "2025-02-15", "HealthDist Ltd", "Fast-acting insulin"),
-                ("Ciprofloxacin 500mg", "Antibiotics", "PharmaCorp", "CIP001", 90, 20, 186.75, "2025-07-08", "PharmaCorp Inc", "Broad-spectrum antibiotic"),
-                ("Omeprazole 20mg", "Gastrointestinal", "MediSupply", "OME001", 200, 35, 70.55, "2025-09-12", "MediSupply Co", "Proton pump inhibitor"),
-                ("Atorvastatin 20mg", "Cardiovascular", "HealthDist", "ATO001", 175, 30, 99.60, "2025-11-18", "HealthDist Ltd", "Cholesterol-lowering medication"),
-                ("Prednisolone 5mg", "Steroids", "PharmaCorp", "PRE001", 80, 15, 78.85, "2025-05-22", "PharmaCorp Inc", "Anti-inflammatory steroid")
-            ]
-            
-            cursor.executemany('''
-                INSERT INTO inventory (drug_name, category, manufacturer, batch_number, current_stock, minimum_stock, unit_price, expiry_date, supplier_name, description)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', inventory_items)
-            
-            # Insert sample drug interactions
-            interactions = [
-                ("Aspirin 75mg", "Metformin 500mg", "Moderate", "May increase risk of lactic acidosis", "Increased monitoring required", "Monitor blood glucose closely"),
-                ("Ciprofloxacin 500mg", "Prednisolone 5mg", "Mild", "May increase steroid effects", "Potential enhanced anti-inflammatory action", "Standard monitoring sufficient"),
-                ("Insulin Rapid", "Aspirin 75mg", "Moderate", "Aspirin may enhance hypoglycemic effect", "Increased risk of low blood sugar", "Monitor glucose levels frequently")
-            ]
-            
-            cursor.executemany('''
-                INSERT INTO drug_interactions (drug1, drug2, severity, description, clinical_effect, management)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', interactions)
-            
-            # Insert sample consumption data for the last 30 days
-            drugs = cursor.execute("SELECT id, drug_name FROM inventory").fetchall()
-            for drug in drugs:
-                for days_ago in range(30):
-                    date = datetime.now() - timedelta(days=days_ago)
-                    # Generate realistic consumption patterns
-                    base_consumption = {
-                        "Paracetamol 500mg": 15,
-                        "Amoxicillin 250mg": 8,
-                        "Metformin 500mg": 12,
-                        "Aspirin 75mg": 6,
-                        "Salbutamol Inhaler": 2,
-                        "Insulin Rapid": 4,
-                        "Ciprofloxacin 500mg": 5,
-                        "Omeprazole 20mg": 10,
-                        "Atorvastatin 20mg": 9,
-                        "Prednisolone 5mg": 3
-                    }.get(drug['drug_name'], 5)
-                    
-                    # Add some randomness
-                    import random
-                    consumption = max(0, base_consumption + random.randint(-3, 3))
-                    
-                    cursor.execute('''
-                        INSERT INTO consumption_patterns (drug_id, date, quantity_consumed, department)
-                        VALUES (?, ?, ?, ?)
-                    ''', (drug['id'], date.date(), consumption, random.choice(['ICU', 'Emergency', 'General Ward', 'Outpatient'])))
+        with self.connection() as conn:
+            cursor = conn.cursor()
             
-            # Insert default settings
-            default_settings = [
-                ('default_min_stock', '10'),
-                ('low_stock_threshold', '20'),
-                ('auto_reorder', 'true'),
-                ('currency', 'INR'),
-                ('expiry_warning_days', '30'),
-                ('expiry_critical_days', '7')
-            ]
+            # Check if we already have data
+            cursor.execute("SELECT COUNT(*) FROM inventory")
+            count = cursor.fetchone()[0]
             
-            cursor.executemany('''
-                INSERT INTO settings (setting_key, setting_value)
-                VALUES (?, ?)
-            ''', default_settings)
-        
-        conn.commit()
-        conn.close()
+            if count == 0:
+                # Insert sample suppliers
+                suppliers = [
+                    ("PharmaCorp Inc", "John Smith", "+1-555-0101", "john@pharmacorp.com", "123 Pharma St", 5, 4.5, 4.0, 4.8),
+                    ("MediSupply Co", "Sarah Johnson", "+1-555-0102", "sarah@medisupply.com", "456 Medical Ave", 7, 4.2, 3.8, 4.5),
+                    ("HealthDist Ltd", "Mike Chen", "+1-555-0103", "mike@healthdist.com", "789 Health Blvd", 3, 4.8, 4.5, 4.9)
+                ]
+                
+                cursor.executemany('''
+                    INSERT INTO suppliers (name, contact_person, phone, email, address, lead_time_days, reliability_score, cost_rating, quality_score)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', suppliers)
+                
+                # Insert sample inventory
+                inventory_items = [
+                    ("Paracetamol 500mg", "Analgesics", "PharmaCorp", "PCM001", 250, 50, 20.75, "2025-06-15", "PharmaCorp Inc", "Pain relief medication"),
+                    ("Amoxicillin 250mg", "Antibiotics", "MediSupply", "AMX001", 180, 30, 124.50, "2025-04-20", "MediSupply Co", "Antibiotic for bacterial infections"),
+                    ("Metformin 500mg", "Diabetes", "HealthDist", "MET001", 320, 40, 62.25, "2025-12-10", "HealthDist Ltd", "Type 2 diabetes medication"),
+                    ("Aspirin 75mg", "Cardiovascular", "PharmaCorp", "ASP001", 150, 25, 24.90, "2025-08-25", "PharmaCorp Inc", "Low-dose aspirin for heart health"),
+                    ("Salbutamol Inhaler", "Respiratory", "MediSupply", "SAL001", 45, 15, 1037.50, "2025-03-30", "MediSupply Co", "Asthma relief inhaler"),
+                    ("Insulin Rapid", "Diabetes", "HealthDist", "INS001", 25, 10, 3735.00, "2025-02-15", "HealthDist Ltd", "Fast-acting insulin"),
+                    ("Ciprofloxacin 500mg", "Antibiotics", "PharmaCorp", "CIP001", 90, 20, 186.75, "2025-07-08", "PharmaCorp Inc", "Broad-spectrum antibiotic"),
+                    ("Omeprazole 20mg", "Gastrointestinal", "MediSupply", "OME001", 200, 35, 70.55, "2025-09-12", "MediSupply Co", "Proton pump inhibitor"),
+                    ("Atorvastatin 20mg", "Cardiovascular", "HealthDist", "ATO001", 175, 30, 99.60, "2025-11-18", "HealthDist Ltd", "Cholesterol-lowering medication"),
+                    ("Prednisolone 5mg", "Steroids", "PharmaCorp", "PRE001", 80, 15, 78.85, "2025-05-22", "PharmaCorp Inc", "Anti-inflammatory steroid")
+                ]
+                
+                cursor.executemany('''
+                    INSERT INTO inventory (drug_name, category, manufacturer, batch_number, current_stock, minimum_stock, unit_price, expiry_date, supplier_name, description)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', inventory_items)
+                
+                # Insert sample drug interactions
+                interactions = [
+                    ("Aspirin 75mg", "Metformin 500mg", "Moderate", "May increase risk of lactic acidosis", "Increased monitoring required", "Monitor blood glucose closely"),
+                    ("Ciprofloxacin 500mg", "Prednisolone 5mg", "Mild", "May increase steroid effects", "Potential enhanced anti-inflammatory action", "Standard monitoring sufficient"),
+                    ("Insulin Rapid", "Aspirin 75mg", "Moderate", "Aspirin may enhance hypoglycemic effect", "Increased risk of low blood sugar", "Monitor glucose levels frequently")
+                ]
+                
+                cursor.executemany('''
+                    INSERT INTO drug_interactions (drug1, drug2, severity, description, clinical_effect, management)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', interactions)
+                
+                # Insert sample consumption data for the last 30 days
+                base_consumption = {
+                    "Paracetamol 500mg": 15,
+                    "Amoxicillin 250mg": 8,
+                    "Metformin 500mg": 12,
+                    "Aspirin 75mg": 6,
+                    "Salbutamol Inhaler": 2,
+                    "Insulin Rapid": 4,
+                    "Ciprofloxacin 500mg": 5,
+                    "Omeprazole 20mg": 10,
+                    "Atorvastatin 20mg": 9,
+                    "Prednisolone 5mg": 3
+                }
+                departments = np.array(['ICU', 'Emergency', 'General Ward', 'Outpatient'])
+                rng = np.random.default_rng(42)
+                drugs = cursor.execute("SELECT id, drug_name FROM inventory").fetchall()
+                dates = [(datetime.now() - timedelta(days=days_ago)).date().isoformat() for days_ago in range(30)]
+                
+                consumption_rows = []
+                for drug in drugs:
+                    # Generate realistic consumption patterns with some randomness
+                    base = base_consumption.get(drug['drug_name'], 5)
+                    consumed = np.maximum(0, base + rng.integers(-3, 4, size=len(dates)))
+                    depts = rng.choice(departments, size=len(dates))
+                    consumption_rows.extend(
+                        (drug['id'], date, int(qty), str(dept))
+                        for date, qty, dept in zip(dates, consumed, depts)
+                    )
+                
+                cursor.executemany('''
+                    INSERT INTO consumption_patterns (drug_id, date, quantity_consumed, department)
+                    VALUES (?, ?, ?, ?)
+                ''', consumption_rows)
+                
+                # Insert default settings
+                default_settings = [
+                    ('default_min_stock', '10'),
+                    ('low_stock_threshold', '20'),
+                    ('auto_reorder', 'true'),
+                    ('currency', 'INR'),
+                    ('expiry_warning_days', '30'),
+                    ('expiry_critical_days', '7')
+                ]
+                
+                cursor.executemany('''
+                    INSERT INTO settings (setting_key, setting_value)
+                    VALUES (?, ?)
+                ''', default_settings)
     
     # Dashboard methods
+    def get_dashboard_snapshot(self):
+        """Get all dashboard KPIs and charts, cached until the data changes"""
+        today = datetime.now().date()
+        # Read the version before querying so a concurrent write always
+        # leaves the cached snapshot stale rather than wrongly fresh
+        key = (self.data_version, today)
+        with self._snapshot_lock:
+            cached = self._dashboard_snapshot
+        if cached is None or cached[0] != key:
+            cached = (key, self._build_dashboard_snapshot(today))
+            with self._snapshot_lock:
+                self._dashboard_snapshot = cached
+        
+        snapshot = dict(cached[1])
+        snapshot['category_distribution'] = snapshot['category_distribution'].copy()
+        snapshot['stock_levels'] = snapshot['stock_levels'].copy()
+        return snapshot
+    
+    def _build_dashboard_snapshot(self, today):
+        """Compute dashboard KPIs with one grouped scan of inventory"""
+        expiry_cutoff = today + timedelta(days=30)
+        with self.connection() as conn:
+            by_category = pd.read_sql_query('''
+                SELECT category,
+                       COUNT(*) as items,
+                       SUM(current_stock) as quantity,
+                       SUM(current_stock <= minimum_stock) as low_stock,
+                       SUM(expiry_day <= ?) as expiring_soon,
+                       SUM(current_stock * unit_price) as total_value
+                FROM inventory
+                GROUP BY category
+            ''', conn, params=(day_number(expiry_cutoff),))
+            # Served from idx_inventory_current_stock, reads only ten rows
+            stock_levels = pd.read_sql_query('''
+                SELECT drug_name, current_stock, minimum_stock
+                FROM inventory
+                ORDER BY current_stock ASC
+                LIMIT 10
+            ''', conn)
+        
+        category_distribution = (
+            by_category[['category', 'quantity']]
+            .sort_values('quantity', ascending=False)
+            .reset_index(drop=True)
+        )
+        return {
+            'total_items': int(by_category['items'].sum()),
+            'low_stock_items': int(by_category['low_stock'].fillna(0).sum()),
+            'expiring_soon': int(by_category['expiring_soon'].fillna(0).sum()),
+            'total_value': float(by_category['total_value'].fillna(0).sum()),
+            'category_distribution': category_distribution,
+            'stock_levels': stock_levels,
+        }
+    
     def get_total_inventory_count(self):
         """Get total number of inventory items"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM inventory")
-        count = cursor.fetchone()[0]
-        conn.close()
-        return count
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM inventory")
+            return cursor.fetchone()[0]
     
     def get_low_stock_count(self):
         """Get count of items below minimum stock level"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM inventory WHERE current_stock <= minimum_stock")
-        count = cursor.fetchone()[0]
-        conn.close()
-        return count
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM inventory WHERE current_stock <= minimum_stock")
+            return cursor.fetchone()[0]
     
     def get_expiring_soon_count(self):
         """Get count of items expiring within 30 days"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        expiry_date = datetime.now() + timedelta(days=30)
-        cursor.execute("SELECT COUNT(*) FROM inventory WHERE expiry_date <= ?", (expiry_date.date(),))
-        count = cursor.fetchone()[0]
-        conn.close()
-        return count
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM inventory WHERE expiry_day <= ?", (day_number() + 30,))
+            return cursor.fetchone()[0]
     
     def get_total_inventory_value(self):
         """Get total value of current inventory"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT SUM(current_stock * unit_price) FROM inventory")
-        result = cursor.fetchone()[0]
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT SUM(current_stock * unit_price) FROM inventory")
+            result = cursor.fetchone()[0]
         return result or 0.0
     
     def get_inventory_by_category(self):
         """Get inventory distribution by category"""
-        conn = self.get_connection()
         query = '''
             SELECT category, SUM(current_stock) as quantity
             FROM inventory
             GROUP BY category
             ORDER BY quantity DESC
         '''
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
+        with self.connection() as conn:
+            return pd.read_sql_query(query, conn)
     
     def get_inventory(self):
         """Get all inventory items"""
         try:
-            conn = self.get_connection()
             query = """
                 SELECT * FROM inventory
                 ORDER BY drug_name
             """
-            df = pd.read_sql_query(query, conn)
-            conn.close()
-            return df
+            with self.connection() as conn:
+                return _read_frame(conn, query, tables=("inventory",), chunked=True)
         except Exception as e:
             print(f"Error getting inventory: {e}")
             return pd.DataFrame()
@@ -323,35 +1419,30 @@ class DatabaseManager:
     def get_expiring_drugs(self, days_ahead=30):
         """Get drugs expiring within specified days"""
         try:
-            conn = self.get_connection()
             query = """
                 SELECT * FROM inventory
-                WHERE expiry_date <= DATE('now', '+' || ? || ' days')
-                ORDER BY expiry_date
+                WHERE expiry_day <= ?
+                ORDER BY expiry_day
             """
-            df = pd.read_sql_query(query, conn, params=(days_ahead,))
-            conn.close()
-            return df
+            with self.connection() as conn:
+                return _read_frame(conn, query, (day_number() + int(days_ahead),), tables=("inventory",))
         except Exception as e:
             print(f"Error getting expiring drugs: {e}")
             return pd.DataFrame()
     
     def get_stock_levels(self):
         """Get current stock levels for all drugs"""
-        conn = self.get_connection()
         query = '''
             SELECT drug_name, current_stock, minimum_stock
             FROM inventory
             ORDER BY current_stock ASC
             LIMIT 10
         '''
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
+        with self.connection() as conn:
+            return pd.read_sql_query(query, conn)
     
     def get_recent_transactions(self, limit=10):
         """Get recent transactions"""
-        conn = self.get_connection()
         query = '''
             SELECT t.transaction_type, i.drug_name, t.quantity, t.total_amount, t.notes, t.created_at
             FROM transactions t
@@ -359,351 +1450,616 @@ class DatabaseManager:
             ORDER BY t.created_at DESC
             LIMIT ?
         '''
-        df = pd.read_sql_query(query, conn, params=(limit,))
-        conn.close()
-        return df
+        with self.connection() as conn:
+            return _read_frame(conn, query, (limit,), tables=("transactions",))
     
     # Inventory management methods
     def get_categories(self):
         """Get list of drug categories"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT category FROM inventory ORDER BY category")
-        categories = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return categories
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT category FROM inventory ORDER BY category")
+            return [row[0] for row in cursor.fetchall()]
     
-    def get_filtered_inventory(self, category_filter, stock_filter, search_term):
-        """Get filtered inventory data"""
-        conn = self.get_connection()
+    def _inventory_filter(self, category_filter, stock_filter, search_term):
+        """Build the FROM/WHERE clause shared by the inventory listings.
         
-        query = '''
-            SELECT id, drug_name, category, manufacturer, batch_number, 
-                   current_stock, minimum_stock, unit_price, expiry_date, supplier_name
-            FROM inventory
-            WHERE 1=1
-        '''
+        Returns (sql, params, match); match is the FTS query when the search
+        term goes through the full-text index, else None.
+        """
+        match = _fts_query(search_term) if self.search_enabled else None
+        sql = " FROM inventory i"
         params = []
         
+        if match:
+            sql += " JOIN inventory_fts ON inventory_fts.rowid = i.id AND inventory_fts MATCH ?"
+            params.append(match)
+        sql += " WHERE 1=1"
+        
         if category_filter != "All":
-            query += " AND category = ?"
+            sql += " AND i.category = ?"
             params.append(category_filter)
         
         if stock_filter == "Low Stock":
-            query += " AND current_stock <= minimum_stock"
+            sql += " AND i.current_stock <= i.minimum_stock"
         elif stock_filter == "Out of Stock":
-            query += " AND current_stock = 0"
+            sql += " AND i.current_stock = 0"
         elif stock_filter == "Normal":
-            query += " AND current_stock > minimum_stock"
+            sql += " AND i.current_stock > i.minimum_stock"
         
-        if search_term:
-            query += " AND drug_name LIKE ?"
+        if search_term and not match:
+            sql += " AND i.drug_name LIKE ?"
             params.append(f"%{search_term}%")
         
-        query += " ORDER BY drug_name"
+        return sql, params, match
+    
+    def get_filtered_inventory(self, category_filter, stock_filter, search_term):
+        """Get filtered inventory data, best search matches first"""
+        where, params, match = self._inventory_filter(category_filter, stock_filter, search_term)
+        query = INVENTORY_LIST_COLUMNS + where
+        query += " ORDER BY inventory_fts.rank, i.drug_name" if match else " ORDER BY i.drug_name"
+        
+        with self.connection() as conn:
+            return _read_frame(conn, query, params, tables=("inventory",), chunked=True)
+    
+    def get_inventory_page(self, category_filter="All", stock_filter="All", search_term="",
+                           page_size=50, after=None):
+        """Get one page of filtered inventory ordered by (drug_name, id).
+        
+        after is the (drug_name, id) cursor of the last row of the previous
+        page, or None for the first page. Returns (page_df, next_cursor);
+        next_cursor is None on the last page.
+        """
+        where, params, _ = self._inventory_filter(category_filter, stock_filter, search_term)
+        query = INVENTORY_LIST_COLUMNS + where
+        if after is not None:
+            query += " AND (i.drug_name, i.id) > (?, ?)"
+            params.extend(after)
+        # Fetch one extra row to know whether there is a next page
+        query += " ORDER BY i.drug_name, i.id LIMIT ?"
+        params.append(page_size + 1)
         
-        df = pd.read_sql_query(query, conn, params=params)
-        conn.close()
-        return df
+        with self.connection() as conn:
+            page = _read_frame(conn, query, params, tables=("inventory",))
+        if len(page) <= page_size:
+            return page, None
+        page = page.iloc[:page_size]
+        last = page.iloc[-1]
+        return page, (last['drug_name'], int(last['id']))
+    
+    def count_inventory(self, category_filter="All", stock_filter="All", search_term="",
+                        cap=10000):
+        """Estimate how many inventory rows match the filters.
+        
+        Returns (count, exact). Counting stops at cap rows so a broad
+        filter on a huge catalog stays cheap; exact is False when capped.
+        """
+        with self.connection() as conn:
+            where, params, _ = self._inventory_filter(category_filter, stock_filter, search_term)
+            count = conn.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1{where} LIMIT ?)", params + [cap + 1]
+            ).fetchone()[0]
+            return min(count, cap), count <= cap
+    
+    def get_transactions_page(self, page_size=50, before=None):
+        """Get one page of transactions, newest first, ordered by (created_at, id).
+        
+        before is the (created_at, id) cursor of the last row of the previous
+        page, or None for the first page. Returns (page_df, next_cursor).
+        """
+        # created_at is also selected as stored text for the next cursor;
+        # the parsed column can be NaT or lose fractional seconds/'T'
+        query = '''
+            SELECT t.*, i.drug_name, t.created_at AS cursor_created_at
+            FROM transactions t
+            JOIN inventory i ON t.drug_id = i.id
+        '''
+        params = []
+        if before is not None:
+            query += " WHERE (t.created_at, t.id) < (?, ?)"
+            params.extend(before)
+        query += " ORDER BY t.created_at DESC, t.id DESC LIMIT ?"
+        params.append(page_size + 1)
+        
+        with self.connection() as conn:
+            page = _read_frame(conn, query, params, tables=("transactions",))
+        cursor_values = page.pop('cursor_created_at')
+        if len(page) <= page_size:
+            return page, None
+        page = page.iloc[:page_size]
+        return page, (cursor_values.iloc[page_size - 1], int(page['id'].iloc[-1]))
+    
+    def search_inventory(self, term, limit=20, match_any=False):
+        """Full-text search over drug name, manufacturer, category and description.
+        
+        Words are prefix-matched ("para 500" finds "Paracetamol 500mg") and
+        results are ranked with drug name matches weighted highest. With
+        match_any, items matching any of the words are returned.
+        """
+        try:
+            match = _fts_query(term, match_any) if self.search_enabled else None
+            with self.connection() as conn:
+                if match:
+                    query = '''
+                        SELECT i.*
+                        FROM inventory_fts
+                        JOIN inventory i ON i.id = inventory_fts.rowid
+                        WHERE inventory_fts MATCH ?
+                        ORDER BY inventory_fts.rank
+                        LIMIT ?
+                    '''
+                    return _read_frame(conn, query, (match, limit), tables=("inventory",))
+                if self.search_enabled or not term:
+                    return pd.DataFrame()
+                query = "SELECT * FROM inventory WHERE drug_name LIKE ? ORDER BY drug_name LIMIT ?"
+                return _read_frame(conn, query, (f"%{term}%", limit), tables=("inventory",))
+        except Exception as e:
+            print(f"Error searching inventory: {e}")
+            return pd.DataFrame()
     
     def add_inventory_item(self, drug_name, category, manufacturer, batch_number,
                           current_stock, minimum_stock, unit_price, expiry_date,
                           supplier_name, description):
         """Add new inventory item"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO inventory (drug_name, category, manufacturer, batch_number,
-                                     current_stock, minimum_stock, unit_price, expiry_date,
-                                     supplier_name, description)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (drug_name, category, manufacturer, batch_number,
-                  current_stock, minimum_stock, unit_price, expiry_date,
-                  supplier_name, description))
-            
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    INSERT INTO inventory (drug_name, category, manufacturer, batch_number,
+                                         current_stock, minimum_stock, unit_price, expiry_date,
+                                         supplier_name, description)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (drug_name, category, manufacturer, batch_number,
+                      current_stock, minimum_stock, unit_price, expiry_date,
+                      supplier_name, description))
             return True
         except sqlite3.IntegrityError:
             return False
     
     def get_all_items_for_dropdown(self):
         """Get all inventory items formatted for dropdown"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, drug_name, batch_number FROM inventory ORDER BY drug_name")
-        items = [f"{row[0]} - {row[1]} ({row[2]})" for row in cursor.fetchall()]
-        conn.close()
-        return items
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, drug_name, batch_number FROM inventory ORDER BY drug_name")
+            return [f"{row[0]} - {row[1]} ({row[2]})" for row in cursor.fetchall()]
     
     def get_item_details(self, item_id):
         """Get details of a specific inventory item"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM inventory WHERE id = ?", (item_id,))
-        result = cursor.fetchone()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM inventory WHERE id = ?", (item_id,))
+            result = cursor.fetchone()
         return dict(result) if result else None
     
     def update_stock_level(self, item_id, new_stock, transaction_type, quantity, reason):
         """Update stock level and log transaction"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Update inventory
-            cursor.execute("UPDATE inventory SET current_stock = ? WHERE id = ?", (new_stock, item_id))
-            
-            # Log transaction
-            cursor.execute('''
-                INSERT INTO transactions (drug_id, transaction_type, quantity, notes)
-                VALUES (?, ?, ?, ?)
-            ''', (item_id, transaction_type, quantity, reason))
-            
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                
+                # Update inventory
+                cursor.execute("UPDATE inventory SET current_stock = ? WHERE id = ?", (new_stock, item_id))
+                
+                # Log transaction
+                cursor.execute('''
+                    INSERT INTO transactions (drug_id, transaction_type, quantity, notes)
+                    VALUES (?, ?, ?, ?)
+                ''', (item_id, transaction_type, quantity, reason))
             return True
         except Exception:
             return False
     
+    def _apply_movement(self, cursor, movement):
+        """Apply one signed stock delta and log it, inside the caller's transaction"""
+        item_id = movement['item_id']
+        delta = int(movement['quantity'])
+        result = {'item_id': item_id, 'quantity': delta, 'success': False,
+                  'new_stock': None, 'error': None}
+        
+        # Guarded relative update: concurrent dispensers cannot lose
+        # each other's changes or drive stock negative
+        cursor.execute('''
+            UPDATE inventory
+            SET current_stock = current_stock + ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND current_stock + ? >= 0
+        ''', (delta, item_id, delta))
+        updated = cursor.rowcount
+        
+        cursor.execute("SELECT current_stock FROM inventory WHERE id = ?", (item_id,))
+        row = cursor.fetchone()
+        if row is None:
+            result['error'] = "Item not found"
+            return result
+        result['new_stock'] = row[0]
+        if not updated:
+            result['error'] = f"Insufficient stock ({row[0]} available)"
+            return result
+        
+        cursor.execute('''
+            INSERT INTO transactions (drug_id, transaction_type, quantity, notes,
+                                      department, user_id, reference_number)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (item_id,
+              movement.get('transaction_type') or ("Add Stock" if delta >= 0 else "Remove Stock"),
+              abs(delta), movement.get('reason'), movement.get('department'),
+              movement.get('user_id'), movement.get('reference_number')))
+        result['success'] = True
+        return result
+    
+    def apply_stock_movements(self, movements, all_or_nothing=False):
+        """Apply signed stock deltas and log their transactions in one write transaction.
+        
+        Each movement is a dict with 'item_id' and a signed 'quantity', plus
+        optional 'transaction_type', 'reason', 'department', 'user_id' and
+        'reference_number'. Lines that would take stock below zero or refer
+        to unknown items are rejected; with all_or_nothing=True any rejected
+        line rolls the whole batch back. Returns one result dict per line.
+        """
+        results = []
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                _begin_immediate(conn)
+                
+                for movement in movements:
+                    results.append(self._apply_movement(cursor, movement))
+                
+                if all_or_nothing and not all(r['success'] for r in results):
+                    raise sqlite3.IntegrityError("Batch rolled back")
+        except Exception as e:
+            for r in results:
+                r['success'] = False
+                r['new_stock'] = None
+                r['error'] = r['error'] or str(e)
+        
+        return results
+    
     # AI Forecasting methods
     def get_drugs_for_forecasting(self):
         """Get drugs that have enough historical data for forecasting"""
-        conn = self.get_connection()
         query = '''
             SELECT DISTINCT i.drug_name
             FROM inventory i
-            JOIN consumption_patterns cp ON i.id = cp.drug_id
+            JOIN daily_consumption dc ON i.id = dc.drug_id
             GROUP BY i.drug_name
-            HAVING COUNT(cp.id) >= 7
+            HAVING SUM(dc.entries) >= 7
             ORDER BY i.drug_name
         '''
-        cursor = conn.cursor()
-        cursor.execute(query)
-        drugs = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return drugs
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query)
+            return [row[0] for row in cursor.fetchall()]
     
     def get_historical_consumption(self, drug_name):
         """Get historical consumption data for a drug"""
-        conn = self.get_connection()
         query = '''
-            SELECT cp.date, SUM(cp.quantity_consumed) as consumption
-            FROM consumption_patterns cp
-            JOIN inventory i ON cp.drug_id = i.id
+            SELECT dc.date, SUM(dc.quantity) as consumption
+            FROM daily_consumption dc
+            JOIN inventory i ON dc.drug_id = i.id
             WHERE i.drug_name = ?
-            GROUP BY cp.date
-            ORDER BY cp.date
+            GROUP BY dc.date
+            ORDER BY dc.date
         '''
-        df = pd.read_sql_query(query, conn, params=(drug_name,))
-        df['date'] = pd.to_datetime(df['date'])
-        conn.close()
-        return df
+        with self.connection() as conn:
+            return _read_frame(conn, query, (drug_name,), tables=("daily_consumption",))
     
     def get_current_stock(self, drug_name):
-        """Get current stock for a drug"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT current_stock FROM inventory WHERE drug_name = ?", (drug_name,))
-        result = cursor.fetchone()
-        conn.close()
+        """Get current stock for a drug, summed over all of its batches"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COALESCE(SUM(i.current_stock), 0)
+                FROM drugs d
+                JOIN inventory i ON i.drug_master_id = d.id
+                WHERE d.drug_name = ?
+            ''', (drug_name,))
+            result = cursor.fetchone()
         return result[0] if result else 0
     
+    def get_drug_id(self, drug_name):
+        """Get the drug master id for a drug name (case-insensitive), or None"""
+        with self.connection() as conn:
+            row = conn.execute("SELECT id FROM drugs WHERE drug_name = ?", (drug_name,)).fetchone()
+        return row[0] if row else None
+    
+    def get_drug_batches(self, drug_name, include_empty=False):
+        """Get a drug's batches in First-Expired-First-Out order"""
+        query = '''
+            SELECT b.id, b.batch_number, b.expiry_date, b.quantity, b.unit_price
+            FROM drugs d
+            JOIN stock_batches b ON b.drug_id = d.id
+            WHERE d.drug_name = ?
+        '''
+        if not include_empty:
+            query += " AND b.quantity > 0"
+        query += " ORDER BY b.expiry_day IS NULL, b.expiry_day, b.id"
+        with self.connection() as conn:
+            return _read_frame(conn, query, (drug_name,), tables=("inventory",))
+    
+    def dispense_fefo(self, drug_name, quantity, department=None, reason=None,
+                      user_id=None, reference_number=None, include_expired=False):
+        """Dispense a quantity of a drug across its batches, earliest expiry first.
+        
+        Batches are picked and decremented in one write transaction, so two
+        dispensers can never allocate the same units. Expired batches are
+        skipped unless include_expired is set. If the drug's usable stock
+        cannot cover the full quantity nothing is dispensed. Returns a dict
+        with 'success', 'allocations' (item_id, batch_number, expiry_date,
+        quantity per batch), 'available' and 'error'.
+        """
+        quantity = int(quantity)
+        outcome = {'success': False, 'allocations': [], 'available': 0, 'error': None}
+        if quantity <= 0:
+            outcome['error'] = "Quantity must be positive"
+            return outcome
+        
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                _begin_immediate(conn)
+                
+                query = '''
+                    SELECT b.id, b.batch_number, b.expiry_date, b.quantity
+                    FROM drugs d
+                    JOIN stock_batches b ON b.drug_id = d.id
+                    WHERE d.drug_name = ? AND b.quantity > 0
+                '''
+                params = [drug_name]
+                if not include_expired:
+                    query += " AND (b.expiry_day IS NULL OR b.expiry_day >= ?)"
+                    params.append(day_number())
+                query += " ORDER BY b.expiry_day IS NULL, b.expiry_day, b.id"
+                batches = cursor.execute(query, params).fetchall()
+                
+                outcome['available'] = sum(batch[3] for batch in batches)
+                if outcome['available'] < quantity:
+                    outcome['error'] = f"Insufficient stock ({outcome['available']} available)"
+                    return outcome
+                
+                remaining = quantity
+                for batch_id, batch_number, expiry_date, on_hand in batches:
+                    take = min(remaining, on_hand)
+                    result = self._apply_movement(cursor, {
+                        'item_id': batch_id, 'quantity': -take, 'transaction_type': 'Dispense',
+                        'reason': reason, 'department': department, 'user_id': user_id,
+                        'reference_number': reference_number,
+                    })
+                    if not result['success']:
+                        raise sqlite3.IntegrityError(result['error'])
+                    outcome['allocations'].append({
+                        'item_id': batch_id, 'batch_number': batch_number,
+                        'expiry_date': expiry_date, 'quantity': take,
+                    })
+                    remaining -= take
+                    if remaining == 0:
+                        break
+                outcome['success'] = True
+        except Exception as e:
+            outcome['allocations'] = []
+            outcome['success'] = False
+            outcome['error'] = str(e)
+        
+        return outcome
+    
     # Smart reordering methods
-    def get_reorder_suggestions_data(self):
-        """Get data needed for reorder suggestions"""
-        conn = self.get_connection()
+    def get_reorder_suggestions_data(self, skip_suppressed=False, safety_factor=None):
+        """Get data needed for reorder suggestions.
+        
+        skip_suppressed leaves out snoozed and dismissed items before their
+        consumption is aggregated. With a safety_factor only items at or
+        below their reorder point (minimum stock plus safety_factor times
+        the usage over the supplier lead time) are returned.
+        """
         query = '''
             SELECT i.id, i.drug_name, i.current_stock, i.minimum_stock, i.unit_price,
-                   i.supplier_name, s.lead_time_days,
-                   AVG(cp.quantity_consumed) as avg_daily_usage
+                   i.supplier_id, i.supplier_name, s.lead_time_days,
+                   SUM(dc.quantity) * 1.0 / SUM(dc.entries) as avg_daily_usage
             FROM inventory i
-            LEFT JOIN suppliers s ON i.supplier_name = s.name
-            LEFT JOIN consumption_patterns cp ON i.id = cp.drug_id 
-                AND cp.date >= date('now', '-30 days')
-            GROUP BY i.id, i.drug_name, i.current_stock, i.minimum_stock, 
-                     i.unit_price, i.supplier_name, s.lead_time_days
+            LEFT JOIN suppliers s ON s.id = i.supplier_id
+            LEFT JOIN daily_consumption dc ON i.id = dc.drug_id 
+                AND dc.date >= date('now', '-30 days')
         '''
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
+        params = []
+        if skip_suppressed:
+            query += '''
+            WHERE NOT EXISTS (
+                SELECT 1 FROM reorder_suppressions rs
+                WHERE rs.drug_id = i.id
+                  AND (rs.suppressed_until IS NULL OR rs.suppressed_until > ?)
+            )
+            '''
+            params.append(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        query += " GROUP BY i.id"
+        if safety_factor is not None:
+            # Lead time falls back to 7 days, as in SmartReordering
+            query += '''
+            HAVING i.current_stock <= i.minimum_stock
+                + COALESCE(avg_daily_usage, 0) * COALESCE(NULLIF(s.lead_time_days, 0), 7) * ?
+            '''
+            params.append(safety_factor)
+        with self.connection() as conn:
+            return _read_frame(conn, query, params, tables=("inventory",), chunked=True)
     
     def create_purchase_order(self, suggestion):
         """Create a purchase order"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Generate order number
-            order_number = f"PO{datetime.now().strftime('%Y%m%d%H%M%S')}"
-            
-            # Get supplier ID
-            cursor.execute("SELECT id FROM suppliers WHERE name = ?", (suggestion['supplier'],))
-            supplier_result = cursor.fetchone()
-            supplier_id = supplier_result[0] if supplier_result else None
-            
-            # Get drug ID
-            cursor.execute("SELECT id FROM inventory WHERE drug_name = ?", (suggestion['drug_name'],))
-            drug_result = cursor.fetchone()
-            drug_id = drug_result[0] if drug_result else None
-            
-            if drug_id:
-                cursor.execute('''
-                    INSERT INTO purchase_orders (order_number, supplier_id, drug_id, quantity, 
-                                               unit_price, total_amount, notes)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (order_number, supplier_id, drug_id, suggestion['suggested_quantity'],
-                      suggestion.get('unit_price', 0), suggestion['estimated_cost'],
-                      suggestion.get('notes', 'Auto-generated order')))
+            with self.connection() as conn:
+                cursor = conn.cursor()
                 
-                conn.commit()
-                conn.close()
-                return True
+                # Generate order number
+                # Microseconds keep orders created in one batch unique
+                order_number = f"PO{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+                
+                # Reorder suggestions carry the ids; manual orders only have names
+                drug_id = int(suggestion['id']) if suggestion.get('id') is not None else None
+                supplier_id = suggestion.get('supplier_id')
+                if drug_id is None:
+                    cursor.execute("SELECT id FROM inventory WHERE drug_name = ?", (suggestion['drug_name'],))
+                    drug_result = cursor.fetchone()
+                    drug_id = drug_result[0] if drug_result else None
+                if supplier_id is None and suggestion.get('supplier'):
+                    cursor.execute("SELECT id FROM suppliers WHERE name = ?", (suggestion['supplier'],))
+                    supplier_result = cursor.fetchone()
+                    supplier_id = supplier_result[0] if supplier_result else None
+                elif supplier_id is None and drug_id is not None:
+                    cursor.execute("SELECT supplier_id FROM inventory WHERE id = ?", (drug_id,))
+                    supplier_result = cursor.fetchone()
+                    supplier_id = supplier_result[0] if supplier_result else None
+                
+                if drug_id:
+                    quantity = suggestion.get('suggested_quantity', suggestion.get('quantity'))
+                    unit_price = suggestion.get('unit_price', 0)
+                    cursor.execute('''
+                        INSERT INTO purchase_orders (order_number, supplier_id, drug_id, quantity, 
+                                                   unit_price, total_amount, notes)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''', (order_number, supplier_id, drug_id, quantity, unit_price,
+                          suggestion.get('estimated_cost', quantity * unit_price),
+                          suggestion.get('notes', 'Auto-generated order')))
+                    return True
         except Exception:
             pass
         
-        conn.close()
         return False
     
     def get_suppliers(self):
         """Get list of suppliers"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM suppliers ORDER BY name")
-        suppliers = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return suppliers
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM suppliers ORDER BY name")
+            return [row[0] for row in cursor.fetchall()]
     
     def get_all_drugs(self):
         """Get list of all drug names"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT drug_name FROM inventory ORDER BY drug_name")
-        drugs = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return drugs
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT drug_name FROM inventory ORDER BY drug_name")
+            return [row[0] for row in cursor.fetchall()]
     
     # Expiry management methods
     def get_expiring_items(self):
         """Get items expiring within 90 days"""
-        conn = self.get_connection()
         query = '''
             SELECT drug_name, batch_number, current_stock, expiry_date,
-                   CASE 
-                       WHEN julianday(expiry_date) - julianday('now') <= 0 THEN 0
-                       ELSE CAST(julianday(expiry_date) - julianday('now') AS INTEGER)
-                   END as days_until_expiry,
+                   MAX(expiry_day - ?, 0) as days_until_expiry,
                    current_stock * unit_price as value_at_risk
             FROM inventory
-            WHERE expiry_date <= date('now', '+90 days')
-            ORDER BY days_until_expiry ASC
+            WHERE expiry_day <= ?
+            ORDER BY expiry_day ASC
         '''
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
+        today = day_number()
+        with self.connection() as conn:
+            return _read_frame(conn, query, (today, today + 90), tables=("inventory",))
     
     def get_drugs_with_consumption_data(self):
         """Get drugs that have consumption data"""
-        conn = self.get_connection()
         query = '''
             SELECT DISTINCT i.drug_name
             FROM inventory i
-            JOIN consumption_patterns cp ON i.id = cp.drug_id
+            JOIN daily_consumption dc ON i.id = dc.drug_id
             ORDER BY i.drug_name
         '''
-        cursor = conn.cursor()
-        cursor.execute(query)
-        drugs = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return drugs
-    
-    def apply_expiry_action(self, drug_name, action):
-        """Apply action to expired/expiring items"""
-        try:
-            conn = self.get_connection()
+        with self.connection() as conn:
             cursor = conn.cursor()
-            
-            # Log the action in transactions
-            cursor.execute('''
-                INSERT INTO transactions (drug_id, transaction_type, quantity, notes)
-                SELECT id, ?, current_stock, ?
-                FROM inventory 
-                WHERE drug_name = ?
-            ''', (action, f"Expiry action: {action}", drug_name))
-            
-            # Update stock if disposing or using
-            if action in ["Mark as Used", "Dispose"]:
-                cursor.execute("UPDATE inventory SET current_stock = 0 WHERE drug_name = ?", (drug_name,))
-            
-            conn.commit()
-            conn.close()
+            cursor.execute(query)
+            return [row[0] for row in cursor.fetchall()]
+    
+    def apply_expiry_action(self, drug_name, action, batch_number=None):
+        """Apply action to a drug's expired/expiring batches (or just one batch)"""
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                _begin_immediate(conn)
+                
+                # Only the batches listed as expiring, not the drug's fresh stock
+                query = '''
+                    SELECT b.id FROM drugs d
+                    JOIN stock_batches b ON b.drug_id = d.id
+                    WHERE d.drug_name = ? AND b.quantity > 0
+                        AND b.expiry_day <= ?
+                '''
+                params = [drug_name, day_number() + 90]
+                if batch_number is not None:
+                    query += " AND b.batch_number = ?"
+                    params.append(batch_number)
+                batch_ids = [row[0] for row in cursor.execute(query, params).fetchall()]
+                
+                for batch_id in batch_ids:
+                    # Log the action in transactions
+                    cursor.execute('''
+                        INSERT INTO transactions (drug_id, transaction_type, quantity, notes)
+                        SELECT id, ?, current_stock, ?
+                        FROM inventory 
+                        WHERE id = ?
+                    ''', (action, f"Expiry action: {action}", batch_id))
+                    
+                    # Update stock if disposing or using
+                    if action in ["Mark as Used", "Dispose"]:
+                        cursor.execute(
+                            "UPDATE inventory SET current_stock = 0, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                            (batch_id,)
+                        )
             return True
         except Exception:
             return False
     
     def get_wastage_analysis(self, start_date, end_date):
         """Get wastage analysis for a date range"""
-        conn = self.get_connection()
-        query = '''
+        with self.connection() as conn, self._archive_sources(conn, start_date, end_date) as schemas:
+            source = self._union_source("transactions", "drug_id, transaction_type, quantity, created_day", schemas)
+            query = f'''
             SELECT i.drug_name, i.category, 
                    SUM(t.quantity) as wasted_quantity,
                    SUM(t.quantity * i.unit_price) as wasted_value
-            FROM transactions t
+            FROM {source} t
             JOIN inventory i ON t.drug_id = i.id
             WHERE t.transaction_type IN ('Dispose', 'Expired') 
-                AND DATE(t.created_at) BETWEEN ? AND ?
+                AND t.created_day BETWEEN ? AND ?
             GROUP BY i.drug_name, i.category
             ORDER BY wasted_value DESC
-        '''
-        df = pd.read_sql_query(query, conn, params=(start_date, end_date))
-        conn.close()
-        return df
+            '''
+            params = (day_number(start_date), day_number(end_date))
+            return _read_frame(conn, query, params, tables=("inventory",))
     
     def get_wastage_trends(self, start_date, end_date):
         """Get daily wastage trends"""
-        conn = self.get_connection()
-        query = '''
-            SELECT DATE(t.created_at) as date,
+        with self.connection() as conn, self._archive_sources(conn, start_date, end_date) as schemas:
+            source = self._union_source("transactions", "drug_id, transaction_type, quantity, created_day", schemas)
+            query = f'''
+            SELECT DATE(t.created_day * 86400, 'unixepoch') as date,
                    SUM(t.quantity * i.unit_price) as daily_wastage
-            FROM transactions t
+            FROM {source} t
             JOIN inventory i ON t.drug_id = i.id
             WHERE t.transaction_type IN ('Dispose', 'Expired') 
-                AND DATE(t.created_at) BETWEEN ? AND ?
-            GROUP BY DATE(t.created_at)
-            ORDER BY date
-        '''
-        df = pd.read_sql_query(query, conn, params=(start_date, end_date))
-        conn.close()
-        return df
+                AND t.created_day BETWEEN ? AND ?
+            GROUP BY t.created_day
+            ORDER BY t.created_day
+            '''
+            params = (day_number(start_date), day_number(end_date))
+            return _read_frame(conn, query, params, dtypes={'date': 'datetime'})
     
     # Drug interactions methods
     def get_known_interactions(self):
         """Get all known drug interactions"""
-        conn = self.get_connection()
         query = '''
             SELECT drug1, drug2, severity, description, clinical_effect, management
             FROM drug_interactions
             ORDER BY severity DESC, drug1, drug2
         '''
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
+        with self.connection() as conn:
+            return _read_frame(conn, query, tables=("drug_interactions",))
     
     def add_drug_interaction(self, drug1, drug2, severity, description, clinical_effect, management):
         """Add new drug interaction"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO drug_interactions (drug1, drug2, severity, description, clinical_effect, management)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (drug1, drug2, severity, description, clinical_effect, management))
-            
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    INSERT INTO drug_interactions (drug1, drug2, severity, description, clinical_effect, management)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (drug1, drug2, severity, description, clinical_effect, management))
             return True
         except Exception:
             return False
@@ -712,80 +2068,70 @@ class DatabaseManager:
     
     
     def check_drug_availability(self, drug_name):
-        """Check if drug is available in stock"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT current_stock FROM inventory WHERE drug_name = ?", (drug_name,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result and result[0] > 0:
-            return {"in_stock": True, "quantity": result[0]}
+        """Check if drug is available in stock, across all of its batches"""
+        quantity = self.get_current_stock(drug_name)
+        if quantity > 0:
+            return {"in_stock": True, "quantity": quantity}
         else:
             return {"in_stock": False, "quantity": 0}
     
     # Analytics methods
     def get_consumption_analytics(self, start_date, end_date):
         """Get consumption analytics for date range"""
-        conn = self.get_connection()
-        query = '''
-            SELECT i.drug_name, i.category, SUM(cp.quantity_consumed) as total_consumed
-            FROM consumption_patterns cp
-            JOIN inventory i ON cp.drug_id = i.id
-            WHERE cp.date BETWEEN ? AND ?
+        with self.connection() as conn, self._archive_sources(conn, start_date, end_date) as schemas:
+            source = self._union_source("daily_consumption", "drug_id, date, quantity", schemas)
+            query = f'''
+            SELECT i.drug_name, i.category, SUM(dc.quantity) as total_consumed
+            FROM {source} dc
+            JOIN inventory i ON dc.drug_id = i.id
+            WHERE dc.date BETWEEN ? AND ?
             GROUP BY i.drug_name, i.category
             ORDER BY total_consumed DESC
-        '''
-        df = pd.read_sql_query(query, conn, params=(start_date, end_date))
-        conn.close()
-        return df
+            '''
+            return _read_frame(conn, query, (start_date, end_date), tables=("inventory",))
     
     def get_daily_consumption_trends(self, start_date, end_date):
         """Get daily consumption trends"""
-        conn = self.get_connection()
-        query = '''
-            SELECT date, SUM(quantity_consumed) as daily_consumption
-            FROM consumption_patterns
+        with self.connection() as conn, self._archive_sources(conn, start_date, end_date) as schemas:
+            source = self._union_source("daily_consumption", "date, quantity", schemas)
+            query = f'''
+            SELECT date, SUM(quantity) as daily_consumption
+            FROM {source}
             WHERE date BETWEEN ? AND ?
             GROUP BY date
             ORDER BY date
-        '''
-        df = pd.read_sql_query(query, conn, params=(start_date, end_date))
-        conn.close()
-        return df
+            '''
+            return _read_frame(conn, query, (start_date, end_date), tables=("daily_consumption",))
     
     def get_department_consumption(self, start_date, end_date):
         """Get consumption by department"""
-        conn = self.get_connection()
-        query = '''
-            SELECT department, SUM(quantity_consumed) as consumption
-            FROM consumption_patterns
-            WHERE date BETWEEN ? AND ? AND department IS NOT NULL
+        with self.connection() as conn, self._archive_sources(conn, start_date, end_date) as schemas:
+            source = self._union_source("daily_consumption", "date, department, quantity", schemas)
+            query = f'''
+            SELECT department, SUM(quantity) as consumption
+            FROM {source}
+            WHERE date BETWEEN ? AND ? AND department != ''
             GROUP BY department
             ORDER BY consumption DESC
-        '''
-        df = pd.read_sql_query(query, conn, params=(start_date, end_date))
-        conn.close()
-        return df
+            '''
+            return pd.read_sql_query(query, conn, params=(start_date, end_date))
     
     def get_financial_overview(self):
         """Get financial overview data"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Total inventory value
-        cursor.execute("SELECT SUM(current_stock * unit_price) FROM inventory")
-        total_value = cursor.fetchone()[0] or 0
-        
-        # Monthly spend (last 30 days)
-        cursor.execute('''
-            SELECT SUM(total_amount) FROM transactions 
-            WHERE created_at >= date('now', '-30 days') 
-            AND transaction_type = 'Purchase'
-        ''')
-        monthly_spend = cursor.fetchone()[0] or 0
-        
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Total inventory value
+            cursor.execute("SELECT SUM(current_stock * unit_price) FROM inventory")
+            total_value = cursor.fetchone()[0] or 0
+            
+            # Monthly spend (last 30 days)
+            cursor.execute('''
+                SELECT SUM(total_amount) FROM transactions 
+                WHERE transaction_type = 'Purchase'
+                AND created_day >= ?
+            ''', (day_number() - 30,))
+            monthly_spend = cursor.fetchone()[0] or 0
         
         return {
             'total_value': total_value,
@@ -796,20 +2142,17 @@ class DatabaseManager:
     
     def get_cost_analysis(self):
         """Get cost analysis by category"""
-        conn = self.get_connection()
         query = '''
             SELECT category, SUM(current_stock * unit_price) as total_cost
             FROM inventory
             GROUP BY category
             ORDER BY total_cost DESC
         '''
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
+        with self.connection() as conn:
+            return pd.read_sql_query(query, conn)
     
     def get_cost_trends(self):
         """Get monthly cost trends"""
-        conn = self.get_connection()
         query = '''
             SELECT strftime('%Y-%m', created_at) as month,
                    SUM(total_amount) as monthly_cost
@@ -818,9 +2161,8 @@ class DatabaseManager:
             GROUP BY strftime('%Y-%m', created_at)
             ORDER BY month
         '''
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
+        with self.connection() as conn:
+            return _read_frame(conn, query, dtypes={'month': 'datetime'})
     
     def get_budget_analysis(self):
         """Get budget vs actual analysis"""
@@ -836,7 +2178,6 @@ class DatabaseManager:
     
     def get_supplier_metrics(self):
         """Get supplier performance metrics"""
-        conn = self.get_connection()
         query = '''
             SELECT s.name as supplier_name,
                    s.lead_time_days as avg_delivery_time,
@@ -854,9 +2195,8 @@ class DatabaseManager:
             LEFT JOIN purchase_orders po ON s.id = po.supplier_id
             GROUP BY s.id, s.name, s.lead_time_days, s.reliability_score, s.cost_rating, s.quality_score
         '''
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
+        with self.connection() as conn:
+            return pd.read_sql_query(query, conn)
     
     def get_supplier_recommendations(self):
         """Get supplier recommendations"""
@@ -934,17 +2274,14 @@ class DatabaseManager:
     def update_settings(self, settings):
         """Update system settings"""
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            for key, value in settings.items():
-                cursor.execute('''
-                    INSERT OR REPLACE INTO settings (setting_key, setting_value, updated_at)
-                    VALUES (?, ?, ?)
-                ''', (key, str(value), datetime.now()))
-            
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                
+                for key, value in settings.items():
+                    cursor.execute('''
+                        INSERT OR REPLACE INTO settings (setting_key, setting_value, updated_at)
+                        VALUES (?, ?, ?)
+                    ''', (key, str(value), datetime.now()))
             return True
         except Exception:
             return False
@@ -968,191 +2305,755 @@ class DatabaseManager:
         return performance_data
     
     # Data management methods
-    def export_all_data(self):
-        """Export all system data"""
-        conn = self.get_connection()
+    def changes_since(self, seq=0, limit=1000, tables=None):
+        """Row changes to the feed tables logged after seq, oldest first.
+        
+        Returns {'changes', 'last_seq', 'has_more'}; each change is a dict
+        with seq, table, row_id, operation ('insert'/'update'/'delete'),
+        changed_at and data (the row). Pass last_seq back in to get the next
+        batch; a consumer starting from scratch takes a full export first
+        and then follows the feed from current_change_seq().
+        """
         query = '''
-            SELECT i.*, s.name as supplier_name
-            FROM inventory i
-            LEFT JOIN suppliers s ON i.supplier_name = s.name
+            SELECT seq, table_name, row_id, operation, changed_at, data
+            FROM change_log
+            WHERE seq > ?
         '''
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
+        params = [int(seq)]
+        if tables:
+            query += f" AND table_name IN ({', '.join('?' * len(tables))})"
+            params.extend(tables)
+        query += " ORDER BY seq LIMIT ?"
+        params.append(int(limit) + 1)
+        
+        with self.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        changes = [
+            {
+                'seq': row[0],
+                'table': row[1],
+                'row_id': row[2],
+                'operation': row[3],
+                'changed_at': row[4],
+                'data': json.loads(row[5]) if row[5] else None,
+            }
+            for row in rows
+        ]
+        return {
+            'changes': changes,
+            'last_seq': changes[-1]['seq'] if changes else int(seq),
+            'has_more': has_more,
+        }
+    
+    def current_change_seq(self):
+        """Latest change_log sequence number (0 if nothing was logged yet)"""
+        with self.connection() as conn:
+            return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+    
+    def prune_change_log(self, up_to_seq):
+        """Delete change_log entries every consumer has processed; returns rows removed"""
+        with self.connection() as conn:
+            cursor = conn.execute("DELETE FROM change_log WHERE seq <= ?", (int(up_to_seq),))
+            return cursor.rowcount
+    
+    def export_all_data(self):
+        """Export all system data"""
+        with self.connection() as conn:
+            return _read_frame(conn, EXPORT_QUERIES["All Data"], tables=("inventory",), chunked=True)
     
     def export_inventory_data(self):
         """Export inventory data only"""
-        conn = self.get_connection()
-        df = pd.read_sql_query("SELECT * FROM inventory", conn)
-        conn.close()
-        return df
+        with self.connection() as conn:
+            return _read_frame(conn, EXPORT_QUERIES["Inventory Only"], tables=("inventory",), chunked=True)
     
     def export_transaction_data(self):
         """Export transaction data"""
-        conn = self.get_connection()
-        query = '''
-            SELECT t.*, i.drug_name
-            FROM transactions t
-            JOIN inventory i ON t.drug_id = i.id
-        '''
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
+        with self.connection() as conn:
+            return _read_frame(conn, EXPORT_QUERIES["Transactions Only"], tables=("transactions",), chunked=True)
     
     def export_report_data(self):
         """Export report data"""
-        conn = self.get_connection()
-        df = pd.read_sql_query("SELECT * FROM consumption_patterns", conn)
-        conn.close()
-        return df
+        with self.connection() as conn:
+            return _read_frame(conn, EXPORT_QUERIES["Reports Only"], tables=("consumption_patterns",), chunked=True)
+    
+    def stream_export(self, data_type, export_format="csv", path=None,
+                      chunk_size=5000, progress=None):
+        """Stream an export straight from the cursor to a file in constant memory.
+        
+        data_type is a key of EXPORT_QUERIES and export_format one of 'csv',
+        'jsonl' or 'xlsx' (openpyxl write-only mode). Rows are fetched
+        chunk_size at a time; progress(rows_written, total_rows) is called
+        after every chunk. Writes to a temp file unless path is given and
+        returns {'path', 'rows', 'format'}.
+        """
+        import csv
+        import tempfile
+        
+        if data_type not in EXPORT_QUERIES:
+            raise ValueError(f"Unknown export data type: {data_type}")
+        if export_format not in ("csv", "jsonl", "xlsx"):
+            raise ValueError(f"Unsupported export format: {export_format}")
+        
+        created = path is None
+        if created:
+            fd, path = tempfile.mkstemp(prefix="pharma_export_", suffix=f".{export_format}")
+            os.close(fd)
+        
+        query = EXPORT_QUERIES[data_type]
+        rows_written = 0
+        try:
+            with self.connection() as conn:
+                total_rows = None
+                if progress:
+                    total_rows = conn.execute(f"SELECT COUNT(*) FROM ({query})").fetchone()[0]
+                
+                # Plain tuples are cheaper than sqlite3.Row for bulk streaming
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                cursor.execute(query)
+                columns = [description[0] for description in cursor.description]
+                
+                if export_format == "xlsx":
+                    from openpyxl import Workbook
+                    
+                    workbook = Workbook(write_only=True)
+                    sheet, sheet_rows = None, 0
+                    max_sheet_rows = 1048575  # Excel row limit minus the header
+                    while True:
+                        chunk = cursor.fetchmany(chunk_size)
+                        if not chunk:
+                            break
+                        for row in chunk:
+                            if sheet is None or sheet_rows >= max_sheet_rows:
+                                sheet = workbook.create_sheet(f"{data_type[:20]} {len(workbook.worksheets) + 1}")
+                                sheet.append(columns)
+                                sheet_rows = 0
+                            sheet.append(row)
+                            sheet_rows += 1
+                        rows_written += len(chunk)
+                        if progress:
+                            progress(rows_written, total_rows)
+                    if sheet is None:
+                        workbook.create_sheet(data_type[:31]).append(columns)
+                    workbook.save(path)
+                else:
+                    with open(path, "w", newline="", encoding="utf-8") as f:
+                        writer = csv.writer(f) if export_format == "csv" else None
+                        if writer:
+                            writer.writerow(columns)
+                        while True:
+                            chunk = cursor.fetchmany(chunk_size)
+                            if not chunk:
+                                break
+                            if writer:
+                                writer.writerows(chunk)
+                            else:
+                                f.writelines(json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in chunk)
+                            rows_written += len(chunk)
+                            if progress:
+                                progress(rows_written, total_rows)
+        except BaseException:
+            # Don't leave a partial temp file behind; a caller's path is theirs
+            if created and os.path.exists(path):
+                os.remove(path)
+            raise
+        
+        return {'path': path, 'rows': rows_written, 'format': export_format}
+    
+    def _arrow_schema(self, conn, table):
+        """Arrow schema for a table, derived from its declared SQLite column types"""
+        import pyarrow as pa
+        
+        fields = []
+        for column in conn.execute(f"PRAGMA table_info({table})"):
+            declared = (column[2] or "").upper()
+            if "INT" in declared or "BOOL" in declared:
+                arrow_type = pa.int64()
+            elif any(t in declared for t in ("REAL", "FLOA", "DOUB")):
+                arrow_type = pa.float64()
+            else:
+                # TEXT, DATE and TIMESTAMP columns keep SQLite's text form
+                arrow_type = pa.string()
+            fields.append(pa.field(column[1], arrow_type))
+        return pa.schema(fields)
+    
+    def export_parquet(self, output_dir, tables=("inventory", "transactions", "consumption_patterns"),
+                       chunk_size=50000, compression="zstd"):
+        """Write columnar Parquet snapshots of tables, partitioned by month.
+        
+        transactions and consumption_patterns are written Hive-style to
+        <output_dir>/<table>/month=YYYY-MM/part-0.parquet, streaming the
+        table in date order so only one chunk is held in memory at a time.
+        inventory is current state, not history, so it is one file. Each
+        table is written to a staging directory and renamed into place, so an
+        existing <output_dir>/<table> is only replaced once the new export is
+        complete, and only if it holds a previous export (anything else
+        raises ValueError). Requires pyarrow. Returns {table: {'rows', 'files'}}.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet export requires the 'pyarrow' package")
+        import shutil
+        import tempfile
+        
+        for table in tables:
+            table_dir = os.path.join(output_dir, table)
+            if os.path.lexists(table_dir) and not _is_parquet_export(table_dir):
+                raise ValueError(f"{table_dir} exists and is not a Parquet export; refusing to replace it")
+        os.makedirs(output_dir, exist_ok=True)
+        
+        summary = {}
+        with self.connection() as conn:
+            for table in tables:
+                partition_column = PARQUET_PARTITION_COLUMNS.get(table)
+                schema = self._arrow_schema(conn, table)
+                columns = ", ".join(schema.names)
+                staging_dir = tempfile.mkdtemp(prefix=f".{table}-", dir=output_dir)
+                
+                if partition_column:
+                    query = f'''
+                        SELECT {columns},
+                               COALESCE(strftime('%Y-%m', {partition_column} * 86400, 'unixepoch'), 'unknown')
+                        FROM {table}
+                        ORDER BY {partition_column}, id
+                    '''
+                else:
+                    query = f"SELECT {columns}, NULL FROM {table} ORDER BY id"
+                
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                cursor.execute(query)
+                
+                writer, current_month = None, None
+                rows = files = 0
+                try:
+                    while True:
+                        chunk = cursor.fetchmany(chunk_size)
+                        if not chunk:
+                            break
+                        start = 0
+                        # Rows arrive sorted by month: cut the chunk at month boundaries
+                        for index in range(len(chunk) + 1):
+                            if index < len(chunk) and chunk[index][-1] == chunk[start][-1]:
+                                continue
+                            month = chunk[start][-1]
+                            if writer is None or month != current_month:
+                                if writer is not None:
+                                    writer.close()
+                                path = (os.path.join(staging_dir, f"month={month}", "part-0.parquet")
+                                        if partition_column else os.path.join(staging_dir, f"{table}.parquet"))
+                                os.makedirs(os.path.dirname(path), exist_ok=True)
+                                writer = pq.ParquetWriter(path, schema, compression=compression)
+                                current_month = month
+                                files += 1
+                            part = chunk[start:index]
+                            arrays = [pa.array([row[i] for row in part], type=field.type)
+                                      for i, field in enumerate(schema)]
+                            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                            start = index
+                        rows += len(chunk)
+                except BaseException:
+                    if writer is not None:
+                        writer.close()
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+                    raise
+                if writer is not None:
+                    writer.close()
+                
+                # Swap the finished export in, then drop the previous one
+                table_dir = os.path.join(output_dir, table)
+                previous_dir = None
+                if os.path.exists(table_dir):
+                    previous_dir = tempfile.mkdtemp(prefix=f".{table}-old-", dir=output_dir)
+                    os.rmdir(previous_dir)
+                    os.rename(table_dir, previous_dir)
+                os.rename(staging_dir, table_dir)
+                if previous_dir is not None:
+                    shutil.rmtree(previous_dir)
+                
+                summary[table] = {'rows': rows, 'files': files}
+        
+        return summary
+    
+    def import_parquet(self, source_dir, tables=("inventory", "transactions", "consumption_patterns"),
+                       batch_size=5000):
+        """Load Parquet snapshots written by export_parquet back into the tables.
+        
+        Each table is loaded in one write transaction with batched executemany
+        upserts keyed on id, so re-importing the same snapshot is idempotent
+        and fires the normal update triggers. Columns the table does not have
+        are ignored. Returns {table: rows_imported}.
+        """
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet import requires the 'pyarrow' package")
+        import glob
+        
+        imported = {}
+        for table in tables:
+            files = sorted(glob.glob(os.path.join(source_dir, table, "**", "*.parquet"), recursive=True))
+            if not files:
+                continue
+            
+            # One transaction per table (a savepoint when called inside one)
+            with self.connection() as conn:
+                table_columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                _begin_immediate(conn)
+                count = 0
+                for path in files:
+                    parquet_file = pq.ParquetFile(path)
+                    columns = [name for name in parquet_file.schema_arrow.names if name in table_columns]
+                    updates = ", ".join(f"{name} = excluded.{name}" for name in columns if name != "id")
+                    sql = f'''
+                        INSERT INTO {table} ({", ".join(columns)})
+                        VALUES ({", ".join("?" for _ in columns)})
+                        ON CONFLICT (id) DO UPDATE SET {updates}
+                    '''
+                    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+                        values = [batch.column(name).to_pylist() for name in columns]
+                        conn.executemany(sql, zip(*values))
+                        count += batch.num_rows
+            imported[table] = count
+        
+        return imported
+    
+    def validate_inventory_import(self, df):
+        """Validate an inventory upload column-wise.
+        
+        Returns (clean, errors): clean holds the normalized valid rows ready
+        for insert, errors one dict per rejected row with its 1-based row
+        number, batch number and the reasons it was rejected.
+        """
+        data = df.copy()
+        data.columns = [str(c).strip().lower().replace(" ", "_") for c in data.columns]
+        data = data[[c for c in INVENTORY_IMPORT_COLUMNS if c in data.columns]]
+        data.index = pd.RangeIndex(1, len(data) + 1)
+        problems = pd.Series("", index=data.index)
+        
+        def flag(mask, message):
+            nonlocal problems
+            problems = problems.where(~mask, problems + message + "; ")
+        
+        for column in ("drug_name", "category", "batch_number"):
+            if column not in data.columns:
+                data[column] = None
+            data[column] = data[column].astype("string").str.strip()
+            flag(data[column].isna() | (data[column] == ""), f"missing {column}")
+        
+        # Stored upper-case, so re-importing 'asp001' updates batch ASP001
+        # instead of adding a second one beside it
+        data["batch_number"] = data["batch_number"].str.upper()
+        flag(data["batch_number"].notna() & (data["batch_number"] != "")
+             & ~data["batch_number"].str.match(BATCH_NUMBER_PATTERN).fillna(False),
+             "invalid batch_number (3-20 letters/digits)")
+        flag(data["batch_number"].duplicated(keep="last") & data["batch_number"].notna(),
+             "batch_number repeated later in file")
+        
+        for column in ("current_stock", "minimum_stock", "unit_price"):
+            if column in data.columns:
+                raw = data[column]
+                values = pd.to_numeric(raw, errors="coerce")
+                flag(values.isna() & raw.notna() & (raw.astype("string").str.strip() != ""),
+                     f"{column} is not a number")
+                flag(values < 0, f"{column} is negative")
+                if column != "unit_price":
+                    flag(values.notna() & (values % 1 != 0), f"{column} is not a whole number")
+                data[column] = values
+        
+        if "expiry_date" in data.columns:
+            raw = data["expiry_date"]
+            dates = pd.to_datetime(raw, errors="coerce", format="mixed")
+            flag(dates.isna() & raw.notna() & (raw.astype("string").str.strip() != ""),
+                 "unparseable expiry_date")
+            data["expiry_date"] = dates.dt.strftime("%Y-%m-%d")
+        
+        for column in ("manufacturer", "supplier_name", "description"):
+            if column in data.columns:
+                data[column] = data[column].astype("string").str.strip()
+        
+        bad = problems != ""
+        errors = [
+            {'row': row, 'batch_number': batch, 'error': message.rstrip("; ")}
+            for row, batch, message in zip(data.index[bad], data["batch_number"][bad], problems[bad])
+        ]
+        return data[~bad], errors
+    
+    def bulk_import_inventory(self, df, chunk_size=5000):
+        """Validate and upsert inventory rows on batch_number in one transaction.
+        
+        Only the columns present in the upload are written, so a price list
+        without stock columns leaves existing stock untouched. Returns a
+        report with 'inserted', 'updated' and per-row 'errors'.
+        """
+        clean, errors = self.validate_inventory_import(df)
+        report = {'inserted': 0, 'updated': 0, 'errors': errors}
+        if clean.empty:
+            return report
+        
+        columns = list(clean.columns)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "batch_number")
+        sql = f'''
+            INSERT INTO inventory ({", ".join(columns)})
+            VALUES ({", ".join("?" for _ in columns)})
+            ON CONFLICT (batch_number) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP
+        '''
+        # Plain Python values; pandas NA/NaN become NULL
+        records = clean.astype(object).where(clean.notna(), None)
+        for column in ("current_stock", "minimum_stock"):
+            if column in records.columns:
+                records[column] = [None if v is None else int(v) for v in records[column]]
+        rows = list(records.itertuples(index=False, name=None))
+        batch_numbers = list(clean["batch_number"])
+        
+        with self.connection() as conn:
+            _begin_immediate(conn)
+            existing = 0
+            for start in range(0, len(batch_numbers), 900):
+                chunk = batch_numbers[start:start + 900]
+                existing += conn.execute(
+                    f"SELECT COUNT(*) FROM inventory WHERE batch_number IN ({', '.join('?' for _ in chunk)})",
+                    chunk
+                ).fetchone()[0]
+            for start in range(0, len(rows), chunk_size):
+                conn.executemany(sql, rows[start:start + chunk_size])
+        
+        report['updated'] = existing
+        report['inserted'] = len(rows) - existing
+        return report
     
     def import_data(self, df, import_type):
         """Import data from DataFrame"""
         try:
-            conn = self.get_connection()
-            
             if import_type == "Inventory Items":
-                df.to_sql('inventory_temp', conn, if_exists='replace', index=False)
-                # Merge with existing inventory logic here
-            elif import_type == "Transactions":
-                df.to_sql('transactions', conn, if_exists='append', index=False)
-            elif import_type == "Suppliers":
-                df.to_sql('suppliers', conn, if_exists='append', index=False)
+                report = self.bulk_import_inventory(df)
+                return report['inserted'] + report['updated'] > 0
             
-            conn.commit()
-            conn.close()
+            with self.connection() as conn:
+                if import_type == "Transactions":
+                    df.to_sql('transactions', conn, if_exists='append', index=False)
+                elif import_type == "Suppliers":
+                    df.to_sql('suppliers', conn, if_exists='append', index=False)
             return True
         except Exception:
             return False
     
     def clean_old_data(self):
-        """Clean old data (older than 2 years)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        """Move data older than 2 years to the yearly archive databases"""
+        moved = self.archive_old_data(cutoff_days=730)
+        return sum(moved.values())
+    
+    def archive_old_data(self, cutoff_days=730, batch_size=5000):
+        """Move old transactions and consumption rows into archive_YYYY.db files.
         
-        cutoff_date = datetime.now() - timedelta(days=730)
-        cursor.execute("DELETE FROM transactions WHERE created_at < ?", (cutoff_date,))
-        cursor.execute("DELETE FROM consumption_patterns WHERE date < ?", (cutoff_date.date(),))
+        Rows are moved in batches of `batch_size` so the write lock is only
+        held briefly. Each batch is first committed to the archive and then
+        deleted from the hot database; re-running after an interruption is
+        safe because archived ids are inserted with INSERT OR IGNORE.
+        Returns the number of rows moved per table.
+        """
+        cutoff_day = day_number() - cutoff_days
+        moved = {}
+        
+        for table in ('transactions', 'consumption_patterns'):
+            day_column, date_column, _ = DAY_COLUMNS[table]
+            moved[table] = 0
+            while True:
+                with self.connection() as conn:
+                    # The year comes from the day number, so it is always a
+                    # real year; rows without a parseable date have no day
+                    # number and stay in the hot database
+                    rows = conn.execute(f'''
+                        SELECT id, strftime('%Y', {day_column} * 86400, 'unixepoch') FROM {table}
+                        WHERE {day_column} < ?
+                        ORDER BY id
+                        LIMIT ?
+                    ''', (cutoff_day, batch_size)).fetchall()
+                if not rows:
+                    break
+                
+                ids_by_year = {}
+                for row_id, year in rows:
+                    ids_by_year.setdefault(year, []).append(row_id)
+                for year, ids in ids_by_year.items():
+                    self._archive_batch(table, year, ids)
+                moved[table] += len(rows)
         
-        cleaned_records = cursor.rowcount
-        conn.commit()
-        conn.close()
+        return moved
+    
+    def _archive_batch(self, table, year, ids):
+        """Copy one batch of rows into the year's archive, then delete them here"""
+        columns = None
+        with self.connection() as conn:
+            conn.execute("ATTACH DATABASE ? AS archive", (self._archive_path(year),))
+            try:
+                self._ensure_archive_schema(conn)
+                columns = ", ".join(row[1] for row in conn.execute(f"PRAGMA main.table_info({table})"))
+                placeholders = ", ".join("?" for _ in ids)
+                
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO archive.{table} ({columns})
+                    SELECT {columns} FROM main.{table} WHERE id IN ({placeholders})
+                ''', ids)
+                if table == 'consumption_patterns':
+                    # Keep the archive's own rollup current for the affected days
+                    dates = [row[0] for row in conn.execute(
+                        f"SELECT DISTINCT date FROM main.consumption_patterns WHERE id IN ({placeholders})", ids
+                    )]
+                    date_placeholders = ", ".join("?" for _ in dates)
+                    conn.execute(f"DELETE FROM archive.daily_consumption WHERE date IN ({date_placeholders})", dates)
+                    conn.execute(f'''
+                        INSERT INTO archive.daily_consumption (drug_id, date, department, quantity, entries)
+                        SELECT COALESCE(drug_id, 0), date, COALESCE(department, ''),
+                               SUM(COALESCE(quantity_consumed, 0)), COUNT(*)
+                        FROM archive.consumption_patterns
+                        WHERE date IN ({date_placeholders})
+                        GROUP BY COALESCE(drug_id, 0), date, COALESCE(department, '')
+                    ''', dates)
+                conn.commit()
+                
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(f"DELETE FROM main.{table} WHERE id IN ({placeholders})", ids)
+                conn.commit()
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.execute("DETACH DATABASE archive")
+    
+    def _ensure_archive_schema(self, conn):
+        """Create archive tables mirroring the hot schema in the attached 'archive' database"""
+        for table in ('transactions', 'consumption_patterns', 'daily_consumption'):
+            create_sql = conn.execute(
+                "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone()[0]
+            create_sql = re.sub(r'^CREATE TABLE\s+"?' + table + r'"?',
+                                f'CREATE TABLE IF NOT EXISTS archive.{table}', create_sql)
+            conn.execute(create_sql)
         
-        return cleaned_records
+        conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_transactions_created ON transactions (created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_transactions_drug ON transactions (drug_id, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_consumption_date ON consumption_patterns (date)")
+        conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_daily_consumption_date ON daily_consumption (date, department)")
+        _add_day_columns(conn, "archive")
     
     def add_sample_data(self):
-        """Add sample data for testing smart reordering"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Add sample suppliers
-        suppliers = [
-            ('MedSupply Co.', 'John Smith', '555-0101', 'john@medsupply.com', '123 Medical St', 5, 4.5, 3.8, 4.2),
-            ('PharmaDirect', 'Sarah Johnson', '555-0102', 'sarah@pharmadirect.com', '456 Health Ave', 7, 4.2, 4.0, 4.5),
-            ('QuickMed', 'Mike Wilson', '555-0103', 'mike@quickmed.com', '789 Pharmacy Blvd', 3, 4.8, 4.2, 4.0)
-        ]
-        
-        for supplier in suppliers:
-            cursor.execute('''
-                INSERT OR IGNORE INTO suppliers (name, contact_person, phone, email, address, 
-                                               lead_time_days, reliability_score, cost_rating, quality_score)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', supplier)
-        
-        # Add sample consumption patterns
-        cursor.execute("SELECT id, drug_name FROM inventory LIMIT 5")
-        drugs = cursor.fetchall()
-        
-        for drug in drugs:
-            drug_id, drug_name = drug
-            # Add some consumption data for the last 30 days
-            for i in range(30):
-                date = (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d')
-                quantity = np.random.randint(1, 10)  # Random consumption between 1-9
+        """Add sample data for testing smart reordering (once; a no-op when consumption exists)"""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            if cursor.execute("SELECT 1 FROM consumption_patterns LIMIT 1").fetchone():
+                return
+            
+            # Add sample suppliers
+            suppliers = [
+                ('MedSupply Co.', 'John Smith', '555-0101', 'john@medsupply.com', '123 Medical St', 5, 4.5, 3.8, 4.2),
+                ('PharmaDirect', 'Sarah Johnson', '555-0102', 'sarah@pharmadirect.com', '456 Health Ave', 7, 4.2, 4.0, 4.5),
+                ('QuickMed', 'Mike Wilson', '555-0103', 'mike@quickmed.com', '789 Pharmacy Blvd', 3, 4.8, 4.2, 4.0)
+            ]
+            
+            for supplier in suppliers:
                 cursor.execute('''
-                    INSERT OR IGNORE INTO consumption_patterns (drug_id, date, quantity_consumed, department)
-                    VALUES (?, ?, ?, ?)
-                ''', (drug_id, date, quantity, 'General'))
-        
-        conn.commit()
-        conn.close()
+                    INSERT OR IGNORE INTO suppliers (name, contact_person, phone, email, address, 
+                                                   lead_time_days, reliability_score, cost_rating, quality_score)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', supplier)
+            
+            # Add sample consumption patterns
+            cursor.execute("SELECT id, drug_name FROM inventory LIMIT 5")
+            drugs = cursor.fetchall()
+            
+            # Random consumption between 1-9 for the last 30 days
+            rng = np.random.default_rng(7)
+            dates = [(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(30)]
+            rows = [
+                (drug_id, date, int(quantity), 'General')
+                for drug_id, _ in drugs
+                for date, quantity in zip(dates, rng.integers(1, 10, size=len(dates)))
+            ]
+            cursor.executemany('''
+                INSERT OR IGNORE INTO consumption_patterns (drug_id, date, quantity_consumed, department)
+                VALUES (?, ?, ?, ?)
+            ''', rows)
     
     def optimize_database(self):
         """Optimize database performance"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("VACUUM")
-        cursor.execute("ANALYZE")
-        conn.commit()
-        conn.close()
-    
-    def backup_database(self):
-        """Create database backup"""
-        backup_filename = f"pharma_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
-        
-        # Simple file copy for SQLite
-        import shutil
-        shutil.copy2(self.db_path, backup_filename)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("VACUUM")
+            cursor.execute("ANALYZE")
+    
+    def backup_database(self, backup_dir=".", compression=None, keep=10,
+                        pages_per_step=1024, step_sleep=0.005, progress=None):
+        """Create an online database backup with the SQLite backup API.
+        
+        The copy is taken in pages_per_step chunks, pausing between steps so
+        writers are never locked out for the whole copy. The backup is checked
+        with PRAGMA integrity_check, optionally compressed ('gzip' or 'zstd')
+        and only the newest `keep` pharma_backup_* files are retained.
+        """
+        if compression not in (None, "gzip", "zstd"):
+            raise ValueError(f"Unsupported backup compression: {compression}")
+        # Checked before copying; _compress_backup imports it when it is used
+        if compression == "zstd" and importlib.util.find_spec("zstandard") is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        
+        os.makedirs(backup_dir, exist_ok=True)
+        backup_filename = os.path.join(
+            backup_dir, f"pharma_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+        )
+        
+        source = self.get_connection()
+        target = sqlite3.connect(backup_filename)
+        try:
+            source.backup(target, pages=pages_per_step, sleep=step_sleep, progress=progress)
+            # Backups are standalone files; don't leave them in WAL mode
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+            source.close()
+        
+        check = self.verify_backup(backup_filename)
+        if not check['ok']:
+            os.remove(backup_filename)
+            raise sqlite3.DatabaseError(f"Backup failed integrity check: {check['result']}")
+        
+        if compression:
+            backup_filename = self._compress_backup(backup_filename, compression)
+        
+        if keep:
+            self.rotate_backups(backup_dir, keep)
         
         return backup_filename
     
-    def snooze_reorder_suggestion(self, suggestion_id, days):
-        """Snooze a reorder suggestion"""
+    def _compress_backup(self, path, compression):
+        """Compress a backup file in place and return the new path"""
+        import shutil
+        
+        if compression == "gzip":
+            import gzip
+            compressed_path = path + ".gz"
+            opener = lambda: gzip.open(compressed_path, "wb", compresslevel=6)
+        elif compression == "zstd":
+            import zstandard
+            compressed_path = path + ".zst"
+            opener = lambda: zstandard.ZstdCompressor(level=10).stream_writer(open(compressed_path, "wb"))
+        else:
+            raise ValueError(f"Unsupported backup compression: {compression}")
+        
+        with open(path, "rb") as src, opener() as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.remove(path)
+        return compressed_path
+    
+    def verify_backup(self, path):
+        """Open a (possibly compressed) backup and run PRAGMA integrity_check"""
+        import shutil
+        import tempfile
+        
+        temp_path = None
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            if path.endswith(".gz") or path.endswith(".zst"):
+                fd, temp_path = tempfile.mkstemp(suffix=".db")
+                with os.fdopen(fd, "wb") as dst:
+                    if path.endswith(".gz"):
+                        import gzip
+                        with gzip.open(path, "rb") as src:
+                            shutil.copyfileobj(src, dst, 1024 * 1024)
+                    else:
+                        import zstandard
+                        with open(path, "rb") as raw:
+                            with zstandard.ZstdDecompressor().stream_reader(raw) as src:
+                                shutil.copyfileobj(src, dst, 1024 * 1024)
             
-            # Create or update snooze record
-            cursor.execute('''
-                INSERT OR REPLACE INTO alerts (alert_type, severity, message, drug_id, is_active)
-                VALUES ('reorder_snooze', 'info', ?, ?, 1)
-            ''', (f"Snoozed for {days} days", suggestion_id))
+            conn = sqlite3.connect(f"file:{temp_path or path}?mode=ro", uri=True)
+            try:
+                rows = conn.execute("PRAGMA integrity_check").fetchall()
+                tables = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+            finally:
+                conn.close()
             
-            conn.commit()
-            conn.close()
-            return True
-        except Exception:
-            return False
+            result = "; ".join(row[0] for row in rows)
+            return {'ok': result == "ok", 'result': result, 'tables': tables}
+        except Exception as e:
+            return {'ok': False, 'result': str(e), 'tables': 0}
+        finally:
+            if temp_path:
+                os.remove(temp_path)
+    
+    def rotate_backups(self, backup_dir=".", keep=10):
+        """Delete all but the newest `keep` pharma_backup_* files; returns removed paths"""
+        import glob
+        
+        backups = sorted(
+            path for path in glob.glob(os.path.join(backup_dir, "pharma_backup_*.db*"))
+            if path.endswith((".db", ".db.gz", ".db.zst"))
+        )
+        removed = backups[:-keep] if keep and len(backups) > keep else []
+        for path in removed:
+            os.remove(path)
+        return removed
+    
+    def get_active_alerts(self, limit=10):
+        """Most urgent active alerts materialized by the alert engine"""
+        with self.connection() as conn:
+            rows = conn.execute('''
+                SELECT id, alert_type, severity, priority, message, drug_id, acknowledged, created_at
+                FROM alerts
+                WHERE is_active = 1 AND dedup_key IS NOT NULL
+                ORDER BY rank DESC, urgency, id
+                LIMIT ?
+            ''', (int(limit),)).fetchall()
+        return [dict(row) for row in rows]
+    
+    def snooze_reorder_suggestion(self, suggestion_id, days):
+        """Snooze a reorder suggestion"""
+        return self._suppress_reorder_suggestion(suggestion_id, 'snooze', datetime.now() + timedelta(days=days))
     
     def dismiss_reorder_suggestion(self, suggestion_id):
-        """Dismiss a reorder suggestion"""
+        """Dismiss a reorder suggestion until the item is restocked"""
+        return self._suppress_reorder_suggestion(suggestion_id, 'dismiss', None)
+    
+    def _suppress_reorder_suggestion(self, drug_id, reason, until):
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # Create dismiss record
-            cursor.execute('''
-                INSERT INTO alerts (alert_type, severity, message, drug_id, is_active)
-                VALUES ('reorder_dismissed', 'info', 'Reorder suggestion dismissed', ?, 1)
-            ''', (suggestion_id,))
-            
-            conn.commit()
-            conn.close()
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            with self.connection() as conn:
+                conn.execute('''
+                    INSERT INTO reorder_suppressions (drug_id, reason, suppressed_until, created_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (drug_id) DO UPDATE SET
+                        reason = excluded.reason,
+                        suppressed_until = excluded.suppressed_until,
+                        created_at = excluded.created_at
+                ''', (int(drug_id), reason, until.strftime('%Y-%m-%d %H:%M:%S') if until else None, now))
+                # Lapsed snoozes no longer suppress anything
+                conn.execute("DELETE FROM reorder_suppressions WHERE suppressed_until <= ?", (now,))
             return True
         except Exception:
             return False
     
     def get_all_drugs(self):
         """Get all drug names for dropdown"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT drug_name FROM inventory ORDER BY drug_name")
-        results = cursor.fetchall()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT drug_name FROM inventory ORDER BY drug_name")
+            results = cursor.fetchall()
         return [row[0] for row in results]
     
     def get_suppliers(self):
         """Get all supplier names for dropdown"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT name FROM suppliers ORDER BY name")
-        results = cursor.fetchall()
-        conn.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT name FROM suppliers ORDER BY name")
+            results = cursor.fetchall()
         return [row[0] for row in results]
     
     def get_supplier_metrics(self):
         """Get supplier performance metrics"""
-        conn = self.get_connection()
         query = '''
             SELECT s.name as supplier_name, s.lead_time_days as avg_delivery_time,
                    s.reliability_score, s.cost_rating as avg_unit_cost, s.quality_score,
@@ -1161,6 +3062,5 @@ class DatabaseManager:
             LEFT JOIN purchase_orders po ON s.id = po.supplier_id
             GROUP BY s.id, s.name, s.lead_time_days, s.reliability_score, s.cost_rating, s.quality_score
         '''
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
+        with self.connection() as conn:
+            return pd.read_sql_query(query, conn)
@@ -0,0 +1,192 @@
+import inspect
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List
+
+import pandas as pd
+
+# Plumbing methods that are not worth timing
+_UNPROFILED_METHODS = {"connection", "get_connection", "close"}
+
+# Statements that never need a query plan
+_PLAN_SKIP_PREFIXES = ("BEGIN", "COMMIT", "ROLLBACK", "PRAGMA", "SAVEPOINT", "RELEASE",
+                       "ANALYZE", "VACUUM", "ATTACH", "DETACH", "CREATE", "DROP", "EXPLAIN")
+
+
+class QueryProfiler:
+    """Opt-in per-method instrumentation for a DatabaseManager.
+
+    While installed, every public DatabaseManager method is wrapped to record
+    wall time, rows returned and the number of SQL statements it ran (taken
+    from the SQLite trace callback, so N+1 loops show up as a high
+    queries-per-call). Calls slower than threshold_ms get an EXPLAIN QUERY
+    PLAN of their statements so full scans can be spotted. Everything is
+    kept in memory: aggregate counters per method plus bounded ring buffers
+    of recent calls and slow-query plans.
+    """
+
+    def __init__(self, threshold_ms: float = 100.0, buffer_size: int = 500,
+                 max_statements: int = 20):
+        self.threshold_ms = threshold_ms
+        self.max_statements = max_statements
+        self.recent_calls = deque(maxlen=buffer_size)
+        self.slow_queries = deque(maxlen=buffer_size)
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._db = None
+        self._wrapped: List[str] = []
+
+    @property
+    def installed(self):
+        return self._db is not None
+
+    def install(self, db):
+        """Start profiling db's public methods"""
+        if self._db is not None:
+            return
+        self._db = db
+        for name, func in inspect.getmembers(type(db), inspect.isfunction):
+            if name.startswith('_') or name in _UNPROFILED_METHODS:
+                continue
+            setattr(db, name, self._wrap(name, getattr(db, name)))
+            self._wrapped.append(name)
+        db.pool.set_trace_callback(self._on_statement)
+
+    def uninstall(self):
+        """Stop profiling and restore the original methods (stats are kept)"""
+        if self._db is None:
+            return
+        self._db.pool.set_trace_callback(None)
+        for name in self._wrapped:
+            delattr(self._db, name)
+        self._wrapped = []
+        self._db = None
+
+    def reset(self):
+        """Clear all collected stats"""
+        with self._lock:
+            self._stats.clear()
+            self.recent_calls.clear()
+            self.slow_queries.clear()
+
+    def _frames(self):
+        frames = getattr(self._local, 'frames', None)
+        if frames is None:
+            frames = self._local.frames = []
+        return frames
+
+    def _on_statement(self, sql):
+        """SQLite trace callback: attribute the statement to the innermost profiled call"""
+        frames = self._frames()
+        if not frames or getattr(self._local, 'explaining', False):
+            return
+        if sql.lstrip().startswith('--'):
+            # Trigger bodies and FTS5 internals are traced as "-- ..." sub-statements
+            # of the statement that fired them; they are not queries of their own
+            return
+        frame = frames[-1]
+        frame['queries'] += 1
+        if len(frame['statements']) < self.max_statements and sql not in frame['statements']:
+            frame['statements'].append(sql)
+
+    def _wrap(self, name, method):
+        def profiled(*args, **kwargs):
+            frames = self._frames()
+            frame = {'queries': 0, 'statements': []}
+            frames.append(frame)
+            started = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                frames.pop()
+                if frames:
+                    # Nested public calls also count towards their caller
+                    frames[-1]['queries'] += frame['queries']
+            self._record(name, elapsed_ms, _row_count(result), frame)
+            return result
+
+        profiled.__name__ = name
+        profiled.__doc__ = method.__doc__
+        return profiled
+
+    def _record(self, name, elapsed_ms, rows, frame):
+        with self._lock:
+            stats = self._stats.setdefault(name, {
+                'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'queries': 0
+            })
+            stats['calls'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['rows'] += rows or 0
+            stats['queries'] += frame['queries']
+            self.recent_calls.append({
+                'method': name,
+                'at': datetime.now().isoformat(timespec='seconds'),
+                'duration_ms': round(elapsed_ms, 2),
+                'rows': rows,
+                'queries': frame['queries'],
+                'thread': threading.current_thread().name,
+            })
+
+        if elapsed_ms >= self.threshold_ms:
+            plans = [
+                {
+                    'method': name,
+                    'at': datetime.now().isoformat(timespec='seconds'),
+                    'duration_ms': round(elapsed_ms, 2),
+                    'sql': sql.strip(),
+                    'plan': self._explain(sql),
+                }
+                for sql in frame['statements']
+                if not sql.lstrip().upper().startswith(_PLAN_SKIP_PREFIXES)
+            ]
+            with self._lock:
+                self.slow_queries.extend(plans)
+
+    def _explain(self, sql):
+        """EXPLAIN QUERY PLAN for a traced (already expanded) statement"""
+        self._local.explaining = True
+        try:
+            with self._db.pool.connection() as conn:
+                rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+            return "\n".join(row[3] for row in rows)
+        except Exception as e:
+            return f"(no plan: {e})"
+        finally:
+            self._local.explaining = False
+
+    def method_stats(self):
+        """Per-method counters as a DataFrame, slowest total time first"""
+        with self._lock:
+            records = [dict(method=name, **stats) for name, stats in self._stats.items()]
+        if not records:
+            return pd.DataFrame(columns=['method', 'calls', 'total_ms', 'avg_ms', 'max_ms',
+                                         'rows', 'queries', 'queries_per_call'])
+        df = pd.DataFrame(records)
+        df['avg_ms'] = df['total_ms'] / df['calls']
+        df['queries_per_call'] = df['queries'] / df['calls']
+        df = df[['method', 'calls', 'total_ms', 'avg_ms', 'max_ms',
+                 'rows', 'queries', 'queries_per_call']]
+        return df.sort_values('total_ms', ascending=False).round(2).reset_index(drop=True)
+
+    def slow_query_plans(self):
+        """Recent slow statements with their plans, newest first"""
+        with self._lock:
+            records = list(self.slow_queries)
+        df = pd.DataFrame(records, columns=['method', 'at', 'duration_ms', 'sql', 'plan'])
+        # A bare "SCAN <table>" step reads the whole table without an index
+        df['full_scan'] = df['plan'].str.contains(r'(?m)^SCAN (?!CONSTANT)\S+$', regex=True)
+        return df.iloc[::-1].reset_index(drop=True)
+
+
+def _row_count(result):
+    """Rows in a method result, or None when the result is not a row set"""
+    if isinstance(result, (pd.DataFrame, list)):
+        return len(result)
+    if isinstance(result, tuple) and result and isinstance(result[0], pd.DataFrame):
+        return len(result[0])
+    return None
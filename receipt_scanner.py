@@ -391,8 +391,8 @@ class ReceiptScanner:
         
         return success_count, error_count, errors
 
-def render_receipt_scanner_page(db):
-    """Render the receipt scanner page"""
+def render_receipt_scanner_page(db, writer):
+    """Render the receipt scanner page; imports go through the WriteQueue `writer`"""
     st.title("📷 Receipt Scanner")
     st.write("Upload pharmaceutical receipts to automatically extract and import inventory data.")
     
@@ -486,7 +486,7 @@ def render_receipt_scanner_page(db):
                             with col1:
                                 if st.button("📥 Import All Items"):
                                     with st.spinner("Importing items to database..."):
-                                        success_count, error_count, errors = scanner.save_to_database(db, parsed_data)
+                                        success_count, error_count, errors = writer.call(scanner.save_to_database, db, parsed_data)
                                     
                                     if success_count > 0:
                                         st.success(f"Successfully imported {success_count} items!")
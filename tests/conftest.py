@@ -0,0 +1,27 @@
+import os
+import shutil
+
+import pytest
+
+from database import DatabaseManager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Shipped with the repo and never migrated: the schema before user_version 1
+BASELINE_DB = os.path.join(ROOT, "pharma_backup_20250903_134057.db")
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A fresh, fully migrated database with the demo data"""
+    manager = DatabaseManager(str(tmp_path / "pharma.db"))
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def baseline_path(tmp_path):
+    """Path to a private copy of the baseline (version 0) database"""
+    path = tmp_path / "baseline.db"
+    shutil.copy(BASELINE_DB, path)
+    return str(path)
@@ -0,0 +1,85 @@
+import pytest
+
+from alert_engine import AlertEngine
+from write_queue import WriteQueue
+
+
+@pytest.fixture
+def engine(db):
+    return AlertEngine(db)
+
+
+@pytest.fixture
+def queue(db):
+    wq = WriteQueue(db)
+    yield wq
+    wq.shutdown()
+
+
+def _settle(engine, queue, limit=5):
+    """Refresh through the writer, as the dashboard does, until it reports no news"""
+    refreshes = 0
+    while engine.needs_refresh() and refreshes < limit:
+        queue.call(engine.refresh)
+        refreshes += 1
+    return refreshes
+
+
+def _active(db, key):
+    with db.connection() as conn:
+        row = conn.execute("SELECT is_active, message FROM alerts WHERE dedup_key = ?", (key,)).fetchone()
+    return tuple(row) if row else None
+
+
+def _low_stock_item(db):
+    with db.connection() as conn:
+        return conn.execute("SELECT id, minimum_stock FROM inventory ORDER BY id LIMIT 1").fetchone()
+
+
+def test_settles_after_one_refresh_through_the_writer(db, engine, queue):
+    assert _settle(engine, queue) == 1
+    item_id, _ = _low_stock_item(db)
+    queue.apply_stock_movements([{'item_id': item_id, 'quantity': 1}]).result()
+    assert _settle(engine, queue) == 1
+    assert not engine.needs_refresh()
+
+
+def test_idle_refresh_writes_nothing(db, engine):
+    engine.refresh()
+    version = db.data_version
+    assert engine.refresh() == 0
+    assert engine.refresh(full=False) == 0
+    assert db.data_version == version
+
+
+def test_alerts_are_upserted_and_resolved(db, engine):
+    item_id, minimum = _low_stock_item(db)
+    with db.connection() as conn:
+        conn.execute("UPDATE inventory SET current_stock = 0 WHERE id = ?", (item_id,))
+    engine.refresh()
+    assert _active(db, f"stock:{item_id}")[0] == 1
+
+    # Re-evaluating keeps one row per rule and item
+    engine.refresh(full=True)
+    with db.connection() as conn:
+        assert conn.execute(
+            "SELECT COUNT(*) FROM alerts WHERE dedup_key = ?", (f"stock:{item_id}",)
+        ).fetchone()[0] == 1
+
+    with db.connection() as conn:
+        conn.execute("UPDATE inventory SET current_stock = ? WHERE id = ?", (minimum + 100, item_id))
+    assert engine.needs_refresh()
+    engine.refresh()
+    assert _active(db, f"stock:{item_id}")[0] == 0
+
+
+def test_incremental_refresh_only_evaluates_touched_items(db, engine):
+    engine.refresh()
+    full_evaluated = engine.stats['evaluated']
+    item_id, _ = _low_stock_item(db)
+    with db.connection() as conn:
+        conn.execute("UPDATE inventory SET current_stock = 0 WHERE id = ?", (item_id,))
+    engine.refresh()
+    assert engine.stats['full_runs'] == 1
+    assert engine.stats['evaluated'] - full_evaluated <= 3
+    assert _active(db, f"stock:{item_id}")[0] == 1
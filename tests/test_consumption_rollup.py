@@ -0,0 +1,78 @@
+import pytest
+
+# What daily_consumption must always equal
+GROUP_BY = '''
+    SELECT COALESCE(drug_id, 0), date, COALESCE(department, ''),
+           SUM(COALESCE(quantity_consumed, 0)), COUNT(*)
+    FROM consumption_patterns
+    GROUP BY COALESCE(drug_id, 0), date, COALESCE(department, '')
+'''
+
+
+def _assert_consistent(conn):
+    rollup = set(map(tuple, conn.execute(
+        "SELECT drug_id, date, department, quantity, entries FROM daily_consumption"
+    )))
+    assert rollup == set(map(tuple, conn.execute(GROUP_BY)))
+
+
+@pytest.fixture
+def conn(db):
+    with db.connection() as conn:
+        yield conn
+
+
+def test_rollup_matches_after_migration(conn):
+    assert conn.execute("SELECT COUNT(*) FROM daily_consumption").fetchone()[0] > 0
+    _assert_consistent(conn)
+
+
+def test_rollup_follows_inserts(conn):
+    rows = [(1, '2030-01-01', 5, 'ER'), (1, '2030-01-01', 7, 'ER'),
+            (1, '2030-01-01', 3, None), (None, '2030-01-02', 4, 'ICU'), (2, '2030-01-02', None, 'ICU')]
+    conn.executemany(
+        "INSERT INTO consumption_patterns (drug_id, date, quantity_consumed, department) VALUES (?, ?, ?, ?)", rows
+    )
+    _assert_consistent(conn)
+    assert tuple(conn.execute(
+        "SELECT quantity, entries FROM daily_consumption WHERE drug_id = 1 AND date = '2030-01-01' AND department = 'ER'"
+    ).fetchone()) == (12, 2)
+
+
+def test_rollup_follows_updates(conn):
+    conn.executemany(
+        "INSERT INTO consumption_patterns (drug_id, date, quantity_consumed, department) VALUES (?, ?, ?, ?)",
+        [(1, '2030-02-01', 5, 'ER'), (1, '2030-02-01', 6, 'ER')],
+    )
+    first = conn.execute("SELECT MIN(id) FROM consumption_patterns WHERE date = '2030-02-01'").fetchone()[0]
+    for assignment in ("quantity_consumed = 9", "department = 'ICU'", "date = '2030-02-03'",
+                       "drug_id = 2", "drug_id = NULL", "department = NULL"):
+        conn.execute(f"UPDATE consumption_patterns SET {assignment} WHERE id = ?", (first,))
+        _assert_consistent(conn)
+    # Non-rollup columns leave it alone
+    conn.execute("UPDATE consumption_patterns SET notes = 'checked' WHERE id = ?", (first,))
+    _assert_consistent(conn)
+
+
+def test_rollup_follows_deletes(conn):
+    conn.executemany(
+        "INSERT INTO consumption_patterns (drug_id, date, quantity_consumed, department) VALUES (?, ?, ?, ?)",
+        [(3, '2030-03-01', 5, 'ER'), (3, '2030-03-01', 6, 'ER')],
+    )
+    conn.execute("DELETE FROM consumption_patterns WHERE drug_id = 3 AND date = '2030-03-01' AND quantity_consumed = 5")
+    _assert_consistent(conn)
+    conn.execute("DELETE FROM consumption_patterns WHERE drug_id = 3 AND date = '2030-03-01'")
+    _assert_consistent(conn)
+    # Emptied groups are removed rather than left at zero
+    assert conn.execute("SELECT COUNT(*) FROM daily_consumption WHERE entries <= 0").fetchone()[0] == 0
+
+    conn.execute("DELETE FROM consumption_patterns")
+    assert conn.execute("SELECT COUNT(*) FROM daily_consumption").fetchone()[0] == 0
+
+
+def test_rebuild_matches(db):
+    with db.connection() as conn:
+        conn.execute("DELETE FROM daily_consumption")
+    assert db.rebuild_consumption_rollup() > 0
+    with db.connection() as conn:
+        _assert_consistent(conn)
@@ -0,0 +1,63 @@
+import csv
+import glob
+import os
+import tempfile
+
+import pytest
+
+
+def _temp_exports():
+    return set(glob.glob(os.path.join(tempfile.gettempdir(), "pharma_export_*")))
+
+
+def test_stream_export_csv(db):
+    result = db.stream_export("Inventory Only", "csv")
+    try:
+        with open(result['path'], newline="") as f:
+            rows = list(csv.reader(f))
+        assert len(rows) == result['rows'] + 1
+        assert "batch_number" in rows[0]
+    finally:
+        os.remove(result['path'])
+
+
+def test_failed_export_removes_its_temp_file(db):
+    before = _temp_exports()
+
+    def fail(rows, total):
+        raise RuntimeError("cancelled")
+
+    with pytest.raises(RuntimeError):
+        db.stream_export("Inventory Only", "csv", chunk_size=2, progress=fail)
+    assert _temp_exports() == before
+
+
+def test_failed_export_keeps_callers_file(db, tmp_path):
+    path = tmp_path / "mine.csv"
+
+    def fail(rows, total):
+        raise RuntimeError("cancelled")
+
+    with pytest.raises(RuntimeError):
+        db.stream_export("Inventory Only", "csv", path=str(path), progress=fail)
+    assert path.exists()
+
+
+def test_parquet_partitions_by_parsed_month(db, tmp_path):
+    pytest.importorskip("pyarrow")
+    with db.connection() as conn:
+        item_id = conn.execute("SELECT id FROM inventory LIMIT 1").fetchone()[0]
+        conn.execute("DELETE FROM transactions")
+        conn.executemany(
+            "INSERT INTO transactions (drug_id, transaction_type, quantity, created_at) VALUES (?, 'Sale', 1, ?)",
+            [(item_id, created_at) for created_at in
+             ("2025-01-05 10:00:00", "2025-01-31T23:00:00", "2025-02-01 08:00:00", "garbage", "12/31/2024")],
+        )
+    summary = db.export_parquet(str(tmp_path / "out"), tables=("transactions",))
+    assert summary["transactions"] == {"rows": 5, "files": 3}
+    assert sorted(os.listdir(tmp_path / "out" / "transactions")) == [
+        "month=2025-01", "month=2025-02", "month=unknown",
+    ]
+    with db.connection() as conn:
+        conn.execute("DELETE FROM transactions")
+    assert db.import_parquet(str(tmp_path / "out"), tables=("transactions",)) == {"transactions": 5}
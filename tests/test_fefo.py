@@ -0,0 +1,32 @@
+from datetime import date, timedelta
+
+import pytest
+
+
+def _day(offset):
+    return (date.today() + timedelta(days=offset)).isoformat()
+
+
+@pytest.fixture
+def drug(db):
+    for batch, stock, expiry in (("FEFO1", 5, _day(-3)), ("FEFO2", 5, _day(200)),
+                                 ("FEFO3", 5, _day(20)), ("FEFO4", 5, None)):
+        db.add_inventory_item("Fefolin 5mg", "Test", "Maker", batch, stock, 1, 2.0, expiry, None, None)
+    return "Fefolin 5mg"
+
+
+def _stock(db, batch):
+    with db.connection() as conn:
+        return conn.execute("SELECT current_stock FROM inventory WHERE batch_number = ?", (batch,)).fetchone()[0]
+
+
+def test_dispense_skips_expired_and_takes_earliest_expiry_first(db, drug):
+    outcome = db.dispense_fefo(drug, 7)
+    assert outcome['success'], outcome['error']
+    assert outcome['available'] == 15
+    assert [_stock(db, b) for b in ("FEFO1", "FEFO3", "FEFO2", "FEFO4")] == [5, 0, 3, 5]
+
+
+def test_expiry_action_only_touches_expiring_batches(db, drug):
+    assert db.apply_expiry_action(drug, "Dispose")
+    assert [_stock(db, b) for b in ("FEFO1", "FEFO3", "FEFO2", "FEFO4")] == [0, 0, 5, 5]
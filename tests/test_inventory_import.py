@@ -0,0 +1,36 @@
+import pandas as pd
+
+
+def _upload(batch_number, stock):
+    return pd.DataFrame([{
+        "Drug Name": "Aspirin 100mg", "Category": "Analgesics", "Batch Number": batch_number,
+        "Current Stock": stock, "Minimum Stock": 10, "Unit Price": 0.5, "Expiry Date": "2030-01-31",
+    }])
+
+
+def _batches(db, batch_number):
+    with db.connection() as conn:
+        return [tuple(row) for row in conn.execute(
+            "SELECT batch_number, current_stock FROM inventory WHERE UPPER(batch_number) = ?", (batch_number,)
+        )]
+
+
+def test_import_inserts_then_updates(db):
+    assert db.bulk_import_inventory(_upload("ASP900", 40))['inserted'] == 1
+    report = db.bulk_import_inventory(_upload("ASP900", 55))
+    assert (report['inserted'], report['updated']) == (0, 1)
+    assert _batches(db, "ASP900") == [("ASP900", 55)]
+
+
+def test_lowercase_batch_number_updates_existing_batch(db):
+    db.bulk_import_inventory(_upload("ASP901", 40))
+    report = db.bulk_import_inventory(_upload("  asp901 ", 70))
+    assert (report['inserted'], report['updated'], report['errors']) == (0, 1, [])
+    assert _batches(db, "ASP901") == [("ASP901", 70)]
+
+
+def test_invalid_rows_are_reported(db):
+    upload = pd.concat([_upload("A-1", 5), _upload("ASP902", -1), _upload("ASP903", 5)])
+    report = db.bulk_import_inventory(upload)
+    assert report['inserted'] == 1
+    assert [error['row'] for error in report['errors']] == [1, 2]
@@ -0,0 +1,27 @@
+import pytest
+
+from utils import MIN_TURNOVER_WINDOW_DAYS, calculate_inventory_turnover
+
+
+def test_short_ledger_is_not_annualised_from_one_day(db):
+    # A new database's ledger starts today
+    turnover = calculate_inventory_turnover(db)
+    assert turnover['window_days'] == 1
+    assert turnover['provisional'] is True
+    assert turnover['turnover_ratio'] == pytest.approx(
+        turnover['total_consumption_value'] / turnover['avg_inventory_value'] * 365 / MIN_TURNOVER_WINDOW_DAYS
+    )
+
+
+def test_long_ledger_is_not_provisional(db):
+    with db.connection() as conn:
+        # Pretend the ledger opened 90 days ago
+        conn.execute("DROP TRIGGER trg_stock_ledger_no_update")
+        conn.execute("UPDATE stock_ledger SET created_at = DATETIME('now', '-90 days')")
+        conn.execute("UPDATE stock_snapshot_runs SET taken_at = DATETIME('now', '-90 days')")
+    turnover = calculate_inventory_turnover(db)
+    assert turnover['window_days'] == 91
+    assert turnover['provisional'] is False
+    assert turnover['turnover_ratio'] == pytest.approx(
+        turnover['total_consumption_value'] / turnover['avg_inventory_value'] * 365 / 91
+    )
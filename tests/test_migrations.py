@@ -0,0 +1,64 @@
+import sqlite3
+
+from database import MIGRATIONS, DatabaseManager
+
+LATEST = MIGRATIONS[-1][0]
+
+
+def _names(conn, kind):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = ?", (kind,))}
+
+
+def test_migration_versions_are_sequential():
+    assert [version for version, _, _ in MIGRATIONS] == list(range(1, LATEST + 1))
+
+
+def test_baseline_database_migrates_to_latest(baseline_path):
+    with sqlite3.connect(baseline_path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+        inventory_rows = conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0]
+        stock = conn.execute("SELECT SUM(current_stock) FROM inventory").fetchone()[0]
+
+    db = DatabaseManager(baseline_path, demo_data=False)
+    try:
+        assert db.get_schema_version() == LATEST
+        with db.connection() as conn:
+            tables = _names(conn, "table")
+            assert {"daily_consumption", "drugs", "stock_ledger", "stock_snapshot_runs",
+                    "stock_snapshots", "change_log", "reorder_suppressions"} <= tables
+            assert "stock_batches" in _names(conn, "view")
+            assert {"idx_consumption_drug_date", "idx_transactions_created_day",
+                    "idx_inventory_expiry_day", "idx_alerts_dedup"} <= _names(conn, "index")
+            # Superseded by the day-number indexes in migration 9
+            assert "idx_inventory_expiry" not in _names(conn, "index")
+
+            # Existing rows survive and are linked to the new structures
+            assert conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0] == inventory_rows
+            assert conn.execute(
+                "SELECT COUNT(*) FROM inventory WHERE drug_master_id IS NULL"
+            ).fetchone()[0] == 0
+            assert conn.execute(
+                "SELECT SUM(delta) FROM stock_ledger WHERE kind = 'opening'"
+            ).fetchone()[0] == stock
+            assert conn.execute(
+                "SELECT COUNT(*) FROM inventory WHERE expiry_date IS NOT NULL AND expiry_day IS NULL"
+            ).fetchone()[0] == 0
+    finally:
+        db.close()
+
+
+def test_migrations_run_once(baseline_path):
+    DatabaseManager(baseline_path, demo_data=False).close()
+    db = DatabaseManager(baseline_path, demo_data=False)
+    try:
+        assert db.get_schema_version() == LATEST
+        with db.connection() as conn:
+            openings = conn.execute("SELECT COUNT(*) FROM stock_ledger WHERE kind = 'opening'").fetchone()[0]
+            items = conn.execute("SELECT COUNT(*) FROM inventory WHERE current_stock != 0").fetchone()[0]
+        assert openings == items
+    finally:
+        db.close()
+
+
+def test_new_database_starts_at_latest(db):
+    assert db.get_schema_version() == LATEST
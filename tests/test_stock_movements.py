@@ -0,0 +1,55 @@
+import pytest
+
+
+def _stock(db, item_id):
+    with db.connection() as conn:
+        return conn.execute("SELECT current_stock FROM inventory WHERE id = ?", (item_id,)).fetchone()[0]
+
+
+def _transactions(db):
+    with db.connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+
+@pytest.fixture
+def items(db):
+    with db.connection() as conn:
+        return [row[0] for row in conn.execute("SELECT id FROM inventory WHERE current_stock >= 10 ORDER BY id LIMIT 2")]
+
+
+def test_movements_apply_deltas_and_log(db, items):
+    first, second = items
+    before = (_stock(db, first), _stock(db, second), _transactions(db))
+    results = db.apply_stock_movements([
+        {'item_id': first, 'quantity': -4, 'department': 'ER'},
+        {'item_id': second, 'quantity': 6},
+    ])
+    assert [r['success'] for r in results] == [True, True]
+    assert results[0]['new_stock'] == before[0] - 4
+    assert (_stock(db, first), _stock(db, second)) == (before[0] - 4, before[1] + 6)
+    assert _transactions(db) == before[2] + 2
+
+
+def test_overdraw_is_rejected_alone(db, items):
+    first, second = items
+    before = (_stock(db, first), _stock(db, second))
+    results = db.apply_stock_movements([
+        {'item_id': first, 'quantity': -(before[0] + 1)},
+        {'item_id': second, 'quantity': -1},
+        {'item_id': -1, 'quantity': 1},
+    ])
+    assert [r['success'] for r in results] == [False, True, False]
+    assert results[0]['error'].startswith("Insufficient stock")
+    assert results[2]['error'] == "Item not found"
+    assert (_stock(db, first), _stock(db, second)) == (before[0], before[1] - 1)
+
+
+def test_all_or_nothing_rolls_back(db, items):
+    first, second = items
+    before = (_stock(db, first), _stock(db, second), _transactions(db))
+    results = db.apply_stock_movements([
+        {'item_id': second, 'quantity': -1},
+        {'item_id': first, 'quantity': -(before[0] + 1)},
+    ], all_or_nothing=True)
+    assert not any(r['success'] for r in results)
+    assert (_stock(db, first), _stock(db, second), _transactions(db)) == before
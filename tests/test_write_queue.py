@@ -0,0 +1,137 @@
+import sqlite3
+import threading
+
+import pytest
+
+from write_queue import WriteQueue
+
+
+@pytest.fixture
+def queue(db):
+    wq = WriteQueue(db, max_delay_ms=50)
+    yield wq
+    wq.shutdown()
+
+
+def _setting(db, key):
+    with db.connection() as conn:
+        row = conn.execute("SELECT setting_value FROM settings WHERE setting_key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _put(db, key, value):
+    with db.connection() as conn:
+        conn.execute("INSERT OR REPLACE INTO settings (setting_key, setting_value) VALUES (?, ?)", (key, value))
+    return value
+
+
+def _occupy(queue):
+    """Keep the writer busy in a batch of its own until the returned event is set"""
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        return release.wait(5)
+
+    future = queue.submit(block)
+    started.wait(5)
+    return future, release
+
+
+def test_queued_writes_share_one_batch(db, queue):
+    blocker, release = _occupy(queue)
+    # Queued while the writer is busy, so they are taken together
+    futures = [queue.submit(_put, db, f"key_{i}", str(i)) for i in range(10)]
+    release.set()
+
+    assert blocker.result() is True
+    assert [f.result() for f in futures] == [str(i) for i in range(10)]
+    assert queue.stats['commands'] == 11
+    assert queue.stats['batches'] == 2
+    assert _setting(db, "key_9") == "9"
+
+
+def test_failing_command_only_undoes_itself(db, queue):
+    _, release = _occupy(queue)
+
+    def fail():
+        _put(db, "half_written", "yes")
+        raise ValueError("boom")
+
+    before = queue.submit(_put, db, "before", "1")
+    failed = queue.submit(fail)
+    after = queue.submit(_put, db, "after", "1")
+    release.set()
+
+    with pytest.raises(ValueError):
+        failed.result()
+    assert before.result() == after.result() == "1"
+    assert _setting(db, "before") == _setting(db, "after") == "1"
+    assert _setting(db, "half_written") is None
+
+
+def test_commands_run_in_the_batch_transaction(db, queue):
+    def in_transaction():
+        with db.connection() as conn:
+            return conn.in_transaction
+
+    assert queue.call(in_transaction) is True
+    assert queue.call_exclusive(in_transaction) is False
+
+
+def test_manager_methods_are_proxied(db, queue):
+    assert queue.update_settings({"currency": "EUR"}).result() is not False
+    assert _setting(db, "currency") == "EUR"
+
+
+def test_locked_batch_is_retried(db, tmp_path):
+    wq = WriteQueue(db, retries=5)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise sqlite3.OperationalError("database is locked")
+        return _put(db, "flaky", "done")
+
+    try:
+        assert wq.call(flaky) == "done"
+    finally:
+        wq.shutdown()
+    assert len(calls) == 3
+    assert wq.stats['retries'] == 2
+
+
+def test_batches_refresh_stale_stock_snapshots(db, queue):
+    with db.connection() as conn:
+        conn.execute("UPDATE stock_snapshot_runs SET taken_at = DATETIME('now', '-2 days')")
+        runs = conn.execute("SELECT COUNT(*) FROM stock_snapshot_runs").fetchone()[0]
+
+    # Reads leave the snapshots alone; the next write batch takes one
+    db.get_average_inventory("2020-01-01", "2030-01-01")
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM stock_snapshot_runs").fetchone()[0] == runs
+    queue.call(_put, db, "touch", "1")
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM stock_snapshot_runs").fetchone()[0] == runs + 1
+
+
+def test_writer_survives_unexpected_errors(db, queue, monkeypatch):
+    def corrupt(*args, **kwargs):
+        raise sqlite3.DatabaseError("database disk image is malformed")
+
+    # Fails after the commands ran, outside their savepoints
+    monkeypatch.setattr(db, "ensure_stock_snapshot", corrupt)
+    with pytest.raises(sqlite3.DatabaseError):
+        queue.submit(_put, db, "lost", "1").result(timeout=5)
+    assert _setting(db, "lost") is None
+
+    def boom():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        queue.submit_exclusive(boom).result(timeout=5)
+
+    monkeypatch.undo()
+    assert queue.submit(_put, db, "later", "1").result(timeout=5) == "1"
+    assert queue.call_exclusive(_setting, db, "later") == "1"
@@ -23,6 +23,14 @@ def format_dual_currency(amount_inr: float) -> str:
     
     return f"₹{amount_inr:,.2f}"
 
+def format_date(value, missing: str = "N/A") -> str:
+    """Format a date, datetime, Timestamp or ISO string as YYYY-MM-DD"""
+    if value is None or pd.isna(value):
+        return missing
+    if isinstance(value, str):
+        return value[:10]
+    return value.strftime("%Y-%m-%d")
+
 def calculate_days_until_expiry(expiry_date) -> int:
     """Calculate days until expiry date"""
     if pd.isna(expiry_date) or expiry_date is None:
@@ -41,6 +49,14 @@ def calculate_days_until_expiry(expiry_date) -> int:
     delta = expiry_date - today
     return delta.days
 
+def day_number(value=None) -> int:
+    """Days since 1970-01-01 for a date, datetime or ISO date string (today if None).
+    
+    Same scale as the indexed *_day columns (e.g. inventory.expiry_day).
+    """
+    value = datetime.now() if value is None else value
+    return (pd.Timestamp(value).normalize() - pd.Timestamp("1970-01-01")).days
+
 def calculate_stock_status(current_stock: int, minimum_stock: int) -> str:
     """Determine stock status based on current and minimum levels"""
     if current_stock == 0:
@@ -62,334 +78,86 @@ def get_stock_status_color(status: str) -> str:
     }
     return color_map.get(status, "#808080")  # Gray as default
 
-def generate_alerts(db) -> List[Dict[str, Any]]:
-    """Generate system alerts based on current data"""
-    alerts = []
-    
+def generate_alerts(db, limit: int = 10) -> List[Dict[str, Any]]:
+    """Most urgent active alerts, as materialized by alert_engine.AlertEngine"""
     try:
-        # Low stock alerts
-        low_stock_items = get_low_stock_items(db)
-        for item in low_stock_items:
-            alerts.append({
-                'type': 'warning' if item['current_stock'] > 0 else 'critical',
-                'category': 'stock',
-                'message': f"Low stock alert: {item['drug_name']} has only {item['current_stock']} units remaining (minimum: {item['minimum_stock']})",
-                'drug_id': item['id'],
-                'priority': 'high' if item['current_stock'] == 0 else 'medium'
-            })
-        
-        # Expiry alerts
-        expiring_items = get_expiring_items(db)
-        for item in expiring_items:
-            days_until_expiry = item['days_until_expiry']
-            if days_until_expiry <= 7:
-                alert_type = 'critical'
-                priority = 'high'
-            elif days_until_expiry <= 30:
-                alert_type = 'warning'
-                priority = 'medium'
-            else:
-                alert_type = 'info'
-                priority = 'low'
-            
-            alerts.append({
-                'type': alert_type,
-                'category': 'expiry',
-                'message': f"Expiry alert: {item['drug_name']} (Batch: {item['batch_number']}) expires in {days_until_expiry} days",
-                'drug_id': item.get('id'),
-                'priority': priority
-            })
-        
-        # High value at risk alerts
-        high_value_expiring = get_high_value_expiring_items(db)
-        for item in high_value_expiring:
-            alerts.append({
-                'type': 'warning',
-                'category': 'financial',
-                'message': f"High value at risk: {item['drug_name']} worth {format_currency(item['value_at_risk'])} expiring soon",
-                'drug_id': item.get('id'),
-                'priority': 'medium'
-            })
-        
-        # Unusual consumption pattern alerts
-        consumption_anomalies = detect_consumption_anomalies(db)
-        for anomaly in consumption_anomalies:
-            alerts.append({
-                'type': 'info',
-                'category': 'consumption',
-                'message': f"Consumption anomaly detected: {anomaly['drug_name']} usage {anomaly['change_description']}",
-                'drug_id': anomaly.get('drug_id'),
-                'priority': 'low'
-            })
-        
-        # Reorder suggestions
-        reorder_alerts = get_reorder_alerts(db)
-        for alert in reorder_alerts:
-            alerts.append({
-                'type': 'info',
-                'category': 'reorder',
-                'message': f"Reorder suggestion: {alert['drug_name']} - suggested quantity: {alert['suggested_quantity']}",
-                'drug_id': alert.get('drug_id'),
-                'priority': alert.get('priority', 'medium')
-            })
-    
+        return [
+            {
+                'type': alert['severity'],
+                'category': alert['alert_type'],
+                'message': alert['message'],
+                'drug_id': alert['drug_id'],
+                'priority': alert['priority']
+            }
+            for alert in db.get_active_alerts(limit)
+        ]
     except Exception as e:
-        alerts.append({
+        return [{
             'type': 'critical',
             'category': 'system',
             'message': f"Error generating alerts: {str(e)}",
             'priority': 'high'
-        })
-    
-    # Sort alerts by priority (high -> medium -> low)
-    priority_order = {'high': 3, 'medium': 2, 'low': 1}
-    alerts.sort(key=lambda x: priority_order.get(x['priority'], 0), reverse=True)
-    
-    return alerts[:10]  # Return top 10 alerts
-
-def get_low_stock_items(db) -> List[Dict]:
-    """Get items with low stock levels"""
-    try:
-        conn = db.get_connection()
-        query = '''
-            SELECT id, drug_name, current_stock, minimum_stock, unit_price
-            FROM inventory 
-            WHERE current_stock <= minimum_stock
-            ORDER BY (CAST(current_stock AS FLOAT) / minimum_stock) ASC
-            LIMIT 10
-        '''
-        cursor = conn.cursor()
-        cursor.execute(query)
-        items = []
-        for row in cursor.fetchall():
-            items.append({
-                'id': row[0],
-                'drug_name': row[1],
-                'current_stock': row[2],
-                'minimum_stock': row[3],
-                'unit_price': row[4]
-            })
-        conn.close()
-        return items
-    except Exception:
-        return []
-
-def get_expiring_items(db) -> List[Dict]:
-    """Get items expiring within 90 days"""
-    try:
-        conn = db.get_connection()
-        query = '''
-            SELECT id, drug_name, batch_number, current_stock, expiry_date, unit_price,
-                   CASE 
-                       WHEN julianday(expiry_date) - julianday('now') <= 0 THEN 0
-                       ELSE CAST(julianday(expiry_date) - julianday('now') AS INTEGER)
-                   END as days_until_expiry
-            FROM inventory
-            WHERE expiry_date <= date('now', '+90 days')
-            ORDER BY days_until_expiry ASC
-            LIMIT 20
-        '''
-        cursor = conn.cursor()
-        cursor.execute(query)
-        items = []
-        for row in cursor.fetchall():
-            items.append({
-                'id': row[0],
-                'drug_name': row[1],
-                'batch_number': row[2],
-                'current_stock': row[3],
-                'expiry_date': row[4],
-                'unit_price': row[5],
-                'days_until_expiry': row[6]
-            })
-        conn.close()
-        return items
-    except Exception:
-        return []
-
-def get_high_value_expiring_items(db, min_value: float = 1000.0) -> List[Dict]:
-    """Get high-value items that are expiring"""
-    try:
-        conn = db.get_connection()
-        query = '''
-            SELECT id, drug_name, batch_number, current_stock, expiry_date, unit_price,
-                   (current_stock * unit_price) as value_at_risk,
-                   CASE 
-                       WHEN julianday(expiry_date) - julianday('now') <= 0 THEN 0
-                       ELSE CAST(julianday(expiry_date) - julianday('now') AS INTEGER)
-                   END as days_until_expiry
-            FROM inventory
-            WHERE expiry_date <= date('now', '+60 days')
-            AND (current_stock * unit_price) >= ?
-            ORDER BY value_at_risk DESC
-            LIMIT 10
-        '''
-        cursor = conn.cursor()
-        cursor.execute(query, (min_value,))
-        items = []
-        for row in cursor.fetchall():
-            items.append({
-                'id': row[0],
-                'drug_name': row[1],
-                'batch_number': row[2],
-                'current_stock': row[3],
-                'expiry_date': row[4],
-                'unit_price': row[5],
-                'value_at_risk': row[6],
-                'days_until_expiry': row[7]
-            })
-        conn.close()
-        return items
-    except Exception:
-        return []
+        }]
 
-def detect_consumption_anomalies(db) -> List[Dict]:
-    """Detect unusual consumption patterns"""
-    try:
-        conn = db.get_connection()
-        
-        # Get consumption data for the last 30 days vs previous 30 days
-        query = '''
-            SELECT i.id, i.drug_name,
-                   AVG(CASE WHEN cp.date >= date('now', '-30 days') THEN cp.quantity_consumed ELSE 0 END) as recent_avg,
-                   AVG(CASE WHEN cp.date BETWEEN date('now', '-60 days') AND date('now', '-30 days') THEN cp.quantity_consumed ELSE 0 END) as previous_avg
-            FROM inventory i
-            LEFT JOIN consumption_patterns cp ON i.id = cp.drug_id
-            WHERE cp.date >= date('now', '-60 days')
-            GROUP BY i.id, i.drug_name
-            HAVING recent_avg > 0 AND previous_avg > 0
-        '''
-        
-        cursor = conn.cursor()
-        cursor.execute(query)
-        anomalies = []
-        
-        for row in cursor.fetchall():
-            drug_id, drug_name, recent_avg, previous_avg = row
-            
-            if recent_avg > 0 and previous_avg > 0:
-                change_ratio = recent_avg / previous_avg
-                
-                # Detect significant changes (>50% increase or decrease)
-                if change_ratio > 1.5:
-                    anomalies.append({
-                        'drug_id': drug_id,
-                        'drug_name': drug_name,
-                        'change_description': f'increased by {((change_ratio - 1) * 100):.1f}%',
-                        'recent_avg': recent_avg,
-                        'previous_avg': previous_avg
-                    })
-                elif change_ratio < 0.5:
-                    anomalies.append({
-                        'drug_id': drug_id,
-                        'drug_name': drug_name,
-                        'change_description': f'decreased by {((1 - change_ratio) * 100):.1f}%',
-                        'recent_avg': recent_avg,
-                        'previous_avg': previous_avg
-                    })
-        
-        conn.close()
-        return anomalies[:5]  # Return top 5 anomalies
-    
-    except Exception:
-        return []
-
-def get_reorder_alerts(db) -> List[Dict]:
-    """Get reorder alerts based on current stock and consumption patterns"""
-    try:
-        conn = db.get_connection()
-        query = '''
-            SELECT i.id, i.drug_name, i.current_stock, i.minimum_stock,
-                   AVG(cp.quantity_consumed) as avg_daily_consumption
-            FROM inventory i
-            LEFT JOIN consumption_patterns cp ON i.id = cp.drug_id 
-            WHERE cp.date >= date('now', '-30 days')
-            GROUP BY i.id, i.drug_name, i.current_stock, i.minimum_stock
-            HAVING i.current_stock <= i.minimum_stock * 1.5
-        '''
-        
-        cursor = conn.cursor()
-        cursor.execute(query)
-        alerts = []
-        
-        for row in cursor.fetchall():
-            drug_id, drug_name, current_stock, minimum_stock, avg_daily_consumption = row
-            
-            # Calculate suggested quantity
-            if avg_daily_consumption and avg_daily_consumption > 0:
-                # Order enough for 30 days plus safety stock
-                suggested_quantity = int(avg_daily_consumption * 30 + minimum_stock - current_stock)
-                suggested_quantity = max(suggested_quantity, minimum_stock)
-                
-                priority = 'high' if current_stock <= minimum_stock else 'medium'
-                
-                alerts.append({
-                    'drug_id': drug_id,
-                    'drug_name': drug_name,
-                    'current_stock': current_stock,
-                    'minimum_stock': minimum_stock,
-                    'suggested_quantity': suggested_quantity,
-                    'avg_daily_consumption': avg_daily_consumption,
-                    'priority': priority
-                })
-        
-        conn.close()
-        return alerts[:5]  # Return top 5 reorder alerts
-    
-    except Exception:
-        return []
+# Shortest window turnover is annualised over; below it a few days of
+# consumption would be scaled up as if they were a year's worth
+MIN_TURNOVER_WINDOW_DAYS = 30
 
 def calculate_inventory_turnover(db, drug_name: str = None) -> Dict[str, float]:
-    """Calculate inventory turnover metrics"""
+    """Calculate inventory turnover metrics over the last year.
+    
+    Average inventory is the mean end-of-day stock value rebuilt from the
+    stock ledger and its snapshots. The year is clipped to the period the
+    ledger covers and the ratio annualised over at least
+    MIN_TURNOVER_WINDOW_DAYS; results from a shorter ledger are flagged
+    'provisional'.
+    """
     try:
-        conn = db.get_connection()
-        
+        drug_id = None
         if drug_name:
-            # Calculate for specific drug
-            query = '''
-                SELECT 
-                    SUM(cp.quantity_consumed * i.unit_price) as total_consumption_value,
-                    AVG(i.current_stock * i.unit_price) as avg_inventory_value
-                FROM consumption_patterns cp
-                JOIN inventory i ON cp.drug_id = i.id
-                WHERE i.drug_name = ? AND cp.date >= date('now', '-365 days')
-                GROUP BY i.drug_name
-            '''
-            cursor = conn.cursor()
-            cursor.execute(query, (drug_name,))
-        else:
-            # Calculate for entire inventory
+            drug_id = db.get_drug_id(drug_name)
+            if drug_id is None:
+                raise ValueError(f"Unknown drug: {drug_name}")
+        
+        end = datetime.now().date()
+        average = db.get_average_inventory(end - timedelta(days=364), end, drug_id)
+        
+        result = None
+        if average['days']:
             query = '''
-                SELECT 
-                    SUM(cp.quantity_consumed * i.unit_price) as total_consumption_value,
-                    AVG(i.current_stock * i.unit_price) as avg_inventory_value
-                FROM consumption_patterns cp
-                JOIN inventory i ON cp.drug_id = i.id
-                WHERE cp.date >= date('now', '-365 days')
+                SELECT SUM(dc.quantity * i.unit_price) as total_consumption_value
+                FROM daily_consumption dc
+                JOIN inventory i ON dc.drug_id = i.id
+                WHERE dc.date BETWEEN ? AND ?
             '''
-            cursor = conn.cursor()
-            cursor.execute(query)
-        
-        result = cursor.fetchone()
-        conn.close()
+            params = [average['start'].isoformat(), average['end'].isoformat()]
+            if drug_id is not None:
+                query += " AND i.drug_master_id = ?"
+                params.append(drug_id)
+            with db.connection() as conn:
+                result = (conn.execute(query, params).fetchone()[0], average['avg_value'])
         
         if result and result[0] and result[1]:
             total_consumption_value, avg_inventory_value = result
-            turnover_ratio = total_consumption_value / avg_inventory_value
+            window_days = max(average['days'], MIN_TURNOVER_WINDOW_DAYS)
+            turnover_ratio = total_consumption_value / avg_inventory_value * 365 / window_days
             days_in_inventory = 365 / turnover_ratio if turnover_ratio > 0 else 365
             
             return {
                 'turnover_ratio': turnover_ratio,
                 'days_in_inventory': days_in_inventory,
                 'total_consumption_value': total_consumption_value,
-                'avg_inventory_value': avg_inventory_value
+                'avg_inventory_value': avg_inventory_value,
+                'window_days': average['days'],
+                'provisional': average['days'] < MIN_TURNOVER_WINDOW_DAYS
             }
         
         return {
             'turnover_ratio': 0,
             'days_in_inventory': 365,
             'total_consumption_value': 0,
-            'avg_inventory_value': 0
+            'avg_inventory_value': 0,
+            'provisional': True
         }
     
     except Exception:
@@ -397,17 +165,19 @@ def calculate_inventory_turnover(db, drug_name: str = None) -> Dict[str, float]:
             'turnover_ratio': 0,
             'days_in_inventory': 365,
             'total_consumption_value': 0,
-            'avg_inventory_value': 0
+            'avg_inventory_value': 0,
+            'provisional': True
         }
 
+# Basic validation - batch number should be alphanumeric and 3-20 characters
+BATCH_NUMBER_PATTERN = r'^[A-Z0-9]{3,20}$'
+
 def validate_batch_number(batch_number: str) -> bool:
     """Validate batch number format"""
     if not batch_number:
         return False
     
-    # Basic validation - batch number should be alphanumeric and 3-20 characters
-    pattern = r'^[A-Z0-9]{3,20}$'
-    return bool(re.match(pattern, batch_number.upper()))
+    return bool(re.match(BATCH_NUMBER_PATTERN, batch_number.upper()))
 
 def sanitize_drug_name(drug_name: str) -> str:
     """Sanitize drug name for database storage"""
@@ -0,0 +1,183 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+
+from database import DatabaseManager
+
+# Sentinel that tells the writer thread to finish
+_STOP = object()
+
+
+class _Exclusive(tuple):
+    """A queued command that runs on its own, outside the batch transaction"""
+
+
+class WriteQueue:
+    """Serialise DatabaseManager writes through one dedicated writer thread.
+
+    Callers enqueue write commands and get a Future back. The writer takes
+    whatever has queued up within max_delay_ms (up to max_batch commands)
+    and runs it as a single BEGIN IMMEDIATE transaction, each command
+    under its own savepoint so a failing command only undoes itself. One
+    commit per batch instead of per write, and no two sessions of this
+    process ever contend for the write lock. If another process holds the
+    lock past the busy timeout, the whole batch is retried with backoff
+    instead of surfacing "database is locked". Each batch also takes a stock
+    ledger snapshot when the latest one is over a day old, so readers never
+    have to write one. Any DatabaseManager method
+    is available as a command, e.g. ``wq.update_settings(settings).result()``.
+    """
+
+    def __init__(self, db: DatabaseManager, max_batch: int = 100,
+                 max_delay_ms: float = 5.0, retries: int = 5):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.retries = retries
+        self.stats = {'commands': 0, 'batches': 0, 'retries': 0}
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="pharma-db-writer", daemon=True)
+        self._thread.start()
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+        if not callable(method):
+            return method
+
+        def submit(*args, **kwargs):
+            return self.submit(method, *args, **kwargs)
+
+        return submit
+
+    def submit(self, func, *args, **kwargs) -> Future:
+        """Queue a write; func runs on the writer thread inside the batch transaction"""
+        future = Future()
+        self._queue.put((func, args, kwargs, future))
+        return future
+
+    def call(self, func, *args, **kwargs):
+        """Blocking variant of submit() for synchronous callers such as Streamlit pages"""
+        return self.submit(func, *args, **kwargs).result()
+
+    def submit_exclusive(self, func, *args, **kwargs) -> Future:
+        """Queue a write that manages its own transactions (ATTACH, VACUUM, ...).
+
+        It still runs on the writer thread, between batches, so no other
+        write of this process overlaps it.
+        """
+        future = Future()
+        self._queue.put(_Exclusive((func, args, kwargs, future)))
+        return future
+
+    def call_exclusive(self, func, *args, **kwargs):
+        """Blocking variant of submit_exclusive()"""
+        return self.submit_exclusive(func, *args, **kwargs).result()
+
+    def _run(self):
+        while True:
+            command = self._queue.get()
+            if command is _STOP:
+                return
+            if isinstance(command, _Exclusive):
+                self._execute_exclusive(command)
+                continue
+            batch = [command]
+            stop = False
+            exclusive = None
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    command = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if command is _STOP:
+                    stop = True
+                    break
+                if isinstance(command, _Exclusive):
+                    # Runs after the batch, keeping queue order
+                    exclusive = command
+                    break
+                batch.append(command)
+            self._execute(batch)
+            if exclusive is not None:
+                self._execute_exclusive(exclusive)
+            if stop:
+                return
+
+    def _execute(self, batch: List):
+        """Run a batch in one transaction, retrying it while another process holds the lock"""
+        batch = [command for command in batch if command[3].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        for attempt in range(self.retries + 1):
+            try:
+                outcomes = self._apply(batch)
+                break
+            except sqlite3.OperationalError as e:
+                if not _is_locked(e) or attempt == self.retries:
+                    for *_, future in batch:
+                        future.set_exception(e)
+                    return
+                self.stats['retries'] += 1
+                time.sleep(min(0.05 * 2 ** attempt, 1.0))
+            except Exception as e:
+                # Anything else fails the batch but must not kill the writer
+                # thread, or every later call() would block forever
+                for *_, future in batch:
+                    future.set_exception(e)
+                return
+
+        self.stats['commands'] += len(batch)
+        self.stats['batches'] += 1
+        for (*_, future), (ok, value) in zip(batch, outcomes):
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _execute_exclusive(self, command):
+        func, args, kwargs, future = command
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        self.stats['commands'] += 1
+
+    def _apply(self, batch):
+        outcomes = []
+        with self.db.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for func, args, kwargs, _ in batch:
+                conn.execute("SAVEPOINT write_command")
+                try:
+                    outcomes.append((True, func(*args, **kwargs)))
+                except Exception as e:
+                    if isinstance(e, sqlite3.OperationalError) and _is_locked(e):
+                        # Retry the whole batch rather than fail one command
+                        raise
+                    conn.execute("ROLLBACK TO write_command")
+                    outcomes.append((False, e))
+                conn.execute("RELEASE write_command")
+            # The ledger only grows through writes, so this keeps
+            # point-in-time replays short without readers writing
+            self.db.ensure_stock_snapshot()
+        return outcomes
+
+    def shutdown(self, wait: bool = True):
+        """Finish the queued writes and stop the writer thread"""
+        self._queue.put(_STOP)
+        if wait:
+            self._thread.join()
+
+
+def _is_locked(error):
+    message = str(error)
+    return "locked" in message or "busy" in message